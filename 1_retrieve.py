@@ -1,49 +1,75 @@
 import urllib.request
 import time
-from tqdm import tqdm
 import os
-import requests
-from bs4 import BeautifulSoup
 from random import randrange
+from lib import build_manifest, metrics
 
 # Only HH and NRW tested and working, SN not working
 WPS = [22]
 BUNDESLAND = "HH"
 SEARCH_HH_URL = 'https://www.buergerschaft-hh.de/parldok/dokumentennummer'
 
-def format_url_filename(wp, n):
-    filename = f"data/{BUNDESLAND}/pdf"
+def format_url_filename(wp, n, BUNDESLAND=BUNDESLAND, data_path=None):
+    filename = os.path.join(data_path or f"data/{BUNDESLAND}", "pdf")
     if BUNDESLAND == "NRW":
         filename += f"/MMP{wp}-{n}.pdf"
         url = f"https://www.landtag.nrw.de/portal/WWW/dokumentenarchiv/Dokument/MMP{wp}-{n}.pdf"
     elif BUNDESLAND == "HH":
+        import requests
+        from bs4 import BeautifulSoup
+
         filename += f"/plenarprotokoll{wp}-{n}.pdf"
         postreq = {'DokumentenArtId': 2, "LegislaturPeriodenNummer": wp, "DokumentenNummer": n}
         search_result = requests.post(SEARCH_HH_URL, json = postreq)
         soup = BeautifulSoup(search_result.text, 'html.parser')
         res = soup.find(attrs={"headers":"result-dokument"})
         url = f"https://www.buergerschaft-hh.de/{res.a['href']}"
-        
+
     return url, filename
 
-for wp in WPS:
-    os.makedirs(f"data/{BUNDESLAND}/pdf", exist_ok=True)
-    for n in tqdm(range(1,200)):
-        try:
-            url, filename = format_url_filename(wp, n)
-            ## Sleep is needed for HH not to get blocked due to excessive requests
-            time.sleep(randrange(4,8))
-            # Download if PDF doesn't already exist
-            if not os.path.exists(filename):
-                print(url)
-                urllib.request.urlretrieve(url, filename)
-                
-                ## Sleep is needed for HH not to get blocked due to excessive requests
-                time.sleep(10)
-                
-        except Exception as e:
-            print(e)
-            print("N: ", n)
-            print("--------------------------")
-            time.sleep(5)
-            break
\ No newline at end of file
+def retrieves_plenary_records(BUNDESLAND=BUNDESLAND, wps=WPS, first=1, last=199, data_path=None):
+    """
+    downloads the plenary protocols of the legislative periods wps to data/BUNDESLAND/pdf
+
+    Keyword arguments:
+    BUNDESLAND: "HH" and "NRW" were tested
+    wps: legislative periods
+    first, last: numbers of the first and the last session, stops at the first session that fails
+    data_path: folder of the state, defaults to data/BUNDESLAND
+
+    Downloads run one after the other with pauses, otherwise HH blocks the requests.
+    """
+    from tqdm import tqdm
+
+    data_path = data_path or f"data/{BUNDESLAND}"
+    # the manifest remembers where each pdf comes from, stage 3 rebuilds the xml of changed pdfs
+    manifest = build_manifest.opens_manifest(data_path)
+    with metrics.records_run("retrieve", BUNDESLAND, data_path):
+        for wp in wps:
+            os.makedirs(os.path.join(data_path, "pdf"), exist_ok=True)
+            for n in tqdm(range(first, last + 1)):
+                try:
+                    url, filename = format_url_filename(wp, n, BUNDESLAND, data_path)
+                    ## Sleep is needed for HH not to get blocked due to excessive requests
+                    time.sleep(randrange(4,8))
+                    # Download if PDF doesn't already exist
+                    if not os.path.exists(filename):
+                        print(url)
+                        with metrics.times_file("retrieve", url):
+                            urllib.request.urlretrieve(url, filename)
+                            metrics.writes(filename)
+                        manifest.records([filename], [], build_manifest.hashes_params(url=url), "retrieve", url=url)
+
+                        ## Sleep is needed for HH not to get blocked due to excessive requests
+                        time.sleep(10)
+
+                except Exception as e:
+                    print(e)
+                    print("N: ", n)
+                    print("--------------------------")
+                    time.sleep(5)
+                    break
+    manifest.saves()
+
+if __name__ == "__main__":
+    retrieves_plenary_records(BUNDESLAND, WPS)
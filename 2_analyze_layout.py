@@ -1,23 +1,41 @@
 import os
 import json
 from collections import Counter
-from tqdm import tqdm
-from lib import layout_collector
+from lib import metrics
 import re
 import random
 
-def scans_layout_plenary_records(BUNDESLAND="NRW"):
+def collects_layout(filename):
+    """boxes of one pdf as returned by layout_collector.get_pages, runs in a worker process"""
+    # pdfminer is only needed by this stage
+    from lib import layout_collector
+
+    with metrics.times_file("layout", filename) as entry:
+        metrics.reads(filename)
+        pages, x0_occurences, x1_occurences, text_boxes, y0_occurences, y1_occurences = layout_collector.get_pages(filename,
+            x0_occurences=[], x1_occurences=[], text_boxes=[], y0_occurences=[], y1_occurences=[])
+        entry["pages"] = len(pages)
+        metrics.counts("layout.pages", len(pages))
+    return x0_occurences, x1_occurences, text_boxes, y0_occurences, y1_occurences
+
+def scans_layout_plenary_records(BUNDESLAND="NRW", data_path=None, samples=6, jobs=1, files=None):
     """
     creates file "params_{BUNDESLAND}.json" which is later used when converting XML to .txt to retain visual text informations (indentations etc.)
     
     Keyword arguments:
     BUNDESLAND: only "HH", "SN" and "NRW" were tested
+    data_path: folder of the state, defaults to data/BUNDESLAND
+    samples: number of random pdfs that are analyzed
+    jobs: number of worker processes
+    files: pdfs to sample from, defaults to all pdfs in data_path/pdf
     
     For other Bundesländer, HEADER_MARK may need to be changed
     For other Bundesländer, maybe the first page needs to be excluded for analysis
     """
+    from tqdm import tqdm
 
-    DATA_PATH = f"data/{BUNDESLAND}/pdf"
+    data_path = data_path or f"data/{BUNDESLAND}"
+    DATA_PATH = os.path.join(data_path, "pdf")
 
     # (x0, y0) -> Bottom left corner, (x1, y1) -> Top right corner
     x0_occurences = []
@@ -26,16 +44,28 @@ def scans_layout_plenary_records(BUNDESLAND="NRW"):
     y0_occurences = []
     y1_occurences = []
 
-    files = [os.path.join(dp, f) for dp, dn, fn in os.walk(os.path.expanduser(DATA_PATH)) for f in fn if f.endswith(".pdf")]
+    if files is None:
+        files = [os.path.join(dp, f) for dp, dn, fn in os.walk(os.path.expanduser(DATA_PATH)) for f in fn if f.endswith(".pdf")]
+    sample = random.sample(files, min(samples, len(files)))
+
+    # Check random pdfs, the boxes are collected in the order of the sample
+    with metrics.records_run("layout", BUNDESLAND, data_path):
+        executor = None
+        if jobs == 1:
+            layouts = map(collects_layout, sample)
+        else:
+            from concurrent.futures import ProcessPoolExecutor
 
-    # Check 3 random pds
-    for filename in tqdm(random.sample(files, 6)):
-        print(filename)
-    # Open a PDF file
-        pages, x0_occurences, x1_occurences, text_boxes, y0_occurences, y1_occurences = layout_collector.get_pages(filename, 
-        	x0_occurences=x0_occurences, x1_occurences=x1_occurences, 
-        	text_boxes=text_boxes,
-        	y0_occurences=y0_occurences, y1_occurences=y1_occurences)
+            executor = ProcessPoolExecutor(max_workers=min(jobs, len(sample)))
+            layouts = map(metrics.merges, executor.map(metrics.calls, [collects_layout] * len(sample), sample))
+        try:
+            for filename, layout in zip(sample, tqdm(layouts, total=len(sample))):
+                print(filename)
+                for occurences, found in zip((x0_occurences, x1_occurences, text_boxes, y0_occurences, y1_occurences), layout):
+                    occurences.extend(found)
+        finally:
+            if executor is not None:
+                executor.shutdown()
 
     x0_occurences_ls = [item for sublist in x0_occurences for item in sublist]
     text_boxes_ls = [item for sublist in text_boxes for item in sublist]
@@ -74,7 +104,7 @@ def scans_layout_plenary_records(BUNDESLAND="NRW"):
     # Create parameter file for next step
     params = {"header_bound": min(header_bound_y0), "indentation_bound_left":min(indent_x0), "indentation_bound_right":min(right_indent_margin)}
 
-    with open(f"data/{BUNDESLAND}/params_{BUNDESLAND}.json", mode = "w") as f:
+    with open(os.path.join(data_path, f"params_{BUNDESLAND}.json"), mode = "w") as f:
         f.write(json.dumps(params))
     
 if __name__ == "__main__":
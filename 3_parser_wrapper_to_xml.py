@@ -1,42 +1,98 @@
 import os
-from tqdm import tqdm
+import socket
 import sys
-import time
 import subprocess
 
-def converts_pdf_to_text(BUNDESLAND):
+from lib import build_manifest, metrics
+
+# pdf2txt.py of pdfminer.six in the virtual environment next to the repository
+PDF2TXT = "../venv/bin/pdf2txt.py"
+CHAR_MARGIN = 3
+
+def converts_file(filein, fileout, pdf2txt=PDF2TXT, char_margin=CHAR_MARGIN):
+    """converts one pdf with pdf2txt.py, runs in a worker process; returns whether pdf2txt.py succeeded"""
+    # the xml appears complete or not at all, also for other machines reading the folder
+    temporary = f"{fileout}.{socket.gethostname()}.{os.getpid()}.tmp"
+    # the CPU time of pdf2txt.py counts as CPU time of the file
+    with metrics.times_file("pdf_to_xml", filein):
+        try:
+            completed = subprocess.run(["python", pdf2txt, filein, "--char-margin", str(char_margin), "-t", "xml", "-o", temporary])
+            if completed.returncode == 0:
+                os.replace(temporary, fileout)
+        finally:
+            # Cleanup if keyboard interrupt or pdf2txt.py failed
+            if os.path.exists(temporary):
+                os.remove(temporary)
+        metrics.reads(filein)
+        metrics.writes(fileout)
+    return completed.returncode == 0
+
+def names_outputs(filename):
+    """the xml written for a pdf"""
+    return [filename.replace("/pdf", "/xml").replace('.pdf', '.xml')]
+
+def hashes_build_params(manifest, pdf2txt=PDF2TXT, char_margin=CHAR_MARGIN):
+    """hash of the parameters that determine the xml of a pdf, see lib/build_manifest.py"""
+    return build_manifest.hashes_params(char_margin=char_margin,
+                                        pdf2txt=manifest.hashes(pdf2txt) if os.path.exists(pdf2txt) else pdf2txt)
+
+def converts_pdf_to_text(BUNDESLAND, data_path=None, jobs=1, files=None, pdf2txt=PDF2TXT, char_margin=CHAR_MARGIN, force=False):
     """
     converts pdf files in folder data/BUNDESLAND/pdf to xml (in a separate folder)
-    
+
     Keyword arguments:
     BUNDESLAND: "HH", "SN", "NRW" were tested
+    data_path: folder of the state, defaults to data/BUNDESLAND
+    jobs: number of pdf2txt.py processes that run at the same time
+    files: pdfs to convert, defaults to all pdfs in data_path/pdf
+    pdf2txt: path of pdf2txt.py
+    char_margin: --char-margin of pdf2txt.py
+    force: convert all pdfs, not only those whose xml is stale (see lib/build_manifest.py)
     """
+    from tqdm import tqdm
 
-    DATA_PATH = f"data/{BUNDESLAND}/pdf"
-    os.makedirs(f"data/{BUNDESLAND}/xml", exist_ok=True)
-    
-    filenames = [os.path.join(dp, f) for dp, dn, fn in os.walk(DATA_PATH) for f in fn if f.endswith('.pdf')]
-    filenames = {f: f.replace("/pdf", "/xml").replace('.pdf', '.xml') for f in filenames}
-    _ = {}
-    
-    # Only process pdfs that haven't been converted yet
-    for fi, fo in filenames.items():
-        if not os.path.exists(fo):
-            _[fi] = fo
-    filenames = _
-        
-    
-    for filein, fileout in (pbar := tqdm(filenames.items())):
-        pbar.set_description(f"Processing {filein}\n")
-        if not os.path.exists(fileout):
-            try:
-                subprocess.run(["python", "../venv/bin/pdf2txt.py", filein, "--char-margin", "3", "-o", fileout])
-            except KeyboardInterrupt:
-                # Cleanup if keyboard interrupt
-                os.remove(fileout)
-                sys.exit()
+    data_path = data_path or f"data/{BUNDESLAND}"
+    DATA_PATH = os.path.join(data_path, "pdf")
+    os.makedirs(os.path.join(data_path, "xml"), exist_ok=True)
+
+    if files is None:
+        files = [os.path.join(dp, f) for dp, dn, fn in os.walk(DATA_PATH) for f in fn if f.endswith('.pdf')]
+    filenames = {f: names_outputs(f)[0] for f in files}
+
+    # Only process pdfs whose xml is missing or was made from another pdf or with other parameters
+    manifest = build_manifest.opens_manifest(data_path)
+    params = hashes_build_params(manifest, pdf2txt, char_margin)
+    filenames = {fi: fo for fi, fo in filenames.items() if force or manifest.is_stale([fo], [fi], params, "pdf_to_xml")}
+
+    with metrics.records_run("pdf_to_xml", BUNDESLAND, data_path):
+        try:
+            if jobs == 1:
+                for filein, fileout in (pbar := tqdm(filenames.items())):
+                    pbar.set_description(f"Processing {filein}\n")
+                    try:
+                        if converts_file(filein, fileout, pdf2txt, char_margin):
+                            manifest.records([fileout], [filein], params, "pdf_to_xml")
+                    except KeyboardInterrupt:
+                        sys.exit()
+                return
+
+            from concurrent.futures import ProcessPoolExecutor, as_completed
+
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                futures = {executor.submit(metrics.calls, converts_file, filein, fileout, pdf2txt, char_margin): (filein, fileout)
+                           for filein, fileout in filenames.items()}
+                try:
+                    for future in tqdm(as_completed(futures), total=len(futures)):
+                        if metrics.merges(future.result()):
+                            filein, fileout = futures[future]
+                            manifest.records([fileout], [filein], params, "pdf_to_xml")
+                except KeyboardInterrupt:
+                    executor.shutdown(cancel_futures=True)
+                    sys.exit()
+        finally:
+            manifest.saves()
 
 
 if __name__ == "__main__":
-    
-    converts_pdf_to_text("HH")
\ No newline at end of file
+
+    converts_pdf_to_text("HH")
@@ -1,10 +1,19 @@
+import logging
 import os
 from operator import itemgetter
 import re
+import socket
 import sys
 import xml.etree.cElementTree as ET
 import json
 
+from lib import build_manifest, line_records, metrics
+
+log = logging.getLogger(__name__)
+
+# state converted when the script runs on its own; python landtag.py xml-to-txt --state .. for the others
+BUNDESLAND = "SN"
+
 # only one set of pages:
 # text x0: 57
 # interjection: 85
@@ -29,7 +38,7 @@ def lookahead(iterable):
     yield last, False
 
 
-def parseXML(xml_in, params, BUNDESLAND):
+def parseXML(xml_in, params, BUNDESLAND, records=None):
     """
     converts xml files to txt while retaining indentations and speaker informations
     
@@ -37,6 +46,7 @@ def parseXML(xml_in, params, BUNDESLAND):
     xml_in: plenary protocol as XML file as converted by pxfminer.six pdf2txt
     params: dict with values "header_bound", "indentation_bound_left", "indentation_bound_right" which is created in analyze_layout.py
     BUNDESLAND: "HH", "SN", "NRW" are tested
+    records: optional list that is extended by the line records (see lib/line_records.py) of the text
     
     """
     # import pdb; pdb.set_trace()
@@ -59,6 +69,8 @@ def parseXML(xml_in, params, BUNDESLAND):
         sys.exit("ERROR: pages.tag is %s instead of pages!" % pages.tag)
 
     text = []
+    # open tag spans for the line records
+    spans = 0
     # step through the pages
     for page in pages:
         # gets page_id
@@ -108,12 +120,13 @@ def parseXML(xml_in, params, BUNDESLAND):
 
             # removes header/footer
             if textbox_bounds[1] > header_bound and page_id not in ['1']:
-                print('removed header ' + textbox_text)
+                log.debug('removed header %s', textbox_text)
+                metrics.counts('xml_to_txt.removed_headers')
                 continue
 
 
             # save a description of the line
-            textbox = {'left': textbox_bounds[0], 'top': textbox_bounds[1], 'text': textbox_text}
+            textbox = {'left': textbox_bounds[0], 'top': textbox_bounds[1], 'text': textbox_text, 'column': 1}
 
             condition_left_col = textbox['left'] > interjection_left and textbox['left'] < interjection_right-50
             condition_right_col = textbox['left'] > interjection_right
@@ -126,10 +139,24 @@ def parseXML(xml_in, params, BUNDESLAND):
             # Make sure order is correct
             if textbox['left'] < interjection_right-50:
                 textbox['top'] = textbox['top']+2000
+                textbox['column'] = 0
             page_text.sort(key=itemgetter('top'), reverse=True)
             
             page_text.append(textbox)
 
+        if records is not None:
+            # same lines as splitting the joined text, but with page and column
+            page_records = []
+            for i, e in enumerate(page_text):
+                if i:
+                    page_records.append(line_records.LineRecord('', spans, int(page_id), page_text[i - 1]['column'], ()))
+                box_records, spans = line_records.records_from_lines(e['text'].split('\n'), page=int(page_id), column=e['column'], spans=spans)
+                page_records.extend(box_records)
+            if not page_records:
+                page_records.append(line_records.LineRecord('', spans, int(page_id), -1, ()))
+            page_records[0] = page_records[0]._replace(flags=page_records[0].flags | line_records.PAGE_BEGIN)
+            records.extend(page_records)
+
         page_text = '\n\n'.join([e['text'] for e in page_text])
 
         text.append(page_text + '\n')
@@ -137,31 +164,101 @@ def parseXML(xml_in, params, BUNDESLAND):
     # if not found_ending_mark:
     #     sys.exit('could not find closing mark; adjust regex')
 
+    if records is not None:
+        # the text ends with a newline, so splitting it yields a last empty line
+        records.append(line_records.LineRecord('', spans, 0, -1, ()))
+    metrics.counts('xml_to_txt.pages', len(pages))
+
     return text
 
-def iteratesFiles(BUNDESLAND):    
+def names_outputs(filename):
+    """_xml.txt and _lines.tsv written for an XML file"""
+    output_name = filename.replace("/xml", "/txt").replace('.xml', '_xml.txt')
+    return [output_name, output_name.replace('_xml.txt', line_records.RECORDS_SUFFIX)]
+
+def hashes_build_params(manifest, params_name):
+    """hash of the layout parameters and the code that determine the txt of an XML file, see lib/build_manifest.py"""
+    return build_manifest.hashes_params(layout=manifest.hashes(params_name), code=manifest.hashes(os.path.abspath(__file__)),
+                                        records=manifest.hashes(line_records.__file__))
+
+def convertsFile(filename, params, BUNDESLAND):
+    """
+    converts one XML file to _xml.txt and _lines.tsv in the txt folder next to the xml folder, runs in a worker process
+
+    Keyword arguments:
+    filename: XML file
+    params, BUNDESLAND: see parseXML
+    """
+    output_name, records_name = names_outputs(filename)
+    with metrics.times_file("xml_to_txt", filename) as entry:
+        metrics.reads(filename)
+        records = []
+        result = parseXML(filename, params=params, BUNDESLAND=BUNDESLAND, records=records)
+        entry["pages"] = len(result)
+
+        # both files appear complete or not at all, also for other machines reading the folder
+        temporary = f".{socket.gethostname()}.{os.getpid()}.tmp"
+        with metrics.times_span("write txt"):
+            with open(output_name + temporary, "w", encoding="utf-8") as fp:
+                fp.writelines(result)
+            # stage 5 reads the line records instead of stripping the tags again
+            with open(records_name + temporary, "w", encoding="utf-8", newline="\n") as fp:
+                line_records.writes_records(records, fp)
+            os.replace(records_name + temporary, records_name)
+            os.replace(output_name + temporary, output_name)
+        metrics.writes(output_name)
+        metrics.writes(records_name)
+    return output_name
+
+def iteratesFiles(BUNDESLAND=BUNDESLAND, data_path=None, jobs=1, files=None, force=False):
     """
     iterates over XML files in data/BUNDESLAND/xml
     
     Keyword arguments:
     BUNDESLAND: "HH", "SN", "NRW" are tested
+    data_path: folder of the state, defaults to data/BUNDESLAND
+    jobs: number of worker processes
+    files: XML files to convert, defaults to all XML files in data_path/xml
+    force: convert all files, not only those whose txt is stale (see lib/build_manifest.py)
     """
-    DATA_PATH = f"data/{BUNDESLAND}/xml"
-    os.makedirs(f"data/{BUNDESLAND}/txt", exist_ok=True)
-    files = [os.path.join(dp, f) for dp, dn, fn in os.walk(os.path.expanduser(DATA_PATH)) for f in fn if f.endswith(".xml")]
+    data_path = data_path or f"data/{BUNDESLAND}"
+    DATA_PATH = os.path.join(data_path, "xml")
+    os.makedirs(os.path.join(data_path, "txt"), exist_ok=True)
+    if files is None:
+        files = [os.path.join(dp, f) for dp, dn, fn in os.walk(os.path.expanduser(DATA_PATH)) for f in fn if f.endswith(".xml")]
+    files = sorted(files)
     
-    with open(os.path.join(f"data/{BUNDESLAND}", "params_" + BUNDESLAND + ".json"), encoding="utf-8") as fp:
+    params_name = os.path.join(data_path, "params_" + BUNDESLAND + ".json")
+    with open(params_name, encoding="utf-8") as fp:
         params = json.loads(fp.read())
-    for filename in sorted(files):
-        output_name = filename.replace("/xml", "/txt").replace('.xml', '_xml.txt')
-        #if os.path.exists(output_name):
-        #   continue
-        print(filename)
-        result = parseXML(filename, params=params, BUNDESLAND=BUNDESLAND)
-        
-        with open(output_name, "w", encoding="utf-8") as fp:
-            fp.writelines(result)
-            
+
+    # Only convert files whose txt is missing or was made from another XML, layout or code
+    manifest = build_manifest.opens_manifest(data_path)
+    build_params = hashes_build_params(manifest, params_name)
+    files = [filename for filename in files if force or manifest.is_stale(names_outputs(filename), [filename], build_params, "xml_to_txt")]
+
+    with metrics.records_run("xml_to_txt", BUNDESLAND, data_path):
+        try:
+            if jobs == 1:
+                for filename in files:
+                    print(filename)
+                    convertsFile(filename, params, BUNDESLAND)
+                    manifest.records(names_outputs(filename), [filename], build_params, "xml_to_txt")
+                return
+
+            from concurrent.futures import ProcessPoolExecutor
+
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                n = len(files)
+                converted = executor.map(metrics.calls, [convertsFile] * n, files, [params] * n, [BUNDESLAND] * n,
+                                         chunksize=max(1, n // (8 * jobs)))
+                for filename, measured in zip(files, converted):
+                    metrics.merges(measured)
+                    manifest.records(names_outputs(filename), [filename], build_params, "xml_to_txt")
+                    print(filename)
+        finally:
+            manifest.saves()
+
 
 if __name__ == "__main__":
-    iteratesFiles("SN")
+    iteratesFiles(BUNDESLAND)
@@ -0,0 +1,233 @@
+# coding: utf-8
+import argparse
+import hashlib
+import importlib.util
+import io
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+# Benchmarks of the pipeline stages on the fixtures in benchmarks/fixtures/{STATE}: one session
+# per state as PDF (first pages), as XML in the format of pdfminer's pdf2txt and as the _xml.txt
+# and _lines.tsv that stage 4 writes from this XML.
+#
+# stage 2: layout_collector.get_pages, pages/s
+# stage 3: pdfminer XML conversion as done by pdf2txt.py --char-margin 3, pages/s
+# stage 4: parseXML, textboxes/s
+# stage 5: parser_engine.parses_file per state, lines/s and rows/s
+#
+# Every benchmark runs --repeat times, the fastest run counts; the peak memory of the Python
+# allocations is measured in a separate run with tracemalloc. The output of every benchmark is
+# hashed, so a change that alters the result is reported next to the timings.
+#
+# Results are compared with benchmarks/baseline.json: a rate that drops or a peak memory that
+# grows by more than --threshold (default 20 %) or a different output fails the run.
+#
+# python -m benchmarks.run_benchmarks                      compare with the baseline
+# python -m benchmarks.run_benchmarks --update-baseline    store the current results as baseline
+# python -m benchmarks.run_benchmarks --stages 5 --states HH --threshold 0.1
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(ROOT, 'benchmarks', 'fixtures')
+BASELINE_FILE = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+STATES = ['HH', 'NRW', 'SN']
+STAGES = [2, 3, 4, 5]
+
+
+def fixture(state, suffix):
+    """path of the fixture of a state that ends with suffix, e.g. '.pdf'"""
+    for dirpath, dirnames, filenames in os.walk(os.path.join(FIXTURES, state)):
+        for filename in sorted(filenames):
+            if filename.endswith(suffix):
+                return os.path.join(dirpath, filename)
+    raise FileNotFoundError(f'no {suffix} fixture for {state}')
+
+
+def digests(*parts):
+    """sha256 of the given strings or bytes"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else str(part).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def loads_stage4():
+    """the module 4_parse_transcript_xml_to_txt.py, whose name is not importable"""
+    spec = importlib.util.spec_from_file_location('parse_transcript_xml_to_txt', os.path.join(ROOT, '4_parse_transcript_xml_to_txt.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def runs_layout(pdf):
+    """stage 2: returns ({'pages/s': pages}, digest)"""
+    from lib import layout_collector
+
+    pages, x0, x1, text_boxes, y0, y1 = layout_collector.get_pages(pdf, x0_occurences=[], x1_occurences=[], text_boxes=[],
+                                                                   y0_occurences=[], y1_occurences=[])
+    return {'pages/s': len(pages)}, digests(json.dumps([x0, x1, text_boxes, y0, y1]))
+
+
+def runs_pdf_to_xml(pdf):
+    """stage 3: returns ({'pages/s': pages}, digest)"""
+    from pdfminer.high_level import extract_text_to_fp
+    from pdfminer.layout import LAParams
+
+    output = io.BytesIO()
+    with open(pdf, 'rb') as f:
+        extract_text_to_fp(f, output, output_type='xml', laparams=LAParams(char_margin=3), codec='utf-8')
+    xml = output.getvalue()
+    return {'pages/s': xml.count(b'<page ')}, digests(xml)
+
+
+def runs_xml_to_txt(stage4, xml, params, state):
+    """stage 4: returns ({'textboxes/s': textboxes}, digest)"""
+    from lib import line_records
+
+    records = []
+    text = stage4.parseXML(xml, params=params, BUNDESLAND=state, records=records)
+    with open(xml, 'rb') as f:
+        textboxes = f.read().count(b'<textbox ')
+    tsv = io.StringIO()
+    line_records.writes_records(records, tsv)
+    return {'textboxes/s': textboxes}, digests(''.join(text), tsv.getvalue())
+
+
+def runs_parser(txt, state):
+    """stage 5: returns ({'lines/s': lines, 'rows/s': rows}, digest)"""
+    from lib import line_records, parser_engine
+
+    lines = len(line_records.reads_session_records(txt))
+    speeches, errormessages = parser_engine.parses_file(txt, state, {})
+    return {'lines/s': lines, 'rows/s': len(speeches)}, digests(speeches.to_frame().to_csv(index=False))
+
+
+def lists_benchmarks(states, stages):
+    """(name, function) of the benchmarks of the given states and stages"""
+    benchmarks = []
+    stage4 = loads_stage4() if 4 in stages else None
+    for state in states:
+        if 2 in stages:
+            benchmarks.append((f'stage2/{state}', lambda pdf=fixture(state, '.pdf'): runs_layout(pdf)))
+        if 3 in stages:
+            benchmarks.append((f'stage3/{state}', lambda pdf=fixture(state, '.pdf'): runs_pdf_to_xml(pdf)))
+        if 4 in stages:
+            with open(fixture(state, f'params_{state}.json'), encoding='utf-8') as f:
+                params = json.load(f)
+            benchmarks.append((f'stage4/{state}', lambda xml=fixture(state, '.xml'), params=params, state=state:
+                               runs_xml_to_txt(stage4, xml, params, state)))
+        if 5 in stages:
+            benchmarks.append((f'stage5/{state}', lambda txt=fixture(state, '_xml.txt'), state=state: runs_parser(txt, state)))
+    return benchmarks
+
+
+def measures(function, repeat):
+    """
+    runs a benchmark
+
+    Keyword arguments:
+    function: returns (dict unit -> count, digest)
+    repeat: number of timed runs, the fastest counts
+
+    returns dict with seconds, rates per unit, peak_kb and digest
+    """
+    counts, digest = function()
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        seconds.append(time.perf_counter() - start)
+    best = min(seconds)
+
+    tracemalloc.start()
+    try:
+        function()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {'seconds': best, 'rates': {unit: count / best for unit, count in counts.items()},
+            'peak_kb': peak / 1024, 'digest': digest}
+
+
+def compares(results, baseline, threshold):
+    """
+    compares results with the baseline
+
+    Keyword arguments:
+    results, baseline: dict name -> result of measures
+    threshold: allowed relative loss of a rate and growth of peak memory, e.g. 0.2
+
+    returns a list of failures
+    """
+    failures = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        base = baseline[name]
+        for unit, rate in result['rates'].items():
+            base_rate = base['rates'].get(unit)
+            if base_rate and rate < base_rate * (1 - threshold):
+                failures.append(f'{name}: {unit} {rate:,.0f} is {1 - rate / base_rate:.0%} below the baseline {base_rate:,.0f}')
+        if base.get('peak_kb') and result['peak_kb'] > base['peak_kb'] * (1 + threshold):
+            failures.append(f"{name}: peak memory {result['peak_kb']:,.0f} KiB is "
+                            f"{result['peak_kb'] / base['peak_kb'] - 1:.0%} above the baseline {base['peak_kb']:,.0f} KiB")
+        if base.get('digest') and result['digest'] != base['digest']:
+            failures.append(f'{name}: output differs from the baseline')
+    return failures
+
+
+def prints_results(results, baseline):
+    for name, result in results.items():
+        base = baseline.get(name, {})
+        rates = ', '.join(f'{rate:,.0f} {unit}' + (f" ({rate / base['rates'][unit] - 1:+.0%})" if base.get('rates', {}).get(unit) else '')
+                          for unit, rate in result['rates'].items())
+        print(f"{name:<12} {result['seconds'] * 1000:9.1f} ms  {rates}  peak {result['peak_kb']:,.0f} KiB")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='benchmarks of the pipeline stages on the fixtures')
+    parser.add_argument('--states', nargs='+', default=STATES, choices=STATES)
+    parser.add_argument('--stages', nargs='+', type=int, default=STAGES, choices=STAGES)
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs per benchmark, the fastest counts')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed relative regression, default 0.2')
+    parser.add_argument('--baseline', default=BASELINE_FILE, help='baseline json file')
+    parser.add_argument('--update-baseline', action='store_true', help='store the results as new baseline')
+    parser.add_argument('--output', help='also write the results to this json file')
+    args = parser.parse_args(argv)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    results = {}
+    for name, function in lists_benchmarks(args.states, args.stages):
+        try:
+            results[name] = measures(function, args.repeat)
+        except ImportError as e:
+            # stages 2 and 3 need pdfminer
+            print(f'{name:<12} skipped: {e}')
+    prints_results(results, baseline)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.update_baseline:
+        baseline.update(results)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f'baseline written to {args.baseline}')
+        return 0
+
+    failures = compares(results, baseline, args.threshold)
+    for failure in failures:
+        print('REGRESSION', failure)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
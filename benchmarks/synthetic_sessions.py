@@ -0,0 +1,340 @@
+# coding: utf-8
+import argparse
+import datetime
+import json
+import os
+import random
+import sys
+from xml.sax.saxutils import escape
+
+# Synthetic plenary protocols in the format of stage 4 for scale tests of stages 4 and 5.
+#
+# Every state profile of lib/profiles gets sessions with its own header, date line, Beginn/Schluss
+# marks, chairs, MPs with parties, members of the government, officials, agenda items and
+# interjections, tagged as stage 4 writes them (<poi_begin>, <interjection_begin>, ...). The
+# speeches are random German words broken into lines of about 55 characters, some of them
+# hyphenated. A session only depends on the seed, the state, wp and its number, so sessions can be
+# generated in parallel and a run can be repeated.
+#
+# The files are written like data/{STATE}: txt/{name}_xml.txt and txt/{name}_lines.tsv and, with
+# --xml, xml/{name}.xml in the format of pdfminer's pdf2txt with the params_{STATE}.json that
+# stage 4 needs.
+#
+# python -m benchmarks.synthetic_sessions HH --sessions 10000 --out data/synthetic --jobs 8 --xml
+
+WORDS = ('die der und in den von zu das mit sich des auf für ist im dem nicht ein eine als auch es an werden aus er hat '
+         'dass sie nach wird bei einer um am sind noch wie einem über einen so zum war haben nur oder aber vor zur bis '
+         'mehr durch man sein wurde sei Prozent Hamburg Land Landesregierung Haushalt Antrag Gesetzentwurf Ausschuss '
+         'Bürgerinnen Bürger Kommunen Schulen Lehrerinnen Lehrer Polizei Klimaschutz Verkehrswende Wohnungsbau '
+         'Digitalisierung Krankenhäuser Pflege Investitionen Haushaltsberatungen Verantwortung Zukunft Opposition '
+         'Koalition Fraktion Kolleginnen Kollegen Regierung Beschluss Finanzierung Förderprogramm Gerechtigkeit '
+         'Wirtschaft Arbeitsplätze Energiewende Landwirtschaft Hochschulen Wissenschaft Forschung Kultur Sport '
+         'Integration Gesundheit Sicherheit Justiz Verwaltung Infrastruktur Nahverkehr Mittelstand Steuern '
+         'wichtig richtig notwendig dringend unverantwortlich nachhaltig sozial gemeinsam deutlich konkret '
+         'unterstützen ablehnen fordern beschließen verbessern investieren umsetzen diskutieren').split()
+FIRST_NAMES = ('Anna Andreas Birgit Christian Claudia Daniel Dirk Elke Frank Gabriele Hans Heike Ingo Jana Jörg Julia '
+               'Karin Klaus Lena Markus Martina Michael Nicole Olaf Petra Ralf Sabine Stefan Susanne Thomas Ulrike '
+               'Volker Wolfgang Yvonne Zeynep Mehmet Katharina Sebastian Miriam Tobias').split()
+SURNAMES = ('Müller Schmidt Schneider Fischer Weber Meyer Wagner Becker Schulz Hoffmann Schäfer Koch Bauer Richter '
+            'Klein Wolf Schröder Neumann Schwarz Zimmermann Braun Krüger Hofmann Hartmann Lange Schmitt Werner '
+            'Krause Meier Lehmann Köhler Herrmann König Walter Mayer Huber Kaiser Fuchs Peters Lang Scholz Möller '
+            'Weiß Jung Hahn Vogel Friedrich Keller Günther Frank Berger Winkler Roth Beck Lorenz Baumann Franke '
+            'Albrecht Schuster Simon Ludwig Böhm Winter Kraus Martin Schumacher Krämer Vogt Stein Jäger Otto').split()
+INTERJECTIONS = ['Beifall bei der {party}', 'Beifall bei der {party} und der {other}', 'Zuruf von der {party}: Das stimmt doch gar nicht!',
+                 'Heiterkeit', 'Zurufe von der {party}', 'Beifall bei der {party} – Zuruf von der {other}: Unglaublich!',
+                 'Lachen bei der {party}', 'Vereinzelt Beifall bei der {party}', 'Glocke des Präsidenten']
+
+# per state: file name, header, date line, marks, speaker lines and agenda items in the layout
+# that the profile expects; {name}, {party}, {title}, {number} are filled in per session
+TEMPLATES = {
+    'HH': {
+        'wp': 22, 'filename': 'plenarprotokoll{wp}-{number}',
+        'header': ['Plenarprotokoll {wp}/{number}', '', 'Sitzung am {date:%d.%m.%Y}', ''],
+        'begin': '<indentation_begin>Beginn: 13.30 Uhr<indentation_end>', 'end': '<indentation_begin>Ende: 21.32 Uhr<indentation_end>',
+        'parties': ['SPD', 'GRÜNE', 'CDU', 'DIE LINKE', 'AfD', 'FDP'],
+        'chairs': ['Präsidentin Carola Veit:', 'Erster Vizepräsident Frank Schmitt:', 'Vizepräsidentin Dr. Stefanie von Berg:'],
+        'chair': '<poi_begin>{name}<poi_end> ',
+        'mp': '<poi_begin>{name}<poi_end> {party}: ',
+        'executive': '<poi_begin>Senator{gender} {name}:<poi_end> ',
+        'official': '<poi_begin>Staatsrat {name}:<poi_end> ',
+        'notes': ['<poi_begin>Zwischenfrage von {name}<poi_end> {party}: ', '<poi_begin>Zwischenbemerkung von {name}<poi_end>: ',
+                  '<poi_begin>{name}<poi_end>(fortfahrend): '],
+        'issue': ['<poi_begin>[{title}:<poi_end>', 'Drucksache {wp}/{number}]'],
+    },
+    'NRW': {
+        'wp': 17, 'filename': 'MMP{wp}-{number}',
+        'header': ['Landtag Nordrhein-Westfalen', '', 'Plenarprotokoll {wp}/{number}', '', 'Düsseldorf, {weekday}, {date:%d.%m.%Y}', ''],
+        'begin': '<poi_begin>Beginn: 10:02 Uhr<poi_end>', 'end': 'Schluss: 17:16 Uhr',
+        'parties': ['CDU', 'SPD', 'FDP', 'GRÜNE', 'AfD'],
+        'chairs': ['Präsident André Kuper:', 'Vizepräsidentin Carina Gödecke:', 'Vizepräsident Oliver Keymis:'],
+        'chair': '<poi_begin>{name}<poi_end> ',
+        'mp': '<poi_begin>{name}<poi_end> ({party}): ',
+        'executive': '<poi_begin>{name}<poi_end>, Minister{gender} für {title}: ',
+        'official': '<poi_begin>Staatssekretär {name}:<poi_end> ',
+        'notes': [],
+        'issue': ['<poi_begin>{number} {title}<poi_end>'],
+    },
+    'SN': {
+        'wp': 7, 'filename': '{wp}_PlPr_{number}',
+        'header': ['Sächsischer Landtag', '', 'Plenarprotokoll {wp}/{number}', '', 'Dresden, {date:%d.%m.%Y}', ''],
+        'begin': '<interjection_begin>(Beginn der Sitzung: 10:00 Uhr)<interjection_end>',
+        'end': '<interjection_begin>(Schluss der Sitzung: 18:01 Uhr)<interjection_end>',
+        'parties': ['CDU', 'AfD', 'DIE LINKE', 'GRÜNE', 'SPD'],
+        'chairs': ['Präsident Dr. Matthias Rößler:', '1. Vizepräsidentin Andrea Dombois:', '2. Vizepräsident Ronald Pohle:'],
+        'chair': '<poi_begin>{name}<poi_end> ',
+        'mp': '<poi_begin>{name}, {party}:<poi_end> ',
+        'executive': '<poi_begin>{name}, Staatsminister{gender} für {title}:<poi_end> ',
+        'official': '<poi_begin>{name}, Staatssekretär:<poi_end> ',
+        'notes': [],
+        'issue': ['<poi_begin>Tagesordnungspunkt {number}<poi_end>', '{title}'],
+    },
+}
+TITLES = ['Antrag der Fraktion der {party}', 'Gesetz zur Änderung des Schulgesetzes', 'Aktuelle Stunde',
+          'Haushaltsplan-Entwurf {year}', 'Bericht des Haushaltsausschusses', 'Große Anfrage der Fraktion der {party}']
+PORTFOLIOS = ['Finanzen', 'Inneres', 'Schule und Berufsbildung', 'Umwelt, Klima und Energie', 'Wissenschaft', 'Soziales']
+WEEKDAYS = ['Montag', 'Dienstag', 'Mittwoch', 'Donnerstag', 'Freitag', 'Samstag', 'Sonntag']
+FIRST_DATE = datetime.date(2020, 1, 8)
+
+
+def creates_names(rng, count):
+    """distinct fictitious names, some with doctor title"""
+    names = set()
+    while len(names) < count:
+        name = f'{rng.choice(FIRST_NAMES)} {rng.choice(SURNAMES)}'
+        names.add(('Dr. ' if rng.random() < 0.15 else '') + name)
+    return sorted(names)
+
+
+def creates_roster(state, wp, seed, mps=120):
+    """MPs with parties and members of the government of a legislative period"""
+    template = TEMPLATES[state]
+    rng = random.Random(f'{seed}-{state}-{wp}-roster')
+    names = creates_names(rng, mps + 16)
+    parties = template['parties']
+    # larger parties come first in the template
+    weights = [len(parties) - i for i in range(len(parties))]
+    roster = {'mps': [(name, rng.choices(parties, weights)[0]) for name in names[:mps]],
+              'executives': [(name, rng.choice(['', 'in']), rng.choice(PORTFOLIOS)) for name in names[mps:mps + 10]],
+              'officials': names[mps + 10:]}
+    return roster
+
+
+def breaks_lines(words, rng, width=55):
+    """words as lines of about width characters, some with a hyphenated word at the end"""
+    lines = []
+    line = ''
+    for word in words:
+        if line and len(line) + len(word) >= width:
+            if len(word) > 7 and rng.random() < 0.3:
+                cut = rng.randint(3, len(word) - 3)
+                lines.append(f'{line} {word[:cut]}-')
+                line = word[cut:]
+                continue
+            lines.append(line)
+            line = word
+        else:
+            line = f'{line} {word}' if line else word
+    if line:
+        lines.append(line)
+    return lines
+
+
+def writes_paragraph(rng, low, high):
+    return breaks_lines(rng.choices(WORDS, k=rng.randint(low, high)), rng)
+
+
+def writes_interjection(rng, parties):
+    party, other = rng.sample(parties, 2)
+    text = rng.choice(INTERJECTIONS).format(party=party, other=other)
+    lines = breaks_lines(f'({text})'.split(), rng)
+    lines[0] = '<interjection_begin>' + lines[0]
+    lines[-1] = lines[-1] + '<interjection_end>'
+    return lines
+
+
+def generates_session(state, number, wp=None, seed=0, speeches=(25, 40), roster=None):
+    """
+    text of one synthetic session as written by stage 4 to _xml.txt
+
+    Keyword arguments:
+    state: "HH", "NRW" or "SN"
+    number: number of the session, determines its date
+    wp: legislative period, default of the template if None
+    seed: seed of the corpus
+    speeches: (min, max) number of speeches
+    roster: creates_roster of the period, created if None
+    """
+    template = TEMPLATES[state]
+    wp = wp or template['wp']
+    roster = roster or creates_roster(state, wp, seed)
+    rng = random.Random(f'{seed}-{state}-{wp}-{number}')
+    date = FIRST_DATE + datetime.timedelta(days=7 * (number - 1))
+    parties = template['parties']
+
+    lines = [line.format(wp=wp, number=number, date=date, weekday=WEEKDAYS[date.weekday()]) for line in template['header']]
+    lines += [template['begin'], '']
+    chair = template['chair'].format(name=template['chairs'][0])
+    item = 0
+    for k in range(rng.randint(*speeches)):
+        if k and rng.random() < 0.15:
+            item += 1
+            title = rng.choice(TITLES).format(party=rng.choice(parties), year=date.year + 1)
+            lines += [line.format(title=title, wp=wp, number=item) for line in template['issue']] + ['']
+        kind = rng.random()
+        if k == 0:
+            head = chair
+        elif kind < 0.3:
+            head = template['chair'].format(name=rng.choice(template['chairs']))
+        elif kind < 0.8:
+            name, party = rng.choice(roster['mps'])
+            head = template['mp'].format(name=name, party=party)
+        elif kind < 0.9:
+            name, gender, portfolio = rng.choice(roster['executives'])
+            head = template['executive'].format(name=name, gender=gender, title=portfolio)
+        elif kind < 0.95 or not template['notes']:
+            head = template['official'].format(name=rng.choice(roster['officials']))
+        else:
+            name, party = rng.choice(roster['mps'])
+            head = rng.choice(template['notes']).format(name=name, party=party)
+        paragraph = writes_paragraph(rng, 15, 80)
+        lines += [head + paragraph[0]] + paragraph[1:] + ['']
+        for _ in range(rng.randint(0, 4)):
+            lines += writes_interjection(rng, parties) + ['']
+            if rng.random() < 0.05:
+                # page number between two columns
+                lines += [str(rng.randint(100, 9999)), '']
+            lines += writes_paragraph(rng, 10, 60) + ['']
+    lines += [template['end'], '']
+    return '\n'.join(lines) + '\n'
+
+
+def runs_of(line):
+    """(text, bold) parts of a tagged line"""
+    parts = []
+    bold = False
+    for tag in ('<poi_begin>', '<poi_end>', '<interjection_begin>', '<interjection_end>', '<indentation_begin>', '<indentation_end>'):
+        line = line.replace(tag, '\0' + tag + '\0')
+    for part in line.split('\0'):
+        if part in ('<poi_begin>', '<poi_end>'):
+            bold = part == '<poi_begin>'
+        elif part and not part.startswith('<'):
+            parts.append((part, bold))
+    return parts
+
+
+def writes_layout_xml(text, state, wp, number, fp, page_height=842.0):
+    """
+    writes a session in the XML format of pdfminer's pdf2txt: one textbox per paragraph, bold
+    characters in a Bold font, indented paragraphs at x=90 and a page header above header_bound
+    """
+    boxes = []
+    for paragraph in text.split('\n\n'):
+        paragraph = [line for line in paragraph.split('\n') if line]
+        if paragraph:
+            indented = paragraph[0].startswith(('<interjection_begin>', '<indentation_begin>'))
+            boxes.append((indented, [runs_of(line) for line in paragraph]))
+
+    fp.write('<?xml version="1.0" encoding="utf-8" ?>\n<pages>\n')
+    box_id = 0
+    page = 0
+    top = 0
+    for indented, lines in boxes:
+        height = 11.0 * len(lines)
+        if page == 0 or top - height < 60:
+            if page:
+                fp.write('</page>\n')
+            page += 1
+            top = 790.0
+            fp.write(f'<page id="{page}" bbox="0.000,0.000,595.276,{page_height:.3f}" rotate="0">\n')
+            header = f'Plenarprotokoll {wp}/{number} – Seite {page}'
+            fp.write(f'<textbox id="{box_id}" bbox="57.000,805.000,300.000,815.000">\n<textline bbox="57.000,805.000,300.000,815.000">')
+            fp.write(''.join(f'<text font="ABCDEF+ArialMT" bbox="0,0,1,1" size="9.000">{escape(char)}</text>' for char in header))
+            fp.write('<text>\n</text></textline>\n</textbox>\n')
+            box_id += 1
+        left = 90.0 if indented else 57.0
+        fp.write(f'<textbox id="{box_id}" bbox="{left:.3f},{top - height:.3f},{left + 220:.3f},{top:.3f}">\n')
+        for k, runs in enumerate(lines):
+            fp.write(f'<textline bbox="{left:.3f},{top - 11 * (k + 1):.3f},{left + 220:.3f},{top - 11 * k:.3f}">')
+            for part, bold in runs:
+                font = 'ABCDEF+Arial-BoldMT' if bold else 'ABCDEF+ArialMT'
+                fp.write(''.join(f'<text font="{font}" bbox="0,0,1,1" size="9.000">{escape(char)}</text>' for char in part))
+            fp.write('<text>\n</text></textline>\n')
+        fp.write('</textbox>\n')
+        box_id += 1
+        top -= height + 6
+    if page:
+        fp.write('</page>\n')
+    fp.write('</pages>\n')
+
+
+# layout of writes_layout_xml for stage 4
+LAYOUT_PARAMS = {'header_bound': 800, 'indentation_bound_left': 85, 'indentation_bound_right': 340}
+
+
+def writes_session(state, number, out, wp=None, seed=0, speeches=(25, 40), xml=False):
+    """writes one session to out/txt (and out/xml), returns the number of lines"""
+    from lib import line_records
+
+    template = TEMPLATES[state]
+    wp = wp or template['wp']
+    text = generates_session(state, number, wp, seed, speeches)
+    name = template['filename'].format(wp=wp, number=number)
+    with open(os.path.join(out, 'txt', name + '_xml.txt'), 'w', encoding='utf-8') as fp:
+        fp.write(text)
+    with open(os.path.join(out, 'txt', name + line_records.RECORDS_SUFFIX), 'w', encoding='utf-8', newline='\n') as fp:
+        line_records.writes_records(line_records.records_from_text(text), fp)
+    if xml:
+        with open(os.path.join(out, 'xml', name + '.xml'), 'w', encoding='utf-8') as fp:
+            writes_layout_xml(text, state, wp, number, fp)
+    return text.count('\n')
+
+
+def writes_sessions(state, out, sessions, wp=None, seed=0, speeches=(25, 40), xml=False, jobs=1):
+    """
+    writes a synthetic corpus of a state
+
+    Keyword arguments:
+    state: "HH", "NRW" or "SN"
+    out: folder of the state, gets txt/ (and xml/ with params_{STATE}.json)
+    sessions: number of sessions
+    wp, seed, speeches, xml: see generates_session and writes_session
+    jobs: number of worker processes
+
+    returns the number of lines written
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    os.makedirs(os.path.join(out, 'txt'), exist_ok=True)
+    if xml:
+        os.makedirs(os.path.join(out, 'xml'), exist_ok=True)
+        with open(os.path.join(out, f'params_{state}.json'), 'w', encoding='utf-8') as fp:
+            fp.write(json.dumps(LAYOUT_PARAMS))
+    numbers = range(1, sessions + 1)
+    arguments = ([state] * sessions, numbers, [out] * sessions, [wp] * sessions, [seed] * sessions,
+                 [speeches] * sessions, [xml] * sessions)
+    if jobs == 1:
+        return sum(map(writes_session, *arguments))
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        return sum(executor.map(writes_session, *arguments, chunksize=max(1, sessions // (8 * jobs))))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='writes synthetic plenary protocols in the format of stage 4')
+    parser.add_argument('state', choices=sorted(TEMPLATES))
+    parser.add_argument('--sessions', type=int, default=100)
+    parser.add_argument('--out', default='data/synthetic', help='root folder, the sessions go to OUT/{STATE}')
+    parser.add_argument('--wp', type=int, help='legislative period, default of the state')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--speeches', type=int, nargs=2, default=(25, 40), metavar=('MIN', 'MAX'))
+    parser.add_argument('--xml', action='store_true', help='also write the layout XML for stage 4')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args(argv)
+
+    out = os.path.join(args.out, args.state)
+    lines = writes_sessions(args.state, out, args.sessions, args.wp, args.seed, tuple(args.speeches), args.xml, args.jobs)
+    print(f'{args.sessions} sessions, {lines} lines written to {out}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,160 @@
+# coding: utf-8
+import argparse
+import os
+import sys
+
+from lib.pipeline import loads_stage, lists_files
+
+# Command line entry point of the pipeline, one subcommand per stage:
+#
+# python landtag.py retrieve   --state HH --wp 22            1_retrieve.py
+# python landtag.py layout     --state HH --jobs 6           2_analyze_layout.py
+# python landtag.py pdf-to-xml --state HH --jobs 8           3_parser_wrapper_to_xml.py
+# python landtag.py xml-to-txt --state HH --jobs 8           4_parse_transcript_xml_to_txt.py
+# python landtag.py parse      --state HH --outputs csv parquet   lib/parser_engine.py
+# python landtag.py run        --state NRW --jobs 8          stages 3 to 5 at the same time, lib/pipeline.py
+# python landtag.py work       --state NRW --jobs 8          the same on several machines, lib/work_queue.py
+# python landtag.py merge-traces data/HH/metrics/*.trace.json -o timeline.json
+#
+# --data-path replaces data/{STATE}, --wp limits a stage to the sessions of these legislative
+# periods; parse writes {STATE}.csv, the speakers and the database rows of the whole state and takes
+# no --wp, run and work limit only stages 3 and 4 to them. Stages and their dependencies (pdfminer, bs4, pandas, ...) are imported only when their
+# subcommand runs, so --help answers at once. The numbered scripts still run on their own.
+
+STATES = ['HH', 'NRW', 'SN']
+
+
+def retrieves(args):
+    stage = loads_stage('retrieve')
+    stage.retrieves_plenary_records(args.state, args.wp or stage.WPS, args.first, args.last, args.data_path)
+
+
+def scans_layout(args):
+    files = lists_files(os.path.join(args.data_path, 'pdf'), '.pdf', args.state, args.wp)
+    loads_stage('layout').scans_layout_plenary_records(args.state, args.data_path, args.samples, args.jobs, files)
+
+
+def converts_pdfs(args):
+    files = lists_files(os.path.join(args.data_path, 'pdf'), '.pdf', args.state, args.wp)
+    loads_stage('pdf-to-xml').converts_pdf_to_text(args.state, args.data_path, args.jobs, files, args.pdf2txt, args.char_margin,
+                                                   args.force)
+
+
+def converts_xml(args):
+    files = lists_files(os.path.join(args.data_path, 'xml'), '.xml', args.state, args.wp)
+    loads_stage('xml-to-txt').iteratesFiles(args.state, args.data_path, args.jobs, files, args.force)
+
+
+def parses(args):
+    from lib import parser_engine
+
+    parser_engine.parses_state(args.state, data_path=args.data_path, jobs=args.jobs, outputs=args.outputs,
+                               parquet_path=args.parquet_path, sqlite_path=args.sqlite_path, cache=not args.no_cache,
+                               compression=args.compression, resolves_names=not args.no_resolve_names, force=args.force)
+
+
+def runs(args):
+    from lib import pipeline
+
+    pipeline.runs_pipeline(args.state, data_path=args.data_path, jobs=args.jobs, wps=args.wp, pdf2txt=args.pdf2txt,
+                           char_margin=args.char_margin, force=args.force, queue_size=args.queue_size, cache=not args.no_cache,
+                           outputs=args.outputs, parquet_path=args.parquet_path, sqlite_path=args.sqlite_path,
+                           compression=args.compression, resolves_names=not args.no_resolve_names)
+
+
+def works(args):
+    from lib import pipeline
+
+    pipeline.runs_pipeline(args.state, data_path=args.data_path, jobs=args.jobs, wps=args.wp, pdf2txt=args.pdf2txt,
+                           char_margin=args.char_margin, force=args.force, queue_size=args.queue_size, cache=not args.no_cache,
+                           stages=tuple(stage.replace('-', '_') for stage in args.stages), distributed=True)
+
+
+def merges_traces(args):
+    from lib import metrics
+
+    print(metrics.merges_traces(args.traces, args.output))
+
+
+def builds_parser():
+    """the argparse parser with one subparser per stage"""
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--state', required=True, choices=STATES)
+    common.add_argument('--data-path', help='folder of the state, default data/{STATE}')
+    common.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='worker processes, default the number of CPUs')
+    common.add_argument('--metrics', help='folder of the metrics reports (default data/{STATE}/metrics), 0 for none')
+    common.add_argument('--profile', nargs='+', choices=['cprofile', 'tracemalloc'], help='profile the run, see lib/metrics.py')
+    # parse covers the whole state, the other stages can be limited to legislative periods
+    selecting = argparse.ArgumentParser(add_help=False)
+    selecting.add_argument('--wp', type=int, nargs='+', help='legislative periods, default all')
+    # stages 3 to 5 rebuild only stale artifacts, see lib/build_manifest.py
+    rebuild = argparse.ArgumentParser(add_help=False)
+    rebuild.add_argument('--force', action='store_true', help='rebuild all artifacts, not only the stale ones')
+    converting = argparse.ArgumentParser(add_help=False)
+    converting.add_argument('--pdf2txt', default='../venv/bin/pdf2txt.py', help='path of pdf2txt.py')
+    converting.add_argument('--char-margin', type=float, default=3)
+    parsing = argparse.ArgumentParser(add_help=False)
+    parsing.add_argument('--outputs', nargs='+', default=['csv'], choices=['csv', 'parquet', 'sqlite', 'corpus'],
+                         help='formats of the speeches, default csv')
+    parsing.add_argument('--parquet-path', help='root of the parquet dataset, default data/parquet')
+    parsing.add_argument('--sqlite-path', help='SQLite database, default data/speeches.sqlite')
+    parsing.add_argument('--compression', choices=['gzip'], help='write {STATE}.csv.gz')
+    parsing.add_argument('--no-cache', action='store_true', help='parse all sessions again')
+    parsing.add_argument('--no-resolve-names', action='store_true', help='keep broken speaker names')
+
+    parser = argparse.ArgumentParser(prog='landtag', description='parses the plenary protocols of German state parliaments')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    command = commands.add_parser('retrieve', parents=[common, selecting], help='stage 1: downloads the pdfs (HH, NRW)')
+    command.add_argument('--first', type=int, default=1, help='first session number')
+    command.add_argument('--last', type=int, default=199, help='last session number')
+    command.set_defaults(func=retrieves)
+
+    command = commands.add_parser('layout', parents=[common, selecting], help='stage 2: writes params_{STATE}.json from sample pdfs')
+    command.add_argument('--samples', type=int, default=6, help='number of random pdfs')
+    command.set_defaults(func=scans_layout)
+
+    command = commands.add_parser('pdf-to-xml', parents=[common, selecting, rebuild, converting], help='stage 3: converts the pdfs with pdf2txt.py')
+    command.set_defaults(func=converts_pdfs)
+
+    command = commands.add_parser('xml-to-txt', parents=[common, selecting, rebuild], help='stage 4: converts the xml files to _xml.txt and _lines.tsv')
+    command.set_defaults(func=converts_xml)
+
+    command = commands.add_parser('parse', parents=[common, rebuild, parsing], help='stage 5: splits the sessions into speeches')
+    command.set_defaults(func=parses)
+
+    command = commands.add_parser('run', parents=[common, selecting, rebuild, converting, parsing],
+                                  help='stages 3 to 5 at the same time, each session moves on as soon as it is ready')
+    command.add_argument('--queue-size', type=int, help='sessions that may wait for a stage, default 2 * jobs')
+    command.set_defaults(func=runs)
+
+    command = commands.add_parser('work', parents=[common, selecting, rebuild, converting],
+                                  help='stages 3 to 5 on one of several machines that share the data folder; run parse when all are done')
+    command.add_argument('--stages', nargs='+', default=['pdf-to-xml', 'xml-to-txt', 'parse'], choices=['pdf-to-xml', 'xml-to-txt', 'parse'])
+    command.add_argument('--queue-size', type=int, help='sessions that may wait for a stage, default 2 * jobs')
+    command.add_argument('--no-cache', action='store_true', help='leave stage 5 to parse')
+    command.set_defaults(func=works)
+
+    command = commands.add_parser('merge-traces', help='joins the .trace.json files of several runs into one timeline')
+    command.add_argument('traces', nargs='+')
+    command.add_argument('-o', '--output', default='timeline.trace.json')
+    command.set_defaults(func=merges_traces)
+    return parser
+
+
+def main(argv=None):
+    parser = builds_parser()
+    args = parser.parse_args(argv)
+    if getattr(args, 'state', None):
+        args.data_path = args.data_path or f'data/{args.state}'
+        # worker processes inherit the environment
+        if args.metrics:
+            os.environ['LANDTAG_METRICS'] = args.metrics
+        if args.profile:
+            os.environ['LANDTAG_PROFILE'] = ','.join(args.profile)
+    args.func(args)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,42 @@
+# coding: utf-8
+
+# Aggregates of the speech table, computed by stage 5 session by session while the rows are
+# written (speech_output.SpeechWriter), so questions like "words per party and session" read
+# {STATE}_aggregates.csv instead of scanning {STATE}.csv. One row per
+# (state, wp, session, speaker_id, speaker, party, issue) of a session, with its date and the counts
+#
+# speeches: distinct speeches (seq) of the speaker
+# fragments: rows of the speaker's speeches, i.e. the parts between interjections
+# words: whitespace separated tokens of these rows
+# interjections: interjections during the speaker's speeches
+#
+# Rows without speaker count for speaker_id 0. With outputs including "sqlite" the same rows are in
+# the table aggregates.
+
+KEY_COLUMNS = ['state', 'wp', 'session', 'date', 'speaker_id', 'speaker', 'party', 'issue']
+COUNT_COLUMNS = ['speeches', 'fragments', 'words', 'interjections']
+COLUMNS = KEY_COLUMNS + COUNT_COLUMNS
+
+
+def aggregates_session(pd_speeches):
+    """
+    the aggregate rows of one session
+
+    Keyword arguments:
+    pd_speeches: DataFrame of one session as returned by speech_table.SpeechColumns.to_frame()
+
+    returns a DataFrame with COLUMNS in the order in which the keys first appear
+    """
+    import numpy as np
+
+    pd_speeches = pd_speeches.assign(
+        speaker_id=pd_speeches['speaker_id'] if 'speaker_id' in pd_speeches else 0,
+        spoken=~pd_speeches['interjection'],
+        words=np.where(pd_speeches['interjection'], 0, pd_speeches['speech'].fillna('').str.split().str.len()),
+    )
+    # distinct speeches: the first row of every seq outside interjections
+    pd_speeches['first_row'] = pd_speeches['spoken'] & ~pd_speeches.duplicated(KEY_COLUMNS + ['seq', 'spoken'])
+    grouped = pd_speeches.groupby(KEY_COLUMNS, dropna=False, sort=False)
+    aggregates = grouped.agg(speeches=('first_row', 'sum'), fragments=('spoken', 'sum'), words=('words', 'sum'),
+                             interjections=('interjection', 'sum')).reset_index()
+    return aggregates[COLUMNS].astype({column: 'int64' for column in COUNT_COLUMNS})
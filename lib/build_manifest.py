@@ -0,0 +1,229 @@
+# coding: utf-8
+import hashlib
+import json
+import os
+import socket
+import time
+import uuid
+from contextlib import contextmanager
+
+# Incremental builds of the stages. data/{STATE}/manifest.json records for every artifact (the xml of
+# a pdf, the _xml.txt and _lines.tsv of an xml, the {STATE}.csv of all sessions) the sha256 of its
+# inputs, of its outputs and of the parameters that determine it:
+#
+# stage 3: pdf -> xml; pdf2txt.py (its content) and --char-margin
+# stage 4: xml -> _xml.txt, _lines.tsv; params_{STATE}.json and the code of stage 4
+# stage 5: all _xml.txt/_lines.tsv -> {STATE}.csv; the profile (session_cache.hashes_profile)
+#          and the output options
+#
+# An artifact is rebuilt if an input, a parameter or an output changed or an output is missing.
+# A new pdf gives a new xml, whose hash makes its txt stale, whose hash makes the csv stale; the
+# other artifacts are left alone. Stage 5 parses only changed sessions (lib/session_cache.py).
+#
+# Outputs of stages 3 and 4 that exist without a manifest entry (data from before the manifest)
+# are taken as built if they are newer than their inputs, like make does; stage 5 writes them again.
+# Hashes are kept per file with its size and modification time, so unchanged files are not read again.
+# Several processes or machines (lib/work_queue.py) may save the same manifest: saves() merges the
+# entries of this process into the entries on disk under a lock file.
+#
+# Outputs that are rows in an SQLite database rather than files are named sqlite:{db_path}#{key}
+# (names_sqlite_marker). Whoever writes the rows stores a new token under the key in the table
+# manifest_markers in the same transaction (marks_sqlite); the token stands for the hash of a file,
+# so a deleted database, deleted rows of the key or rows written by another run make the artifact stale.
+
+MANIFEST_FILE = 'manifest.json'
+# entries after which the manifest is saved during a run
+SAVE_EVERY = 50
+# seconds after which the lock of a crashed process is removed
+LOCK_EXPIRY = 60
+SQLITE_PREFIX = 'sqlite:'
+MARKER_TABLE = 'manifest_markers'
+
+
+def hashes_params(**params):
+    """sha256 of parameters that can be written as json"""
+    return hashlib.sha256(json.dumps(params, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def names_sqlite_marker(db_path, key):
+    """the output name of the rows stored under key in the database db_path"""
+    return f'{SQLITE_PREFIX}{db_path}#{key}'
+
+
+def marks_sqlite(connection, key, rows):
+    """
+    stores a new token for the rows under key, in the transaction of the caller
+
+    Keyword arguments:
+    connection: sqlite3 connection of the database
+    key: name of the rows, e.g. "speeches/HH"
+    rows: number of rows, kept with the token
+    """
+    connection.execute(f"CREATE TABLE IF NOT EXISTS {MARKER_TABLE} (key TEXT PRIMARY KEY, rows INTEGER, token TEXT NOT NULL)")
+    connection.execute(f"INSERT OR REPLACE INTO {MARKER_TABLE} (key, rows, token) VALUES (?, ?, ?)",
+                       (key, rows, uuid.uuid4().hex))
+
+
+def reads_sqlite_marker(output):
+    """rows and token of an output named by names_sqlite_marker, None if the database or the key is missing"""
+    import sqlite3
+
+    db_path, key = output[len(SQLITE_PREFIX):].rsplit('#', 1)
+    if not os.path.exists(db_path):
+        return None
+    connection = sqlite3.connect(db_path)
+    try:
+        row = connection.execute(f"SELECT rows, token FROM {MARKER_TABLE} WHERE key = ?", (key,)).fetchone()
+    except sqlite3.OperationalError:
+        # no table manifest_markers: the rows were written before the markers
+        row = None
+    finally:
+        connection.close()
+    return None if row is None else f'{row[0]}:{row[1]}'
+
+
+def is_marker(path):
+    return path.startswith(SQLITE_PREFIX)
+
+
+def exists(path):
+    """whether the file or the rows of a marker exist"""
+    if is_marker(path):
+        return reads_sqlite_marker(path) is not None
+    return os.path.exists(path)
+
+
+@contextmanager
+def locks(path, expiry=LOCK_EXPIRY):
+    """holds the lock file path while the block runs; waits while another process holds it"""
+    while True:
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(path) > expiry:
+                    os.remove(path)
+                    continue
+            except FileNotFoundError:
+                continue
+            time.sleep(0.05)
+    try:
+        os.close(fd)
+        yield
+    finally:
+        os.remove(path)
+
+
+class Manifest:
+    """
+    artifacts of one state and the hashes they were built from
+
+    Keyword arguments:
+    path: json file of the manifest
+    """
+
+    def __init__(self, path):
+        self.path = path
+        # artifacts: first output -> {'stage', 'inputs': {path: sha256}, 'outputs': {path: sha256}, 'params': sha256, ...}
+        # files: path -> [size, mtime_ns, sha256]
+        self.artifacts, self.files = self.reads()
+        # artifacts recorded since the last save
+        self.changed = set()
+
+    def reads(self):
+        """artifacts and files saved in the manifest file"""
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, encoding='utf-8') as f:
+                    content = json.load(f)
+                return content['artifacts'], content['files']
+            except (OSError, ValueError, KeyError):
+                # a damaged manifest rebuilds what cannot be taken as built
+                pass
+        return {}, {}
+
+    def hashes(self, path):
+        """sha256 of a file, read again only if its size or modification time changed; the token of a marker"""
+        if is_marker(path):
+            return reads_sqlite_marker(path)
+        stat = os.stat(path)
+        known = self.files.get(path)
+        if known is not None and known[0] == stat.st_size and known[1] == stat.st_mtime_ns:
+            return known[2]
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        self.files[path] = [stat.st_size, stat.st_mtime_ns, digest.hexdigest()]
+        return digest.hexdigest()
+
+    def is_stale(self, outputs, inputs, params, stage=None, adopts=True):
+        """
+        whether outputs have to be built (again)
+
+        Keyword arguments:
+        outputs: paths of the artifact's files or markers (names_sqlite_marker), the first one names the artifact
+        inputs: paths of the files it is built from
+        params: hash of the parameters, see hashes_params
+        stage: stage name, recorded if existing outputs are taken as built
+        adopts: take outputs without entry as built if they are newer than the inputs
+        """
+        if not all(exists(path) for path in outputs):
+            return True
+        entry = self.artifacts.get(outputs[0])
+        if entry is None:
+            if not adopts:
+                return True
+            # outputs from before the manifest
+            newest_input = max((os.path.getmtime(path) for path in inputs), default=0)
+            if min(os.path.getmtime(path) for path in outputs if not is_marker(path)) >= newest_input:
+                self.records(outputs, inputs, params, stage)
+                return False
+            return True
+        return (entry['params'] != params
+                or entry['inputs'] != {path: self.hashes(path) for path in inputs}
+                or entry['outputs'] != {path: self.hashes(path) for path in outputs})
+
+    def records(self, outputs, inputs, params, stage=None, **extra):
+        """
+        records that outputs were built from inputs with params
+
+        Keyword arguments:
+        outputs, inputs, params, stage: see is_stale
+        extra: more values of the entry, e.g. the number of rows
+        """
+        self.artifacts[outputs[0]] = {'stage': stage, 'inputs': {path: self.hashes(path) for path in inputs},
+                                      'outputs': {path: self.hashes(path) for path in outputs}, 'params': params, **extra}
+        self.changed.add(outputs[0])
+        if len(self.changed) >= SAVE_EVERY:
+            self.saves()
+
+    def entry(self, output):
+        return self.artifacts.get(output)
+
+    def saves(self):
+        """
+        writes the manifest atomically
+
+        The entries of other processes saved since this manifest was read are kept and read in, the
+        artifacts recorded here replace theirs.
+        """
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with locks(self.path + '.lock'):
+            artifacts, files = self.reads()
+            artifacts.update((output, self.artifacts[output]) for output in self.changed)
+            files.update(self.files)
+            self.artifacts, self.files = artifacts, files
+            temporary = f'{self.path}.{socket.gethostname()}.{os.getpid()}.tmp'
+            with open(temporary, 'w', encoding='utf-8') as f:
+                json.dump({'artifacts': self.artifacts, 'files': self.files}, f, separators=(',', ':'))
+            os.replace(temporary, self.path)
+        self.changed = set()
+
+
+def opens_manifest(data_path):
+    """the manifest of the state in data_path"""
+    return Manifest(os.path.join(data_path, MANIFEST_FILE))
@@ -0,0 +1,156 @@
+# coding: utf-8
+import datetime
+import os
+
+from lib import speech_output
+
+# Queries over the parquet dataset of stage 5 (data/parquet, lib/speech_output.py), e.g.
+#
+# corpus = Corpus.open('data/parquet').filter(state='HH', wp=22, speaker='Carola Veit',
+#                                             date_between=('2020-01-01', '2020-12-31'), interjection=False)
+# for batch in corpus.select('speaker', 'party', 'speech').batches():
+#     ...
+#
+# Filters on state, wp and session select the partition folders before anything is read: a single
+# state or wp narrows the folder walk, the other partitions are dropped by their path. Filters on the
+# other columns are pushed down to the parquet reader, which skips row groups by their statistics,
+# and only the selected columns are read. Results are streamed in batches, partition by partition
+# in (state, wp, session) order and within a session in (seq, sub) order.
+
+PARTITION_COLUMNS = speech_output.PARTITION_COLUMNS
+# filter argument -> column
+FILTER_COLUMNS = {'state': 'state', 'wp': 'wp', 'session': 'session', 'speaker': 'speaker', 'speaker_id': 'speaker_id',
+                  'party': 'party', 'role': 'role', 'issue': 'issue', 'interjection': 'interjection',
+                  'president': 'president', 'executive': 'executive', 'servant': 'servant'}
+
+
+def parses_date(value):
+    """datetime.date of a date or of a YYYY-MM-DD string"""
+    if isinstance(value, str):
+        return datetime.date.fromisoformat(value)
+    return value
+
+
+class Corpus:
+    """
+    the speeches of the parquet dataset that match the filters so far; filter() and select() return
+    a new Corpus, nothing is read before batches(), to_frame() or counts()
+
+    Keyword arguments:
+    parquet_path: root folder of the dataset
+    conditions: dict filter argument -> value, see filter
+    columns: columns to read, None for all
+    """
+
+    def __init__(self, parquet_path, conditions=None, columns=None):
+        self.parquet_path = parquet_path
+        self.conditions = conditions or {}
+        self.columns = columns
+
+    @classmethod
+    def open(cls, parquet_path='data/parquet'):
+        """the whole dataset in parquet_path"""
+        if not os.path.isdir(parquet_path):
+            raise FileNotFoundError(f"No parquet dataset in {parquet_path}, run stage 5 with outputs parquet")
+        return cls(parquet_path)
+
+    def filter(self, date_between=None, **conditions):
+        """
+        keeps the rows that match all conditions
+
+        Keyword arguments:
+        date_between: (first, last) date, inclusive, as date or YYYY-MM-DD; None for an open end
+        conditions: state, wp, session, speaker, speaker_id, party, role, issue, interjection, president,
+            executive, servant; a value, or a list of values of which one has to match
+        """
+        unknown = set(conditions) - set(FILTER_COLUMNS)
+        if unknown:
+            raise TypeError(f"Unknown filters {sorted(unknown)}, possible are {sorted(FILTER_COLUMNS)} and date_between")
+        combined = dict(self.conditions)
+        combined.update((name, value) for name, value in conditions.items() if value is not None)
+        if date_between is not None:
+            combined['date_between'] = tuple(parses_date(value) for value in date_between)
+        return Corpus(self.parquet_path, combined, self.columns)
+
+    def select(self, *columns):
+        """reads only these columns"""
+        return Corpus(self.parquet_path, self.conditions, list(columns))
+
+    def expression(self):
+        """the conditions as pyarrow expression, None without conditions"""
+        import pyarrow as pa
+        import pyarrow.compute as pc
+
+        expression = None
+        for name, value in self.conditions.items():
+            if name == 'date_between':
+                first, last = value
+                parts = []
+                if first is not None:
+                    parts.append(pc.field('date') >= pa.scalar(first, pa.date32()))
+                if last is not None:
+                    parts.append(pc.field('date') <= pa.scalar(last, pa.date32()))
+            elif isinstance(value, (list, tuple, set)):
+                parts = [pc.field(FILTER_COLUMNS[name]).isin(list(value))]
+            else:
+                parts = [pc.field(FILTER_COLUMNS[name]) == value]
+            for part in parts:
+                expression = part if expression is None else expression & part
+        return expression
+
+    def folder(self):
+        """the folder of the partitions that can match: state=../wp=.. if the filters name a single one"""
+        folder = self.parquet_path
+        for column in ['state', 'wp']:
+            value = self.conditions.get(column)
+            if value is None or isinstance(value, (list, tuple, set)):
+                break
+            folder = os.path.join(folder, f'{column}={value}')
+        return folder
+
+    def dataset(self):
+        """pyarrow dataset of the parquet files of the partitions that can match, in (state, wp, session) order"""
+        import pyarrow.dataset as ds
+
+        folder = self.folder()
+        if not os.path.isdir(folder):
+            return None
+        dataset = ds.dataset(folder, partitioning=speech_output.parquet_partitioning(), partition_base_dir=self.parquet_path)
+        expression = self.expression()
+        # get_fragments drops the partitions whose path contradicts the filter
+        fragments = list(dataset.get_fragments(filter=expression) if expression is not None else dataset.get_fragments())
+
+        def keys(fragment):
+            values = ds.get_partition_keys(fragment.partition_expression)
+            return tuple(values.get(column) for column in PARTITION_COLUMNS) + (fragment.path,)
+        return ds.FileSystemDataset(sorted(fragments, key=keys), dataset.schema, dataset.format, dataset.filesystem)
+
+    def batches(self, batch_size=65536):
+        """
+        yields the matching rows as DataFrames of at most batch_size rows
+
+        Keyword arguments:
+        batch_size: rows per batch
+        """
+        dataset = self.dataset()
+        if dataset is None:
+            return
+        for batch in dataset.to_batches(columns=self.columns, filter=self.expression(), batch_size=batch_size):
+            if batch.num_rows:
+                yield batch.to_pandas()
+
+    def to_frame(self):
+        """all matching rows as one DataFrame"""
+        import pandas as pd
+
+        frames = list(self.batches())
+        if not frames:
+            return pd.DataFrame(columns=self.columns or [])
+        return pd.concat(frames, ignore_index=True)
+
+    def counts(self):
+        """number of matching rows, reads only the columns of the filters"""
+        dataset = self.dataset()
+        if dataset is None:
+            return 0
+        return dataset.count_rows(filter=self.expression())
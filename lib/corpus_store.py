@@ -0,0 +1,231 @@
+# coding: utf-8
+import json
+import os
+import shutil
+
+from lib import metrics
+
+# Corpus store: the speeches of a state as flat files for random access without loading the
+# table (output "corpus" of parses_state), in data/{STATE}/corpus:
+#
+# speech.bin: the texts of all rows in UTF-8, one after the other in (wp, session, seq, sub) order
+# offsets.npy: uint64, rows + 1 entries; the text of row i is speech.bin[offsets[i]:offsets[i + 1]]
+# wp.npy, session.npy, seq.npy, sub.npy, speaker_id.npy, interjection.npy, president.npy,
+#     executive.npy, servant.npy: one fixed-width array per column
+# date.npy: datetime64[D], NaT for rows without date
+# party.npy: index into the parties of meta.json, -1 for rows without party
+# meta.json: state, number of rows, parties
+#
+# opens_corpus_store() maps the files into memory (numpy.load(mmap_mode='r'), mmap), so opening
+# takes the same time and memory whatever the size of the corpus; a speech is read from the pages
+# it covers. Speaker names are in {STATE}_speakers.csv under the speaker_id.
+
+CORPUS_FOLDER = 'corpus'
+SPEECH_FILE = 'speech.bin'
+META_FILE = 'meta.json'
+COLUMN_TYPES = {'wp': 'int8', 'session': 'int16', 'seq': 'int32', 'sub': 'int32', 'speaker_id': 'int32',
+                'date': 'datetime64[D]', 'interjection': 'bool', 'president': 'bool', 'executive': 'bool',
+                'servant': 'bool', 'party': 'int16'}
+
+
+def default_corpus_path(data_path):
+    """data/{STATE}/corpus"""
+    return os.path.join(data_path, CORPUS_FOLDER)
+
+
+class CorpusWriter:
+    """
+    writes the corpus store of a state session by session
+
+    The files are written to corpus.partial, which replaces the corpus folder when all sessions are
+    written, so readers never see a half-written corpus.
+
+    Keyword arguments:
+    state: abbreviation of the state
+    folder: corpus folder, see default_corpus_path
+    """
+
+    def __init__(self, state, folder):
+        self.state = state
+        self.folder = folder
+        self.partial = folder + '.partial'
+        if os.path.exists(self.partial):
+            shutil.rmtree(self.partial)
+        os.makedirs(self.partial)
+        self.speech_file = open(os.path.join(self.partial, SPEECH_FILE), 'wb')
+        self.size = 0
+        # numpy arrays per session and column
+        self.chunks = {column: [] for column in ['offsets'] + list(COLUMN_TYPES)}
+        # party -> index
+        self.parties = {}
+
+    def writes_session(self, pd_speeches):
+        """
+        appends the speeches of one session
+
+        Keyword arguments:
+        pd_speeches: DataFrame as returned by speech_table.SpeechColumns.to_frame(), with speaker_id
+        """
+        import numpy as np
+        import pandas as pd
+
+        # missing texts are None or, in string columns, NaN
+        encoded = [speech.encode('utf-8') if isinstance(speech, str) else b'' for speech in pd_speeches['speech']]
+        lengths = np.fromiter((len(text) for text in encoded), dtype=np.uint64, count=len(encoded))
+        self.chunks['offsets'].append(self.size + np.cumsum(lengths, dtype=np.uint64) - lengths)
+        self.speech_file.write(b''.join(encoded))
+        self.size += int(lengths.sum())
+
+        for column, dtype in COLUMN_TYPES.items():
+            if column == 'date':
+                values = pd.to_datetime(pd_speeches['date'], format='%Y-%m-%d', errors='coerce').to_numpy().astype(dtype)
+            elif column == 'party':
+                values = np.array([-1 if pd.isna(party) else self.parties.setdefault(party, len(self.parties))
+                                   for party in pd_speeches['party']], dtype=dtype)
+            elif column in pd_speeches:
+                values = pd_speeches[column].to_numpy(dtype=dtype)
+            else:
+                # speeches without speaker ids (lib/speaker_table.py) have speaker 0
+                values = np.zeros(len(pd_speeches), dtype=dtype)
+            self.chunks[column].append(values)
+
+    def closes(self):
+        """writes the arrays and meta.json and replaces the previous corpus"""
+        import numpy as np
+
+        self.speech_file.close()
+        offsets = self.chunks.pop('offsets')
+        offsets.append(np.array([self.size], dtype=np.uint64))
+        np.save(os.path.join(self.partial, 'offsets.npy'), np.concatenate(offsets))
+        rows = 0
+        for column, chunks in self.chunks.items():
+            values = np.concatenate(chunks) if chunks else np.zeros(0, dtype=COLUMN_TYPES[column])
+            np.save(os.path.join(self.partial, column + '.npy'), values)
+            rows = len(values)
+        # meta.json comes last, the manifest (lib/build_manifest.py) checks it
+        with open(os.path.join(self.partial, META_FILE), 'w', encoding='utf-8') as f:
+            json.dump({'state': self.state, 'rows': rows, 'bytes': self.size, 'parties': list(self.parties),
+                       'columns': COLUMN_TYPES}, f, ensure_ascii=False, indent=1)
+
+        previous = self.folder + '.previous'
+        if os.path.exists(previous):
+            # left by a run that stopped between the two renames
+            shutil.rmtree(previous)
+        if os.path.exists(self.folder):
+            os.replace(self.folder, previous)
+        os.replace(self.partial, self.folder)
+        if os.path.exists(previous):
+            shutil.rmtree(previous)
+        metrics.writes(os.path.join(self.folder, SPEECH_FILE))
+
+    def discards(self):
+        """closes the speech file and removes corpus.partial; the previous corpus is left"""
+        self.speech_file.close()
+        shutil.rmtree(self.partial, ignore_errors=True)
+
+
+class CorpusStore:
+    """
+    the memory-mapped corpus of a state, see opens_corpus_store
+
+    Keyword arguments:
+    folder: corpus folder written by CorpusWriter
+    """
+
+    def __init__(self, folder):
+        import mmap
+
+        import numpy as np
+
+        self.folder = folder
+        with open(os.path.join(folder, META_FILE), encoding='utf-8') as f:
+            self.meta = json.load(f)
+        self.state = self.meta['state']
+        self.parties = self.meta['parties']
+        self.offsets = np.load(os.path.join(folder, 'offsets.npy'), mmap_mode='r')
+        self.columns = {column: np.load(os.path.join(folder, column + '.npy'), mmap_mode='r') for column in self.meta['columns']}
+        self.speech_file = open(os.path.join(folder, SPEECH_FILE), 'rb')
+        # an empty file cannot be mapped
+        self.buffer = mmap.mmap(self.speech_file.fileno(), 0, access=mmap.ACCESS_READ) if self.meta['bytes'] else b''
+
+    def __len__(self):
+        return self.meta['rows']
+
+    def __getitem__(self, column):
+        """the memory-mapped array of a column, e.g. store['speaker_id']"""
+        return self.columns[column]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.closes()
+
+    def speech_bytes(self, row):
+        """the UTF-8 text of a row as memoryview of the mapped file, without copying"""
+        return memoryview(self.buffer)[int(self.offsets[row]):int(self.offsets[row + 1])]
+
+    def speech(self, row):
+        """the text of a row"""
+        return str(self.speech_bytes(row), 'utf-8')
+
+    def speeches(self, rows):
+        """the texts of rows, e.g. a range or an array of row numbers"""
+        for row in rows:
+            yield self.speech(row)
+
+    def party(self, row):
+        """the party of a row, None without party"""
+        index = int(self.columns['party'][row])
+        return self.parties[index] if index >= 0 else None
+
+    def finds_session(self, wp, session):
+        """the range of the rows of a session; binary search over the sorted wp and session columns"""
+        import numpy as np
+
+        wps = self.columns['wp']
+        first, last = np.searchsorted(wps, wp, 'left'), np.searchsorted(wps, wp, 'right')
+        sessions = self.columns['session'][first:last]
+        return range(first + int(np.searchsorted(sessions, session, 'left')), first + int(np.searchsorted(sessions, session, 'right')))
+
+    def to_frame(self, rows, columns=None):
+        """
+        the rows as DataFrame with their texts and parties
+
+        Keyword arguments:
+        rows: range, slice or array of row numbers
+        columns: columns to include besides speech and party, all if None
+        """
+        import numpy as np
+        import pandas as pd
+
+        if isinstance(rows, range):
+            rows = slice(rows.start, rows.stop, rows.step)
+        positions = np.arange(*rows.indices(len(self))) if isinstance(rows, slice) else np.asarray(rows)
+        data = {column: np.asarray(self.columns[column][positions]) for column in (columns or self.columns) if column != 'party'}
+        data['party'] = [self.party(row) for row in positions]
+        data['speech'] = list(self.speeches(positions))
+        return pd.DataFrame(data, index=positions)
+
+    def closes(self):
+        try:
+            if not isinstance(self.buffer, bytes):
+                self.buffer.close()
+        except BufferError:
+            # memoryviews of speech_bytes() are still in use, the map is released with them
+            pass
+        self.speech_file.close()
+
+
+def opens_corpus_store(data_path=None, state=None, folder=None):
+    """
+    maps the corpus of a state into memory
+
+    Keyword arguments:
+    data_path: folder of the state, e.g. data/HH
+    state: state abbreviation, for data/{STATE} if data_path is None
+    folder: corpus folder instead of data_path/corpus
+
+    e.g. store = opens_corpus_store('data/HH'); store.speech(store.finds_session(22, 5)[0])
+    """
+    return CorpusStore(folder or default_corpus_path(data_path or f'data/{state}'))
@@ -1,6 +1,8 @@
 import re
 from itertools import tee, islice, zip_longest
 
+from lib import speaker_registry
+
 def lookahead(iterable):
     """Pass through all values from the given iterable, augmented by the
     information if there are more values to come after the current one
@@ -56,73 +58,43 @@ def cleans_line_sn(line):
     return re.sub(r'-(?:\s+)?$',  '', line)
 
 def cleans_executive_speaker_bw(new_speaker, wp, date):
-    if wp==15:
-        if 'Finanzen und Wirtschaft' in new_speaker:
-            new_speaker = 'Nils Schmid'
-        elif 'Staatsministerium' in new_speaker:
-            new_speaker = 'Silke Krebs'
-        elif 'Bundesrat, Europa und internationale' in new_speaker:
-            new_speaker = 'Peter Friedrich'
-        elif 'Umwelt, Klima und Energiewirtschaft' in new_speaker:
-            new_speaker = 'Franz Untersteller'
-        elif 'Kultus, Jugend und Sport' in new_speaker:
-            if date<='2018-08-01':
-                new_speaker = 'Gabriele Warminski-Leitheußer'
-            else:
-                new_speaker = 'Andreas Stoch'
-        elif 'Ländlichen Raum und Verbraucherschutz' in new_speaker:
-            new_speaker = 'Alexander Bonde'
-        elif 'Wissenschaft, Forschung und Kunst' in new_speaker:
-            new_speaker = 'Theresia Bauer'
-        elif 'Verkehr und Infrastruktur' in new_speaker:
-            new_speaker = 'Winfried Hermann'
-        elif 'Arbeit und Sozialordnung, Familie' in new_speaker:
-            new_speaker = 'Katrin Altpeter'
-        elif 'Integration' in new_speaker:
-            new_speaker = 'Bilkay Öney'
-    elif wp==16:
-        if 'Inneres, Digitalisierung und Migration' in new_speaker:
-            new_speaker = 'Thomas Strobl'
-        elif 'Finanzen' in new_speaker:
-            new_speaker = 'Edith Sitzmann'
-        elif 'Kultus, Jugend und Sport' in new_speaker:
-            new_speaker = 'Susanne Eisenmann'
-        elif 'Wissenschaft, Forschung und Kunst' in new_speaker:
-            new_speaker = 'Theresia Bauer'
-        elif 'Umwelt, Klima und Energiewirtschaft' in new_speaker:
-            new_speaker = 'Franz Untersteller'
-        elif 'Wirtschaft, Arbeit und Wohnungsbau' in new_speaker:
-            new_speaker = 'Nicole Hoffmeister-Kraut'
-        elif 'Soziales und Integration' in new_speaker:
-            new_speaker = 'Manfred Lucha'
-        elif 'Ländlichen Raum und Verbraucherschutz' in new_speaker:
-            new_speaker = 'Peter Hauk'
-        elif 'Justiz und für Europa' in new_speaker:
-            new_speaker = 'Guido Wolf'
-        elif 'Verkehr' in new_speaker:
-            new_speaker = 'Winfried Hermann'
+    """replaces a ministry by the name of its minister, see the 'ministry' rows of lib/speaker_registry.csv"""
+    entry = speaker_registry.finds_entry('BW', 'ministry', wp, date, new_speaker)
+    if entry is not None:
+        new_speaker = entry.name
     return(new_speaker)
 
 def cleans_speaker_hh(new_speaker):
     """
     removes words that are not part of speaker's name
     """
-    new_speaker = (
-        re.sub(' +', ' ', new_speaker)
-        .replace('Zwischenfrage von ', '')
-        .replace('Zwischenbemerkung von ', '')
-        .replace(' (fortfahrend)', '')
-        .replace(' (unterbrechend)', '')
-        .replace('Treuenfels-Frowein', 'Treuenfels')
-        .replace('Busch-', 'Buschhütter')
-        .replace(' GRÜNE: Im', '')
-        .replace('Stapel-', 'Stapelfeldt')
-        .replace(' frakti-', '')
-        .replace(' DIE', '')
-        .replace('Finn Ole', 'Finn-Ole')
-        .replace('Nebahat Güclü', 'Nebahat Güçlü')
-        .split(':')[0]
-        )
+    # the 'spelling' rows of lib/speaker_registry.csv, each replaced in the order of the file
+    new_speaker = speaker_registry.replaces_spellings('HH', re.sub(' +', ' ', new_speaker)).split(':')[0]
 
     new_speaker = re.sub(r'\s+DIE(?:\s+LIN-)?', '', new_speaker)
-    return new_speaker
\ No newline at end of file
+    return new_speaker
+
+GERMAN_MONTHS = {'Januar': 1, 'Jänner': 1, 'Februar': 2, 'März': 3, 'April': 4, 'Mai': 5, 'Juni': 6, 'Juli': 7,
+                 'August': 8, 'September': 9, 'Oktober': 10, 'November': 11, 'Dezember': 12}
+GERMAN_MONTH_MARK = re.compile('|'.join(GERMAN_MONTHS))
+
+def parses_date(date, formats):
+    """
+    converts a date string to YYYY-MM-DD without depending on a german locale
+
+    Keyword arguments:
+    date: date as found in the transcript, e.g. "5. März 2020" or "05.03.2020"
+    formats: strptime formats that are tried in order, %B stands for a german month name
+    """
+    from datetime import datetime
+
+    # german month names are replaced by their number, so %B becomes %m
+    numeric_date = GERMAN_MONTH_MARK.sub(lambda m: '%02d' % GERMAN_MONTHS[m.group()], date)
+    for i, date_format in enumerate(formats):
+        try:
+            if '%B' in date_format:
+                return datetime.strptime(numeric_date, date_format.replace('%B', '%m')).strftime('%Y-%m-%d')
+            return datetime.strptime(date, date_format).strftime('%Y-%m-%d')
+        except ValueError:
+            if i == len(formats) - 1:
+                raise
@@ -1,11 +1,14 @@
 import re
-import pandas as pd
+
+from lib import speaker_registry
 
 def stores_speech_metadata(text, speeches, current):
     """
     joins list of strings and returns a pandas
     dataframe with the meta data of the text
     """
+    import pandas as pd
+
     # concatenates lines to one string
     # text = [i + ' ' if not i.endswith('-') else i.replace('-', '') for i in text]
     text = ''.join(text)
@@ -34,88 +37,29 @@ def stores_speech_metadata(text, speeches, current):
         return speeches
 
 
+# legislative periods in which interposed questions and continuations take the party from
+# the speakers seen before if the registry does not know the speaker
+PARTY_LOOKUP_WPS = (20, 21)
+
+
 def finds_party(new_speaker, party, date, wp, line, dict_speaker):
+    """
+    name and party of the speaker of an interposed question or continuation
 
-    if wp == 20:
-        if 'Philipp-Sebastian' in line:
-            party = 'SPD'
-            new_speaker = 'Philipp-Sebastian Kühn'
-        elif 'Ole Thorben Buschhüter' in line:
-            party = 'SPD'
-        elif 'Dr. Thomas-Sönke Kluth' in line:
-            party = 'FDP'
-        elif 'Kai Voet van Vormizeele' in line:
-            party = 'CDU'
-        elif 'Dr. Wieand Schinkenburg' in line:
-            new_speaker = 'Dr. Wieland Schinnenburg'
-            party = 'FDP'
-        elif 'Andrea Rugbarth' in line:
-            party = 'SPD'
-        elif 'Dr. Walter Scheuerl' in line:
-            if date > '2014-03-24':
-                party = 'fraktionslos'
-            else:
-                party = 'CDU'
-            new_speaker = 'Dr. Walter Scheuerl'
-        elif 'Ekkehard Wysocki' in line:
-            party = 'SPD'
-        elif 'Christiane Schneider' in line:
-            new_speaker = 'Christiane Schneider'
-            party = 'DIE LINKE'
-        elif 'Heike Sudmann'in line:
-            new_speaker = 'Heike Sudmann'
-            party = 'DIE LINKE'
-        elif 'Juliane Timmermann' in line:
-            party = 'SPD'
-        elif 'Finn Ole Ritter' in line:
-            new_speaker = 'Finn-Ole Ritter'
-        else:
-            if new_speaker in dict_speaker.keys():
-                party = dict_speaker[new_speaker]
-    elif wp == 21:
-        if 'Karl-Heinz Warnholz' in line:
-            party = 'CDU'
-        elif 'Dr. Wieland Schinnenburg' in line:
-            party = 'FDP'
-        elif 'Martin Dolzer' in line:
-            new_speaker = 'Martin Dolzer'
-            party = 'DIE LINKE'
-        elif 'Christiane Schneider' in line:
-            new_speaker = 'Christiane Schneider'
-            party = 'DIE LINKE'
-        elif 'Ole Thorben Busch' in line:
-            new_speaker = 'Ole Thorben Buschhüter'
-            party = 'SPD'
-        elif 'Heike Sudmann' in line:
-            new_speaker = 'Heike Sudmann'
-            party = 'DIE LINKE'
-        elif 'Dorothee Martin' in line:
-            party = 'SPD'
-        elif 'Anna-Elisabeth von Treuen' in line:
-            new_speaker = 'Anna-Elisabeth von Treuenfels'
-            party = 'FDP'
-        elif 'Inge Hannemann' in line:
-            new_speaker = 'Inge Hannemann'
-            party = 'DIE LINKE'
-        elif 'Dietrich Wersich' in line:
-            party = 'CDU'
-        elif 'Dr. Andreas Dressel' in line:
-            party = 'SPD'
-        elif 'Norbert Hackbusch' in line:
-            new_speaker = 'Norbert Hackbusch'
-            party = 'DIE LINKE'
-        elif 'Phyliss Demirel' in line:
-            new_speaker = 'Phyliss Demirel'
-            party = 'GRÜNE'
-        elif 'Dr. Mathias Petersen' in line:
-            party = 'SPD'
-        elif 'Deniz Celik' in line:
-            new_speaker = 'Deniz Celik'
-            party = 'DIE LINKE'
-        else:
-            if new_speaker in dict_speaker.keys():
-                party = dict_speaker[new_speaker]
+    Keyword arguments:
+    new_speaker, party: name and party as read from the line
+    date, wp: date and legislative period of the session
+    line: speaker line, searched for the 'speaker' aliases of lib/speaker_registry.csv
+    dict_speaker: party per speaker seen before
+    """
+    entry = speaker_registry.finds_entry('HH', 'speaker', wp, date, line)
+    if entry is not None:
+        new_speaker = entry.name or new_speaker
+        party = entry.party or party
+    elif wp in PARTY_LOOKUP_WPS:
+        if new_speaker in dict_speaker.keys():
+            party = dict_speaker[new_speaker]
 
     new_speaker = new_speaker.replace('Zwischenbemerkung von ', '')
 
-    return new_speaker, party
\ No newline at end of file
+    return new_speaker, party
@@ -0,0 +1,188 @@
+# coding: utf-8
+import re
+import warnings
+
+from lib import line_records, metrics
+
+# Stage 5 in two phases: this module tags all lines of a session (or of many sessions) in bulk,
+# lib/parser_engine.py then walks the precomputed tags with a small state machine.
+#
+# The speaker rules of a profile are tried in order with .match. They are combined into one
+# regular expression with a named group per rule, (?P<rule0>...)|(?P<rule1>...)|..., which gives
+# the same result because alternatives are tried from left to right. The layout flags of the
+# line records act as literal prefilter: only lines that contain <poi_begin> are matched against
+# the speaker rules, only lines that contain <interjection_begin> against the INTERJECTION_MARK.
+
+_combined_rules = {}
+
+
+class SpeakerRules:
+    """the speaker rules of a profile combined into one regular expression"""
+
+    def __init__(self, rules, names=None):
+        self.rules = rules
+        # names of the rules' regexes for lib/metrics.py, e.g. 'HH.CHAIR_MARK'
+        self.names = names or [rule['kind'] for rule in rules]
+        # \A makes search (used by pandas) behave like .match
+        self.pattern = re.compile(r'\A(?:' + '|'.join(f"(?P<rule{i}>{rule['mark'].pattern})" for i, rule in enumerate(rules)) + ')')
+        # index of the named group of each rule, its own groups follow directly
+        self.offsets = [self.pattern.groupindex[f'rule{i}'] for i in range(len(rules))]
+        self.sizes = [rule['mark'].groups for rule in rules]
+
+    def captures(self, groups):
+        """
+        splits the groups of a combined match into the matching rule and its captures
+
+        Keyword arguments:
+        groups: all groups of the combined regex, None for groups that did not participate
+
+        returns (rule, captures) where captures[0] is the whole match and captures[n] group n
+        of the rule's own regex, or None if no rule matched
+        """
+        for rule, offset, size in zip(self.rules, self.offsets, self.sizes):
+            if groups[offset - 1] is not None:
+                return rule, groups[offset - 1:offset + size]
+        return None
+
+    def matches(self, line):
+        """matches a single line, same result as the bulk classification"""
+        match = self.pattern.match(line)
+        if match:
+            return self.captures(match.groups())
+        return None
+
+    def counts(self, speakers):
+        """
+        adds the attempts and hits of every rule to the metrics
+
+        Keyword arguments:
+        speakers: results of matches / matches_column for the lines that were matched
+
+        A rule is tried on a line if none of the rules before it matched.
+        """
+        if not metrics.is_active():
+            return
+        positions = {id(rule): k for k, rule in enumerate(self.rules)}
+        hits = [0] * len(self.rules)
+        misses = 0
+        for speaker in speakers:
+            if speaker is None:
+                misses += 1
+            else:
+                hits[positions[id(speaker[0])]] += 1
+        attempts = misses + sum(hits)
+        for name, rule_hits in zip(self.names, hits):
+            metrics.counts_regex(name, attempts, rule_hits)
+            attempts -= rule_hits
+
+
+def combines_speaker_rules(profile):
+    """returns the SpeakerRules of a profile, compiled once per profile"""
+    if profile.STATE not in _combined_rules:
+        names = [names_regex(profile, rule['mark']) or f"{profile.STATE}.{rule['kind']}" for rule in profile.SPEAKER_RULES]
+        _combined_rules[profile.STATE] = SpeakerRules(profile.SPEAKER_RULES, names)
+    return _combined_rules[profile.STATE]
+
+
+def names_regex(profile, pattern):
+    """'STATE.NAME' of a compiled regex of a profile, None if the profile has no name for it"""
+    for name, value in vars(profile).items():
+        if value is pattern and name.isupper():
+            return f'{profile.STATE}.{name}'
+    return None
+
+
+def strips_poi(line):
+    return line.replace('<poi_begin>', '').replace('<poi_end>', '')
+
+
+def searches_column(column, mark, rows):
+    """bool list, True where mark.search finds something; only rows in rows are searched"""
+    import pandas as pd
+
+    found = [False] * len(column)
+    if rows:
+        series = pd.Series([column[i] for i in rows], dtype=object)
+        with warnings.catch_warnings():
+            # the marks contain groups, only whether they match is of interest here
+            warnings.filterwarnings('ignore', 'This pattern is interpreted as a regular expression', UserWarning)
+            hits = series.str.contains(mark, regex=True).tolist()
+        for i, hit in zip(rows, hits):
+            found[i] = hit
+    return found
+
+
+def matches_column(column, rules, rows):
+    """list of (rule, captures) or None per line; only rows in rows are matched"""
+    import pandas as pd
+
+    speakers = [None] * len(column)
+    if rows:
+        series = pd.Series([column[i] for i in rows], dtype=object)
+        frame = series.str.extract(rules.pattern, expand=True)
+        frame = frame.astype(object).where(frame.notna(), None)
+        for i, groups in zip(rows, frame.itertuples(index=False, name=None)):
+            speakers[i] = rules.captures(groups)
+    return speakers
+
+
+class LineTags:
+    """
+    precomputed tags of the lines of a session
+
+    Per line:
+    lines, clean_lines: the tagged and the clean line after profile.prepares_line
+    speaker_lines: the line after profile.prepares_speaker_line, as seen by the speaker rules
+    bold_lines: speaker_lines without <poi_begin>/<poi_end>, the line after speaker detection
+    speakers: (rule, captures) of the first matching speaker rule or None
+    ends, bold_ends: END_MARK found in lines / bold_lines
+    interjections, bold_interjections: INTERJECTION_MARK found in lines / bold_lines
+    """
+
+    def __init__(self, records, profile):
+        rules = combines_speaker_rules(profile)
+        self.records = records
+        self.lines = []
+        self.clean_lines = []
+        for record in records:
+            line, clean_line = profile.prepares_line(record.tagged, record.text)
+            self.lines.append(line)
+            self.clean_lines.append(clean_line)
+
+        bold = [i for i, record in enumerate(records) if record.flags & line_records.BOLD_BEGIN]
+        interjection = [i for i, record in enumerate(records) if record.flags & line_records.INTERJECTION_BEGIN]
+        bold_interjection = [i for i in interjection if records[i].flags & line_records.BOLD_BEGIN]
+
+        self.speaker_lines = list(self.lines)
+        self.bold_lines = list(self.lines)
+        for i in bold:
+            self.speaker_lines[i] = profile.prepares_speaker_line(self.lines[i])
+            self.bold_lines[i] = strips_poi(self.speaker_lines[i])
+
+        self.speakers = matches_column(self.speaker_lines, rules, bold)
+        self.ends = searches_column(self.lines, profile.END_MARK, range(len(self.lines)))
+        self.bold_ends = searches_column(self.bold_lines, profile.END_MARK, bold)
+        self.interjections = searches_column(self.lines, profile.INTERJECTION_MARK, interjection)
+        self.bold_interjections = searches_column(self.bold_lines, profile.INTERJECTION_MARK, bold_interjection)
+
+        if metrics.is_active():
+            rules.counts([self.speakers[i] for i in bold])
+            metrics.counts_regex(f'{profile.STATE}.END_MARK', len(self.lines) + len(bold), sum(self.ends) + sum(self.bold_ends))
+            metrics.counts_regex(f'{profile.STATE}.INTERJECTION_MARK', len(interjection) + len(bold_interjection),
+                                 sum(self.interjections) + sum(self.bold_interjections))
+
+    def __len__(self):
+        return len(self.records)
+
+
+def classifies_lines(records, profile):
+    """
+    tags all lines of one or more sessions in bulk
+
+    Keyword arguments:
+    records: line records (lib/line_records.py)
+    profile: state profile module, see lib/profiles
+
+    returns LineTags
+    """
+    return LineTags(records, profile)
@@ -0,0 +1,157 @@
+import os
+import re
+from collections import namedtuple
+
+from lib import metrics
+
+# Stage 4 marks the pdf layout with inline tags. A line record keeps the clean
+# text of one line and stores the tags separately: as a flag set for quick
+# checks and as (offset, code) markers to restore the tagged line on demand.
+
+BOLD_BEGIN = 1 << 0
+BOLD_END = 1 << 1
+BOLD = 1 << 2
+INTERJECTION_BEGIN = 1 << 3
+INTERJECTION_END = 1 << 4
+INTERJECTION = 1 << 5
+INDENTATION_BEGIN = 1 << 6
+INDENTATION_END = 1 << 7
+INDENTATION = 1 << 8
+PAGE_BEGIN = 1 << 9
+
+# tag -> (marker code, flag set when the tag occurs, flag of the span)
+TAGS = {
+    '<poi_begin>': ('b', BOLD_BEGIN, BOLD),
+    '<poi_end>': ('B', BOLD_END, BOLD),
+    '<interjection_begin>': ('i', INTERJECTION_BEGIN, INTERJECTION),
+    '<interjection_end>': ('I', INTERJECTION_END, INTERJECTION),
+    '<indentation_begin>': ('n', INDENTATION_BEGIN, INDENTATION),
+    '<indentation_end>': ('N', INDENTATION_END, INDENTATION),
+}
+CODES = {code: tag for tag, (code, _, _) in TAGS.items()}
+TAG_MARK = re.compile('|'.join(re.escape(tag) for tag in TAGS))
+
+RECORDS_SUFFIX = '_lines.tsv'
+
+
+class LineRecord(namedtuple('LineRecord', ['text', 'flags', 'page', 'column', 'markers'])):
+    """
+    one line of a transcript
+
+    text: line without any tags
+    flags: bit set of the constants above
+    page: page number (0 if unknown)
+    column: 0 left, 1 right, -1 if unknown
+    markers: tuple of (offset in text, marker code)
+    """
+    __slots__ = ()
+
+    @property
+    def tagged(self):
+        """line including the inline tags as written by stage 4"""
+        if not self.markers:
+            return self.text
+        parts = []
+        last = 0
+        for offset, code in self.markers:
+            parts.append(self.text[last:offset])
+            parts.append(CODES[code])
+            last = offset
+        parts.append(self.text[last:])
+        return ''.join(parts)
+
+
+def strips_tags(line):
+    """removes all layout tags from a tagged line"""
+    return TAG_MARK.sub('', line)
+
+
+def records_from_lines(lines, page=0, column=-1, spans=0):
+    """
+    converts tagged lines to line records
+
+    Keyword arguments:
+    lines: iterable of lines as written by stage 4
+    page, column: layout position of the lines if known
+    spans: flags of the spans that are still open from a previous call
+
+    returns the records and the flags of the spans still open after the last line
+    """
+    records = []
+    for line in lines:
+        flags = spans
+        markers = []
+        if '<' in line:
+            text = []
+            last = 0
+            length = 0
+            for tag in TAG_MARK.finditer(line):
+                text.append(line[last:tag.start()])
+                length += tag.start() - last
+                last = tag.end()
+                code, flag, span = TAGS[tag.group()]
+                markers.append((length, code))
+                flags |= flag | span
+                if flag & (BOLD_BEGIN | INTERJECTION_BEGIN | INDENTATION_BEGIN):
+                    spans |= span
+                else:
+                    spans &= ~span
+            text.append(line[last:])
+            text = ''.join(text)
+        else:
+            text = line
+        records.append(LineRecord(text, flags, page, column, tuple(markers)))
+    return records, spans
+
+
+def records_from_text(text):
+    """converts the content of a _xml.txt file to line records"""
+    records, _ = records_from_lines(text.split('\n'))
+    return records
+
+
+def writes_records(records, fp):
+    """writes line records to an open text file, one record per line"""
+    for record in records:
+        markers = ','.join(f'{offset}{code}' for offset, code in record.markers)
+        fp.write(f'{record.flags}\t{record.page}\t{record.column}\t{markers}\t{record.text}\n')
+
+
+def reads_records(fp):
+    """reads line records from an open text file"""
+    records = []
+    for row in fp:
+        flags, page, column, markers, text = row[:-1].split('\t', 4)
+        if markers:
+            markers = tuple((int(marker[:-1]), marker[-1]) for marker in markers.split(','))
+        else:
+            markers = ()
+        records.append(LineRecord(text, int(flags), int(page), int(column), markers))
+    return records
+
+
+def names_session_records(filename):
+    """the _lines.tsv sibling of a _xml.txt file if it exists and is up to date, else None"""
+    records_name = filename.replace('_xml.txt', RECORDS_SUFFIX)
+    if records_name != filename and os.path.exists(records_name) \
+            and os.path.getmtime(records_name) >= os.path.getmtime(filename):
+        return records_name
+    return None
+
+
+def reads_session_records(filename):
+    """
+    loads the line records of one session
+
+    Keyword arguments:
+    filename: path of the _xml.txt file; its _lines.tsv sibling is used if it
+    exists and is up to date (names_session_records), otherwise the tagged text is converted
+    """
+    records_name = names_session_records(filename)
+    if records_name is not None:
+        metrics.reads(records_name)
+        with metrics.times_span('read records'), open(records_name, encoding='utf-8', newline='\n') as fp:
+            return reads_records(fp)
+    metrics.reads(filename)
+    with metrics.times_span('read txt'), open(filename, 'rb') as fh:
+        return records_from_text(fh.read().decode('utf-8'))
@@ -0,0 +1,447 @@
+# coding: utf-8
+import json
+import logging
+import os
+import socket
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+log = logging.getLogger(__name__)
+
+# Instrumentation of the pipeline stages. A run (one stage script or parses_state) collects
+#
+# stages: wall and CPU seconds per stage, the files it processed and the bytes they read and wrote
+# files: the same per file and stage, with the pid of the process that handled the file
+# regexes: match attempts and hits per compiled regex of a profile, e.g. 'HH.CHAIR_MARK'
+# counters: other counts, e.g. 'xml_to_txt.removed_headers'
+#
+# and writes them to data/{STATE}/metrics/{run}_{YYYYmmdd-HHMMSS.mmm}.json when it ends. CPU seconds
+# include the child processes (pdf2txt.py in stage 3). Worker processes collect into their own
+# collector while they run a function through calls(); the parent adds the returned snapshot with
+# merges(). Outside a run all functions of this module do nothing.
+#
+# Every stage, file and I/O step of the run is also a span in a Chrome trace-event timeline,
+# {run}_{YYYYmmdd-HHMMSS.mmm}.trace.json next to the report: one row per process and thread, the spans
+# of the worker processes included, with the file, its pages or rows and the bytes in the args.
+# The file opens in chrome://tracing or https://ui.perfetto.dev; merges_traces() joins the traces
+# of several runs (e.g. stages 3, 4 and 5) into one timeline.
+#
+# Environment:
+# LANDTAG_METRICS: folder of the reports instead of data/{STATE}/metrics, "0" to write none
+# LANDTAG_PROFILE: "cprofile" and/or "tracemalloc" separated by commas. cprofile stores the
+#     profile of the run, workers included, as .prof next to the report and its top functions in
+#     the report; tracemalloc adds the peak memory of the main process, of every file and the top
+#     allocations.
+
+METRICS_FOLDER = 'metrics'
+TOP_FUNCTIONS = 30
+TOP_ALLOCATIONS = 20
+
+_collector = None
+# process of the run; forked workers inherit _collector but not its profiler
+_run_pid = None
+
+
+def cpu_seconds():
+    """CPU seconds of this process and its finished child processes"""
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+def profilers():
+    """the profilers requested by LANDTAG_PROFILE"""
+    return {name.strip() for name in os.environ.get('LANDTAG_PROFILE', '').lower().split(',') if name.strip()}
+
+
+class Collector:
+    """metrics of a run or of the calls of a worker process"""
+
+    def __init__(self):
+        self.stages = {}
+        self.files = []
+        self.regexes = {}
+        self.counters = {}
+        # entry of the file that is processed, gets the bytes of reads() and writes()
+        self.current = None
+        # pstats.Stats of the run, profiler stats of the workers
+        self.profile_stats = None
+        self.worker_profiles = []
+        # peak memory before tracemalloc.reset_peak() for a file
+        self.peak_kb = 0.0
+        # complete events of the trace
+        self.spans = []
+
+    def stage_entry(self, stage):
+        entry = self.stages.get(stage)
+        if entry is None:
+            entry = self.stages[stage] = {'wall_s': 0.0, 'cpu_s': 0.0, 'files': 0, 'file_wall_s': 0.0,
+                                          'file_cpu_s': 0.0, 'bytes_read': 0, 'bytes_written': 0}
+        return entry
+
+    def adds_file(self, entry):
+        self.files.append(entry)
+        stage = self.stage_entry(entry['stage'])
+        stage['files'] += 1
+        stage['file_wall_s'] += entry['wall_s']
+        stage['file_cpu_s'] += entry['cpu_s']
+        stage['bytes_read'] += entry['bytes_read']
+        stage['bytes_written'] += entry['bytes_written']
+
+    def adds_span(self, name, category, start, seconds, args=None):
+        """
+        adds a complete event ("ph": "X") to the trace
+
+        Keyword arguments:
+        name, category: shown in the timeline, e.g. the file name and the stage
+        start: time.time() at the start of the span
+        seconds: duration
+        args: dict shown with the span
+        """
+        span = {'name': name, 'cat': category, 'ph': 'X', 'ts': int(start * 1e6), 'dur': int(seconds * 1e6),
+                'pid': os.getpid(), 'tid': threading.get_native_id()}
+        if args:
+            span['args'] = args
+        self.spans.append(span)
+
+    def adds_bytes(self, key, size):
+        if self.current is not None:
+            self.current[key] += size
+        else:
+            # bytes outside of a file, e.g. the csv of stage 5
+            self.stage_entry('other')[key] += size
+
+    def snapshot(self):
+        """picklable content for the parent process"""
+        return {'stages': self.stages, 'files': self.files, 'regexes': self.regexes, 'counters': self.counters,
+                'profile_stats': self.profile_stats, 'spans': self.spans}
+
+    def merges(self, snapshot):
+        """adds the snapshot of a worker"""
+        # wall and CPU seconds of a stage are measured by the process that runs the stage, the
+        # workers add their files
+        if 'other' in snapshot['stages']:
+            for key in ('bytes_read', 'bytes_written'):
+                self.stage_entry('other')[key] += snapshot['stages']['other'][key]
+        for entry in snapshot['files']:
+            self.adds_file(entry)
+        for name, (attempts, hits) in snapshot['regexes'].items():
+            entry = self.regexes.setdefault(name, [0, 0])
+            entry[0] += attempts
+            entry[1] += hits
+        for name, count in snapshot['counters'].items():
+            self.counters[name] = self.counters.get(name, 0) + count
+        if snapshot['profile_stats']:
+            self.worker_profiles.append(snapshot['profile_stats'])
+        self.spans.extend(snapshot['spans'])
+
+
+class ProfileStats:
+    """the stats of a profiler of a worker in the form that pstats.Stats.add accepts"""
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+def is_active():
+    return _collector is not None
+
+
+@contextmanager
+def records_run(name, state, data_path):
+    """
+    collects the metrics of a run and writes the report when it ends
+
+    Keyword arguments:
+    name: name of the run, e.g. "txt_to_rows"
+    state: state abbreviation
+    data_path: folder of the state, the report goes to its metrics folder
+
+    A run inside a run only adds a stage to the outer run.
+    """
+    global _collector, _run_pid
+    if _collector is not None:
+        with times_stage(name):
+            yield _collector
+        return
+
+    _collector = collector = Collector()
+    _run_pid = os.getpid()
+    requested = profilers()
+    profiler = None
+    if 'cprofile' in requested:
+        import cProfile
+        import pstats
+
+        profiler = cProfile.Profile()
+    if 'tracemalloc' in requested:
+        import tracemalloc
+
+        tracemalloc.start()
+    started = time.time()
+    wall, cpu = time.perf_counter(), cpu_seconds()
+    try:
+        if profiler is not None:
+            profiler.enable()
+        with times_stage(name):
+            yield collector
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            collector.profile_stats = pstats.Stats(profiler)
+            for stats in collector.worker_profiles:
+                collector.profile_stats.add(ProfileStats(stats))
+        report = {'run': name, 'state': state, 'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(started)),
+                  'wall_s': time.perf_counter() - wall, 'cpu_s': cpu_seconds() - cpu, 'pid': os.getpid(),
+                  'python': sys.version.split()[0], 'argv': sys.argv}
+        _collector = None
+        writes_report(collector, report, data_path, started)
+
+
+def writes_report(collector, report, data_path, started):
+    """writes the metrics json of a run and the files of the profilers"""
+    folder = os.environ.get('LANDTAG_METRICS') or os.path.join(data_path, METRICS_FOLDER)
+    if folder == '0':
+        return None
+    os.makedirs(folder, exist_ok=True)
+    # milliseconds keep the reports of runs within the same second apart
+    stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(started)) + f'{started % 1:.3f}'[1:]
+    path = os.path.join(folder, f"{report['run']}_{stamp}")
+    try:
+        # reserves the name against runs of other processes in the same millisecond (lib/work_queue.py)
+        open(path + '.json', 'x').close()
+    except FileExistsError:
+        path += f"_{socket.gethostname()}-{report['pid']}"
+
+    report['stages'] = collector.stages
+    report['files'] = collector.files
+    report['regexes'] = {name: {'attempts': attempts, 'hits': hits} for name, (attempts, hits) in sorted(collector.regexes.items())}
+    report['counters'] = dict(sorted(collector.counters.items()))
+    report['profile'] = {}
+    if collector.profile_stats is not None:
+        collector.profile_stats.dump_stats(path + '.prof')
+        report['profile']['cprofile'] = {'file': path + '.prof', 'top': lists_functions(collector.profile_stats)}
+    import tracemalloc
+
+    if tracemalloc.is_tracing():
+        top = tracemalloc.take_snapshot().statistics('lineno')[:TOP_ALLOCATIONS]
+        report['profile']['tracemalloc'] = {
+            'peak_kb': max(collector.peak_kb, tracemalloc.get_traced_memory()[1] / 1024),
+            'top': [{'line': str(statistic.traceback), 'kb': statistic.size / 1024, 'count': statistic.count} for statistic in top]}
+        tracemalloc.stop()
+
+    with open(path + '.json', 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=1)
+    writes_trace(collector.spans, path + '.trace.json', report['pid'], f"{report['run']} {report['state']}")
+    log.info('metrics written to %s.json', path)
+    return path + '.json'
+
+
+def names_processes(spans, main_pid, label):
+    """metadata events that name the main process and the workers in the timeline"""
+    events = []
+    for pid in sorted({span['pid'] for span in spans}):
+        name = f'{label} main' if pid == main_pid else f'{label} worker'
+        events.append({'name': 'process_name', 'ph': 'M', 'pid': pid, 'tid': 0, 'args': {'name': f'{name} {pid}'}})
+        # the main process first, then the workers by pid
+        events.append({'name': 'process_sort_index', 'ph': 'M', 'pid': pid, 'tid': 0,
+                       'args': {'sort_index': -1 if pid == main_pid else pid}})
+    return events
+
+
+def writes_trace(spans, path, main_pid, label):
+    """writes spans as Chrome trace-event JSON"""
+    events = names_processes(spans, main_pid, label) + sorted(spans, key=lambda span: (span['ts'], -span['dur']))
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f, separators=(',', ':'))
+    return path
+
+
+def merges_traces(paths, out_path):
+    """
+    joins trace files of several runs into one timeline
+
+    Keyword arguments:
+    paths: .trace.json files written by runs
+    out_path: trace file to write
+
+    The timestamps are wall clock times, so the runs appear where they ran.
+    """
+    events = []
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            events.extend(json.load(f)['traceEvents'])
+    metadata = [event for event in events if event['ph'] == 'M']
+    spans = sorted((event for event in events if event['ph'] != 'M'), key=lambda span: (span['ts'], -span.get('dur', 0)))
+    with open(out_path, 'w', encoding='utf-8') as f:
+        json.dump({'traceEvents': metadata + spans, 'displayTimeUnit': 'ms'}, f, separators=(',', ':'))
+    return out_path
+
+
+def lists_functions(stats):
+    """the TOP_FUNCTIONS functions with the most cumulative time of pstats.Stats"""
+    rows = []
+    for (filename, line, function), (calls, primitive, total, cumulative, callers) in stats.stats.items():
+        rows.append({'function': f'{filename}:{line}({function})', 'calls': calls, 'total_s': total, 'cumulative_s': cumulative})
+    return sorted(rows, key=lambda row: -row['cumulative_s'])[:TOP_FUNCTIONS]
+
+
+@contextmanager
+def times_stage(name):
+    """adds the wall and CPU seconds of the block to a stage"""
+    if _collector is None:
+        yield
+        return
+    start, wall, cpu = time.time(), time.perf_counter(), cpu_seconds()
+    try:
+        yield
+    finally:
+        if _collector is not None:
+            entry = _collector.stage_entry(name)
+            seconds = time.perf_counter() - wall
+            entry['wall_s'] += seconds
+            entry['cpu_s'] += cpu_seconds() - cpu
+            _collector.adds_span(name, 'stage', start, seconds)
+
+
+@contextmanager
+def times_span(name, category='io', **args):
+    """
+    adds the block as span to the trace, e.g. reading a file or waiting for a worker
+
+    Keyword arguments:
+    name, category: shown in the timeline
+    args: shown with the span
+    """
+    if _collector is None:
+        yield
+        return
+    start, wall = time.time(), time.perf_counter()
+    try:
+        yield
+    finally:
+        if _collector is not None:
+            _collector.adds_span(name, category, start, time.perf_counter() - wall, args)
+
+
+def spans_since(name, category, start, **args):
+    """
+    adds a span from start to now to the trace, for steps that are no block, e.g. a session in the pipeline
+
+    Keyword arguments:
+    name, category, args: see times_span
+    start: time.time() at the start of the step
+    """
+    if _collector is not None:
+        _collector.adds_span(name, category, start, time.time() - start, args)
+
+
+@contextmanager
+def times_file(stage_name, filename):
+    """
+    measures the processing of one file; reads() and writes() in the block count for the file
+
+    Keyword arguments:
+    stage_name: stage that processes the file, e.g. "xml_to_txt"
+    filename: path of the input file
+
+    The block may add more values to the yielded entry, e.g. entry['pages']; they are shown with
+    the span of the file.
+    """
+    collector = _collector
+    if collector is None:
+        yield {}
+        return
+    entry = {'stage': stage_name, 'file': filename, 'pid': os.getpid(), 'wall_s': 0.0, 'cpu_s': 0.0,
+             'bytes_read': 0, 'bytes_written': 0}
+    outer, collector.current = collector.current, entry
+    tracing = 'tracemalloc' in profilers()
+    if tracing:
+        import tracemalloc
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        collector.peak_kb = max(collector.peak_kb, tracemalloc.get_traced_memory()[1] / 1024)
+        tracemalloc.reset_peak()
+    start, wall, cpu = time.time(), time.perf_counter(), cpu_seconds()
+    try:
+        yield entry
+    finally:
+        entry['wall_s'] = time.perf_counter() - wall
+        entry['cpu_s'] = cpu_seconds() - cpu
+        if tracing:
+            entry['peak_kb'] = tracemalloc.get_traced_memory()[1] / 1024
+        collector.current = outer
+        collector.adds_file(entry)
+        collector.adds_span(os.path.basename(filename), stage_name, start, entry['wall_s'],
+                            {key: value for key, value in entry.items() if key not in ('stage', 'pid', 'wall_s')})
+
+
+def reads(path):
+    """counts the size of a file that was read"""
+    if _collector is not None and path and os.path.exists(path):
+        _collector.adds_bytes('bytes_read', os.path.getsize(path))
+
+
+def writes(path):
+    """counts the size of a file that was written"""
+    if _collector is not None and path and os.path.exists(path):
+        _collector.adds_bytes('bytes_written', os.path.getsize(path))
+
+
+def counts(name, count=1):
+    """adds count to a counter"""
+    if _collector is not None:
+        _collector.counters[name] = _collector.counters.get(name, 0) + count
+
+
+def counts_regex(name, attempts, hits):
+    """
+    adds match attempts and hits of a regex
+
+    Keyword arguments:
+    name: state and name of the regex in the profile, e.g. "HH.END_MARK"
+    attempts, hits: number of lines searched and found
+    """
+    if _collector is not None:
+        entry = _collector.regexes.setdefault(name, [0, 0])
+        entry[0] += attempts
+        entry[1] += hits
+
+
+def calls(function, *args):
+    """
+    runs function(*args) in a worker process with its own collector
+
+    returns (result, snapshot of the collector); pass it to merges() in the parent
+    """
+    global _collector
+    outer, _collector = _collector, Collector()
+    profiler = None
+    # calls() in the process of the run is profiled by the run
+    if 'cprofile' in profilers() and os.getpid() != _run_pid:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        result = function(*args)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.create_stats()
+            _collector.profile_stats = profiler.stats
+        collector, _collector = _collector, outer
+    return result, collector.snapshot()
+
+
+def merges(measured):
+    """adds the snapshot of calls() to the run and returns the result of the call"""
+    result, snapshot = measured
+    if _collector is not None:
+        _collector.merges(snapshot)
+    return result
@@ -0,0 +1,207 @@
+# coding: utf-8
+import csv
+import hashlib
+import os
+import pickle
+
+# Speaker names that are broken by OCR or by a hyphen at the end of a line ('Ole Thorben Busch-',
+# 'Dr. Andreas Dresel') are resolved against the roster of the legislative period: the names of
+# all members of parliament (role 'mp') that were read together with a party. Only rows of members
+# are resolved; chairs, members of the government and servants are often named like a member
+# ('Tobias Baumann' the senator, 'Dr. Tobias Baumann' the member) and keep their names. The roster is
+# indexed by character trigrams, a name is compared only with the roster names that share a trigram
+# with it.
+#
+# score: Dice coefficient of the trigram sets, 2 * shared / (trigrams of name + trigrams of candidate);
+#        for a truncated name (ending with '-') the share of its trigrams that occur in the candidate,
+#        and only candidates that contain the truncated name are considered
+# A name is replaced if the best candidate reaches the minimum score and no other candidate has
+# the same score.
+#
+# Sessions are resolved in (wp, session) order against the roster built so far. The resolutions
+# are kept in data/{STATE}/cache/names.pickle under the name and a fingerprint of the roster, so
+# a later run over the same sessions does not search again. The resolved names and their scores
+# are listed in data/{STATE}/{STATE}_resolved_names.csv with the name as read, the rows of the
+# speech table only carry the resolved name.
+
+MIN_SCORE = 0.85
+# truncated names shorter than this match too many candidates
+MIN_TRUNCATED = 4
+# role of the rows that are resolved and make up the roster
+ROLE = 'mp'
+CACHE_FILE = 'names.pickle'
+
+
+def normalises_name(name):
+    """lower case name without whitespace duplicates"""
+    return ' '.join(name.lower().split())
+
+
+def trigrams(text, truncated=False):
+    """character trigrams of ' text ', without the trailing space for truncated names"""
+    text = ' ' + text + ('' if truncated else ' ')
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class NameIndex:
+    """trigram index of the roster of one legislative period"""
+
+    def __init__(self, names=()):
+        self.names = []
+        self.normalised = []
+        self.sizes = []
+        self.known = set()
+        self.postings = {}
+        for name in names:
+            self.adds(name)
+
+    def __contains__(self, name):
+        return name in self.known
+
+    def adds(self, name):
+        """adds a name to the roster, returns False if it was known"""
+        if name in self.known:
+            return False
+        self.known.add(name)
+        index = len(self.names)
+        normalised = normalises_name(name)
+        grams = trigrams(normalised)
+        self.names.append(name)
+        self.normalised.append(normalised)
+        self.sizes.append(len(grams))
+        for gram in grams:
+            self.postings.setdefault(gram, []).append(index)
+        return True
+
+    def resolves(self, name, min_score=MIN_SCORE):
+        """
+        canonical roster name of a broken name
+
+        Keyword arguments:
+        name: name as read from the transcript
+        min_score: minimum score of the best candidate
+
+        returns (canonical name, score), (None, best score) if no candidate is good enough or unique
+        """
+        normalised = normalises_name(name)
+        truncated = normalised.endswith('-')
+        if truncated:
+            normalised = normalised.rstrip('-').rstrip()
+        grams = trigrams(normalised, truncated)
+        if not grams or (truncated and len(normalised) < MIN_TRUNCATED):
+            return None, 0.0
+
+        shared = {}
+        for gram in grams:
+            for index in self.postings.get(gram, ()):
+                shared[index] = shared.get(index, 0) + 1
+
+        best, best_score, tied = None, 0.0, False
+        for index, count in shared.items():
+            if truncated:
+                if normalised not in self.normalised[index]:
+                    continue
+                score = count / len(grams)
+            else:
+                score = 2 * count / (len(grams) + self.sizes[index])
+            if score > best_score:
+                best, best_score, tied = index, score, False
+            elif score == best_score:
+                tied = True
+        if best is None or tied or best_score < min_score:
+            return None, best_score
+        return self.names[best], best_score
+
+
+class NameResolver:
+    """
+    resolves the speaker names of the sessions of a state against the rosters of their periods
+
+    Keyword arguments:
+    cache_folder: folder of names.pickle, None to keep resolutions only for this run
+    min_score: minimum score of a resolution
+    """
+
+    def __init__(self, cache_folder=None, min_score=MIN_SCORE):
+        self.cache_folder = cache_folder
+        self.min_score = min_score
+        self.rosters = {}
+        self.fingerprints = {}
+        self.cache = {}
+        self.used = {}
+        # (wp, name) -> [canonical name, score, rows]
+        self.resolved = {}
+        if cache_folder and os.path.exists(os.path.join(cache_folder, CACHE_FILE)):
+            try:
+                with open(os.path.join(cache_folder, CACHE_FILE), 'rb') as f:
+                    self.cache = pickle.load(f)
+            except (OSError, EOFError, pickle.UnpicklingError):
+                self.cache = {}
+
+    def learns(self, speeches):
+        """adds the members of a session that were read with a party to the rosters"""
+        columns = speeches.columns
+        for speaker, party, role, wp in zip(columns['speaker'], columns['party'], columns['role'], columns['wp']):
+            if speaker and party and role == ROLE:
+                roster = self.rosters.setdefault(wp, NameIndex())
+                if roster.adds(speaker):
+                    previous = self.fingerprints.get(wp, '')
+                    self.fingerprints[wp] = hashlib.sha1(f'{previous}\0{speaker}'.encode('utf-8')).hexdigest()
+
+    def resolves(self, name, wp):
+        """(canonical name, score) of a name in legislative period wp, from the cache if possible"""
+        key = (wp, self.fingerprints.get(wp, ''), self.min_score, name)
+        if key not in self.cache:
+            roster = self.rosters.get(wp)
+            self.cache[key] = roster.resolves(name, self.min_score) if roster is not None else (None, 0.0)
+        self.used[key] = self.cache[key]
+        return self.cache[key]
+
+    def resolves_session(self, speeches):
+        """
+        learns the roster of a session and replaces the broken names of members in place; the names as
+        read are listed by closes()
+
+        Keyword arguments:
+        speeches: speech_table.SpeechColumns of one session
+
+        returns the number of rows whose speaker was replaced
+        """
+        self.learns(speeches)
+        columns = speeches.columns
+        replaced = 0
+        names = {}
+        for row, (speaker, role, wp) in enumerate(zip(columns['speaker'], columns['role'], columns['wp'])):
+            if not speaker or role != ROLE or (wp in self.rosters and speaker in self.rosters[wp]):
+                continue
+            if (wp, speaker) not in names:
+                names[(wp, speaker)] = self.resolves(speaker, wp)
+            canonical, score = names[(wp, speaker)]
+            if canonical is not None:
+                columns['speaker'][row] = canonical
+                entry = self.resolved.setdefault((wp, speaker), [canonical, score, 0])
+                entry[2] += 1
+                replaced += 1
+        return replaced
+
+    def closes(self, report_file=None):
+        """
+        stores the resolutions of this run in the cache and writes the report
+
+        Keyword arguments:
+        report_file: csv file with wp, name, speaker, score and rows of every resolved name
+        """
+        if self.cache_folder:
+            os.makedirs(self.cache_folder, exist_ok=True)
+            path = os.path.join(self.cache_folder, CACHE_FILE)
+            temporary = f'{path}.{os.getpid()}.tmp'
+            # only the resolutions of this run are kept, the cache does not grow across runs
+            with open(temporary, 'wb') as f:
+                pickle.dump(self.used, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporary, path)
+        if report_file:
+            with open(report_file, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow(['wp', 'name', 'speaker', 'score', 'rows'])
+                for (wp, name), (canonical, score, rows) in sorted(self.resolved.items()):
+                    writer.writerow([wp, name, canonical, f'{score:.3f}', rows])
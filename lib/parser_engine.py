@@ -0,0 +1,516 @@
+# coding: utf-8
+import os
+import logging
+
+from lib import (build_manifest, corpus_store, helper, line_classifier, line_records, metrics, name_index, party_map, session_cache,
+                 speaker_table, speech_output, speech_table, text_cleaning)
+from lib.profiles import common, load_profile
+
+log = logging.getLogger(__name__)
+
+
+class IssueState:
+    """issue (agenda item) of a session; read and changed by the profile hooks"""
+
+    def __init__(self):
+        self.issue = None
+        # True while a multi-line issue is read
+        self.poi = False
+        # True if the previous bold line was a one-line issue (NRW)
+        self.issue_start = False
+
+
+def parse_session(lines, profile, wp, session, speaker_parties=None, tags=None, looked_up=None):
+    """
+    splits the lines of one plenary session into speeches and interjections
+
+    Keyword arguments:
+    lines: line records (lib/line_records.py) or tagged lines as written by stage 4
+    profile: state profile module or state abbreviation, see lib/profiles
+    wp, session: legislative period and session number, stored with each row
+    speaker_parties: dict speaker -> party used by profiles that infer parties (HH), updated in place
+    tags: line_classifier.LineTags of the lines, classified here if not given
+    looked_up: set that collects the speakers whose party may be looked up in speaker_parties
+        (profile.looks_up_party), whether it is found or not
+
+    returns a speech_table.SpeechColumns and a list of error messages
+    """
+    profile = load_profile(profile)
+    if speaker_parties is None:
+        speaker_parties = {}
+    records = [line_records.records_from_lines([line])[0][0] if isinstance(line, str) else line for line in lines]
+    if tags is None:
+        tags = line_classifier.classifies_lines(records, profile)
+    rules = line_classifier.combines_speaker_rules(profile)
+
+    errormessages = []
+    speeches = speech_table.SpeechColumns()
+
+    # trigger to skip lines until date is captured
+    date_captured = False
+    date = None
+    # trigger to skip lines until in_session mark is matched
+    in_session = False
+    # lines searched for the date and the begin mark, for lib/metrics.py
+    date_lines = 0
+    begin_lines = 0
+    begin_found = False
+
+    issue_state = IssueState()
+
+    # variable captures contain new speaker if new speaker is detected
+    new_speaker = None
+    # contains current speaker, to use actual speaker and not speaker that interrupts speech
+    current_speaker = None
+
+    # trigger to check whether a interjection is found
+    interjection = False
+    interjection_complete = None
+    interjection_text = []
+
+    # dummy variables and categorial variables to characterize speaker
+    president = False
+    executive = False
+    servant = False
+    party = None
+    role = None
+
+    # counts to keep order
+    seq = 0
+    sub = 0
+
+    text = []
+    # how often the current text was cleaned, see text_cleaning.cleans_speeches
+    text_passes = 0
+    # per row: fragment kind and hyphen passes for text_cleaning
+    kinds = []
+    hyphen_passes = []
+
+    for (i, record), has_more in helper.lookahead(enumerate(records)):
+        # tagged line for the regular expressions, clean line for the text
+        line, clean_line = tags.lines[i], tags.clean_lines[i]
+
+        # grabs date, goes to next line until it is captured
+        if not date_captured:
+            date_lines += 1
+            match = profile.DATE_CAPTURE.search(line)
+            if match:
+                date = helper.parses_date(match.group(1), profile.DATE_FORMATS)
+                date_captured = True
+            continue
+        if not in_session:
+            begin_lines += 1
+            if profile.BEGIN_MARK.search(line):
+                in_session = begin_found = True
+            continue
+
+        if profile.skips_line(line, clean_line):
+            continue
+
+        line = profile.continues_issue(issue_state, line)
+        # the precomputed tags are only used while the hooks leave the line unchanged
+        classified = line == tags.lines[i]
+        bold = False
+
+        # detects speaker, if no interjection is found:
+        if record.flags & line_records.BOLD_BEGIN and not interjection and (profile.SPEAKER_IN_ISSUE or not issue_state.poi):
+            if classified:
+                line, speaker_match = tags.speaker_lines[i], tags.speakers[i]
+            else:
+                line = profile.prepares_speaker_line(line)
+                speaker_match = rules.matches(line)
+                rules.counts([speaker_match])
+            if speaker_match:
+                rule, captures = speaker_match
+                new_speaker = rule['cleans_name'](captures[rule['name']])
+                party = captures[rule['party']] if rule['party'] else None
+                role = captures[rule['role']] if isinstance(rule['role'], int) else rule['role']
+                # remembers speakers whose party can come from other sessions
+                if looked_up is not None and profile.looks_up_party(rule, wp):
+                    looked_up.add(new_speaker)
+                president = rule['president']
+                executive = rule['executive']
+                if rule['servant'] is not None:
+                    servant = rule['servant']
+                new_speaker, party = profile.resolves_speaker(new_speaker, party, rule, line, date, wp, speaker_parties)
+                # also the first speaker of a session; the former HH script cleaned a name only once a
+                # speaker was current, so its first line became a speech of the uncleaned name
+                new_speaker, party = profile.cleans_speaker(new_speaker, party)
+            else:
+                starts_line = line
+                line = profile.starts_issue(issue_state, line)
+                classified = classified and line == starts_line
+
+            line = line_classifier.strips_poi(line)
+            bold = True
+
+        if classified:
+            end_mark = tags.bold_ends[i] if bold else tags.ends[i]
+        else:
+            end_mark = bool(profile.END_MARK.search(line))
+            metrics.counts_regex(f'{profile.STATE}.END_MARK', 1, end_mark)
+
+        # saves previous speech if new speaker or end of session is detected:
+        if new_speaker is not None and current_speaker is not None:
+            if new_speaker != current_speaker or end_mark or not has_more:
+                speeches.append(current_speaker, current_party, text_cleaning.joins_lines(text), seq, sub, current_executive, current_servant, wp, session, current_president, current_role, profile.STATE, interjection, date, issue_state.issue)
+                kinds.append(text_cleaning.SPEECH)
+                hyphen_passes.append(text_passes + profile.JOINS_HYPHENS_AT_SPEAKER_CHANGE)
+
+                # stops iterating over lines, if end of session is reached e.g. Schluss: 17:16 Uhr
+                if end_mark:
+                    in_session = False
+                    break
+
+                # Tracking speeches
+                seq += 1
+                sub = 0
+                current_speaker = None
+
+        # adds interjections to the data in such a way that order is maintained
+        if record.flags & line_records.INTERJECTION_BEGIN and not interjection \
+                and (profile.INTERJECTION_IN_BOLD_LINE or not record.flags & line_records.BOLD_BEGIN) \
+                and ((tags.bold_interjections[i] if bold else tags.interjections[i]) if classified else profile.INTERJECTION_MARK.search(line)):
+            # saves speech of speaker until this very interjection
+            if not interjection_complete and current_speaker is not None:
+                text_passes += 1
+                speeches.append(current_speaker, current_party, text_cleaning.joins_lines(text), seq, sub, current_executive, current_servant, wp, session, current_president, current_role, profile.STATE, interjection, date, issue_state.issue)
+                kinds.append(text_cleaning.SPEECH)
+                hyphen_passes.append(text_passes)
+            sub += 1
+            interjection = True
+            interjection_text = []
+
+        if interjection:
+            if record.flags & line_records.INTERJECTION_END:
+                # to avoid an error, if interjection is at the beginning without anybody having started speaking
+                if current_speaker is not None:
+                    if clean_line and not clean_line.isspace():
+                        interjection_text.append(clean_line)
+                    speeches.append(current_speaker, current_party, text_cleaning.joins_lines(interjection_text), seq, sub, current_executive, current_servant, wp, session, current_president, current_role, profile.STATE, interjection, date, issue_state.issue)
+                    kinds.append(text_cleaning.INTERJECTION)
+                    hyphen_passes.append(1)
+                    sub += 1
+                interjection = False
+                interjection_complete = True
+            elif clean_line and not clean_line.isspace():
+                interjection_text.append(clean_line)
+            continue
+
+        if current_speaker is not None:
+            if interjection_complete:
+                interjection_complete = None
+                text = []
+                text_passes = 0
+            if text_cleaning.keeps_line(clean_line):
+                text.append(clean_line)
+            continue
+
+        if new_speaker is not None:
+            if ":* " in line:
+                line = line.split(':* ', 1)[-1]
+            elif ":" in line:
+                line = line.split(':', 1)[-1]
+            line = line_records.strips_tags(line)
+            text = [line] if text_cleaning.keeps_line(line) else []
+            text_passes = 0
+            current_speaker = new_speaker
+            current_party = party
+            current_president = president
+            current_executive = executive
+            current_servant = servant
+            current_role = role
+            interjection_complete = None
+        if not has_more and in_session:
+            errormessages.append(f"WP {wp} Session {session}: no match for end mark -> ERROR")
+
+    metrics.counts_regex(f'{profile.STATE}.DATE_CAPTURE', date_lines, int(date_captured))
+    metrics.counts_regex(f'{profile.STATE}.BEGIN_MARK', begin_lines, int(begin_found))
+    speeches = text_cleaning.cleans_speeches(speeches, kinds, hyphen_passes, profile)
+    return speeches, errormessages
+
+
+def numbers_session(filename, profile):
+    """extracts wp and session no. from the file name"""
+    profile = load_profile(profile)
+    numbers = profile.FILENAME_MARK.search(os.path.basename(filename))
+    return int(numbers.group(1)), int(numbers.group(2))
+
+
+def parses_file(filename, profile, speaker_parties=None, looked_up=None):
+    """
+    parses the transcript of one session
+
+    Keyword arguments:
+    filename: path of a _xml.txt file created by stage 4
+    profile: state profile module or state abbreviation
+    speaker_parties, looked_up: see parse_session
+
+    returns a speech_table.SpeechColumns and a list of error messages
+    """
+    profile = load_profile(profile)
+    wp, session = numbers_session(filename, profile)
+
+    # line records keep the layout tags apart from the clean text
+    records = line_records.reads_session_records(filename)
+    speeches, errormessages = parse_session(records, profile, wp, session, speaker_parties, looked_up=looked_up)
+
+    n_speeches, n_interjections = speeches.counts_speeches()
+    if n_interjections < 50 or n_speeches < 20:
+        errormessages.append(f"Warning - WP {wp} Session {session}: Only {n_speeches} speeches and {n_interjections} interjections")
+    return speeches, errormessages
+
+
+def parses_file_alone(filename, state, cache_folder=None, speaker_parties=None):
+    """
+    parses one session, runs in a worker process
+
+    Keyword arguments:
+    filename: path of a _xml.txt file created by stage 4
+    state: state abbreviation of the profile
+    cache_folder: folder of the session cache (lib/session_cache.py), None to always parse
+    speaker_parties: read-only dict speaker -> party of the other sessions (party_map.PartyMap.at)
+
+    A cached result is used if the speakers it looked up still have the same parties.
+
+    returns the speeches and the error messages
+    """
+    with metrics.times_file('parse', filename) as entry:
+        speaker_parties = speaker_parties or {}
+        if cache_folder is not None:
+            key = session_cache.cache_key(filename, load_profile(state))
+            result = session_cache.loads_session(cache_folder, filename, key)
+            if result is not None:
+                speeches, errormessages, looked_up_parties = result
+                if all(speaker_parties.get(name) == party for name, party in looked_up_parties.items()):
+                    metrics.counts('parse.cached_sessions')
+                    entry['rows'] = len(speeches)
+                    entry['cached'] = True
+                    return speeches, errormessages
+
+        looked_up = set()
+        speeches, errormessages = parses_file(filename, state, dict(speaker_parties), looked_up)
+        metrics.counts('parse.parsed_sessions')
+        entry['rows'] = len(speeches)
+
+        if cache_folder is not None:
+            looked_up_parties = {name: speaker_parties.get(name) for name in looked_up}
+            session_cache.stores_session(cache_folder, filename, key, (speeches, errormessages, looked_up_parties))
+        return speeches, errormessages
+
+
+def scans_file(filename, state):
+    """first pass over one session (party_map.scans_parties), runs in a worker process"""
+    with metrics.times_file('scan_parties', filename):
+        profile = load_profile(state)
+        wp, session = numbers_session(filename, profile)
+        date, parties = party_map.scans_parties(line_records.reads_session_records(filename), profile, wp)
+        return date, wp, session, parties
+
+
+def maps_parties(files, profile, executor=None):
+    """
+    scans all sessions for the parties of their speakers
+
+    Keyword arguments:
+    files: _xml.txt files
+    profile: state profile module
+    executor: pool of worker processes, None to scan in this process
+
+    returns a party_map.PartyMap and the (date, wp, session) of every file
+    """
+    states = [profile.STATE] * len(files)
+    if executor is None:
+        scans = map(scans_file, files, states)
+    else:
+        scans = map(metrics.merges, executor.map(metrics.calls, [scans_file] * len(files), files, states,
+                                                 chunksize=max(1, len(files) // 64)))
+    parties = party_map.PartyMap()
+    sessions = []
+    with metrics.times_stage('scan_parties'):
+        for date, wp, session, session_parties in scans:
+            parties.adds(date, wp, session, session_parties)
+            sessions.append((date, wp, session))
+    return parties, sessions
+
+
+def lists_files(profile, data_path=None):
+    """returns the sorted _xml.txt files of a state"""
+    profile = load_profile(profile)
+    txt_folder = os.path.join(data_path or profile.DATA_PATH, "txt")
+    return sorted([os.path.join(dp, f) for dp, dn, fn in os.walk(txt_folder) for f in fn if f.endswith("xml.txt")])
+
+
+def parses_files(files, profile, jobs=None, cache_folder=None):
+    """
+    parses sessions in a pool of worker processes
+
+    Sessions are independent apart from the speaker -> party dict of profiles that look up parties
+    (HH). For those a first pass scans all sessions in parallel for the parties of their speakers
+    (maps_parties); every session is then parsed with its read-only view of that map, so the result
+    does not depend on the order or the worker in which sessions are parsed.
+
+    Keyword arguments:
+    files: _xml.txt files in the order in which the results are yielded
+    profile: state profile module or state abbreviation; workers load it by its STATE
+    jobs: number of worker processes, defaults to the number of CPUs; 1 parses in this process
+    cache_folder: folder of the session cache, None to parse all files
+
+    yields filename, speeches and error messages per session in the order of files
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    profile = load_profile(profile)
+    jobs = jobs or os.cpu_count() or 1
+    states = [profile.STATE] * len(files)
+    cache_folders = [cache_folder] * len(files)
+
+    if jobs == 1 or len(files) == 1:
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(max_workers=min(jobs, len(files)))
+    try:
+        if profile.looks_up_party is common.looks_up_no_party:
+            parties = [None] * len(files)
+        else:
+            speaker_parties, sessions = maps_parties(files, profile, executor)
+            parties = (speaker_parties.at(*session) for session in sessions)
+
+        if executor is None:
+            results = map(parses_file_alone, files, states, cache_folders, parties)
+        else:
+            results = submits_bounded(executor, files, profile.STATE, cache_folder, parties, 2 * jobs)
+        for filename, (speeches, messages) in zip(files, results):
+            yield filename, speeches, messages
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+
+def submits_bounded(executor, files, state, cache_folder, parties, window):
+    """yields the results of parses_file_alone in order with at most window sessions in flight"""
+    from collections import deque
+
+    pending = deque()
+    for filename, speaker_parties in zip(files, parties):
+        # the worker returns its metrics with the result
+        pending.append(executor.submit(metrics.calls, parses_file_alone, filename, state, cache_folder, speaker_parties))
+        if len(pending) >= window:
+            yield metrics.merges(waits_for(pending.popleft()))
+    while pending:
+        yield metrics.merges(waits_for(pending.popleft()))
+
+
+def waits_for(future):
+    """result of a worker; the time the main process waits shows as idle span in the trace"""
+    if future.done():
+        return future.result()
+    with metrics.times_span('wait for worker', 'idle'):
+        return future.result()
+
+
+def parses_state(state, data_path=None, jobs=None, outputs=('csv',), parquet_path=None, sqlite_path=None, cache=True,
+                 compression=None, resolves_names=True, force=False):
+    """
+    parses all sessions of a state and writes {STATE}.csv, {STATE}_sample.csv, {STATE}_speakers.csv and
+    {STATE}_aggregates.csv
+
+    Sessions are parsed in (wp, session) order and written one by one (speech_output.SpeechWriter),
+    so memory does not grow with the number of sessions. All outputs cover the whole state (speaker
+    ids are numbered over all its sessions), so there is no choice of legislative periods; sessions
+    that did not change come from the cache.
+
+    Keyword arguments:
+    state: "HH", "SN", "NRW" or a profile module
+    data_path: folder with the txt subfolder, defaults to data/{STATE}
+    jobs: number of worker processes, see parses_files
+    outputs: "csv", "parquet", "sqlite" and/or "corpus" (see lib/speech_output.py)
+    parquet_path: root of the parquet dataset, defaults to data/parquet
+    sqlite_path: SQLite database with full-text index, defaults to data/speeches.sqlite
+    cache: reuse the results of unchanged sessions from data/{STATE}/cache
+    compression: None or "gzip" to write {STATE}.csv.gz
+    resolves_names: replace broken speaker names by names of the roster (lib/name_index.py) and
+        list them in {STATE}_resolved_names.csv
+    force: parse and write even if no session, profile or option changed since the last run
+        (lib/build_manifest.py)
+
+    returns the number of rows written
+    """
+    from tqdm import tqdm
+
+    profile = load_profile(state)
+    data_path = data_path or profile.DATA_PATH
+    if 'parquet' in outputs:
+        # fails before parsing if pyarrow is missing
+        import pyarrow  # noqa: F401
+    files = lists_files(profile, data_path)
+    if not files:
+        print(f"No files found in {os.path.join(data_path, 'txt')}")
+        return None
+    # rows in (wp, session, seq, sub) order, whichever worker parsed the session
+    files = sorted(files, key=lambda filename: numbers_session(filename, profile))
+
+    manifest = build_manifest.opens_manifest(data_path)
+    inputs = files + [name for name in (f.replace('_xml.txt', line_records.RECORDS_SUFFIX) for f in files) if os.path.exists(name)]
+    artifact = lists_outputs(profile, data_path, outputs, compression, parquet_path, sqlite_path)
+    params = build_manifest.hashes_params(profile=session_cache.hashes_profile(profile), outputs=sorted(outputs),
+                                          parquet_path=parquet_path, sqlite_path=sqlite_path, compression=compression,
+                                          resolves_names=resolves_names)
+    # the parameters of outputs from before the manifest are unknown, they are written again
+    if not force and not manifest.is_stale(artifact, inputs, params, 'txt_to_rows', adopts=False):
+        manifest.saves()
+        print(f"{profile.STATE}: {len(files)} sessions up to date")
+        return manifest.entry(artifact[0]).get('rows')
+
+    errormessages = []
+    with metrics.records_run('txt_to_rows', profile.STATE, data_path):
+        writer = speech_output.SpeechWriter(profile.STATE, data_path, outputs, parquet_path, sqlite_path, compression)
+
+        cache_folder = os.path.join(data_path, session_cache.CACHE_FOLDER) if cache else None
+        resolver = name_index.NameResolver(cache_folder) if resolves_names else None
+        speakers = speaker_table.SpeakerTable()
+        for filename, speeches, messages in tqdm(parses_files(files, profile, jobs, cache_folder), total=len(files)):
+            for errormessage in messages:
+                print("\n", errormessage)
+            errormessages.extend(messages)
+            with metrics.times_stage('resolve_speakers'):
+                if resolver is not None:
+                    resolver.resolves_session(speeches)
+                speakers.assigns(speeches)
+            with metrics.times_stage('write'):
+                writer.writes_session(speeches)
+        with metrics.times_stage('write'):
+            writer.writes_speakers(speakers.to_frame())
+            writer.closes()
+        if resolver is not None:
+            resolver.closes(os.path.join(data_path, f'{profile.STATE}_resolved_names.csv'))
+        metrics.counts('txt_to_rows.rows', writer.rows)
+
+    manifest.records(artifact, inputs, params, 'txt_to_rows', rows=writer.rows)
+    manifest.saves()
+
+    for mess in errormessages:
+        print(mess)
+    return writer.rows
+
+
+def lists_outputs(profile, data_path, outputs, compression=None, parquet_path=None, sqlite_path=None):
+    """
+    the files that parses_state writes, the first one names its manifest entry
+
+    The parquet partitions and the SQLite rows of the state are listed as their markers, see
+    speech_output.parquet_marker_path and build_manifest.names_sqlite_marker.
+    """
+    files = [os.path.join(data_path, f'{profile.STATE}_speakers.csv'), os.path.join(data_path, f'{profile.STATE}_sample.csv'),
+             os.path.join(data_path, f'{profile.STATE}_aggregates.csv')]
+    if 'parquet' in outputs:
+        files.append(speech_output.parquet_marker_path(parquet_path or speech_output.default_parquet_path(data_path),
+                                                       profile.STATE))
+    if 'sqlite' in outputs:
+        files.append(build_manifest.names_sqlite_marker(sqlite_path or speech_output.default_sqlite_path(data_path),
+                                                        speech_output.sqlite_marker_key(profile.STATE)))
+    if 'corpus' in outputs:
+        files.append(os.path.join(corpus_store.default_corpus_path(data_path), corpus_store.META_FILE))
+    if 'csv' in outputs:
+        files.insert(0, os.path.join(data_path, profile.STATE + '.csv' + ('.gz' if compression == 'gzip' else '')))
+    return files
@@ -0,0 +1,88 @@
+# coding: utf-8
+from bisect import bisect_left
+
+from lib import helper, line_classifier, line_records
+
+# Parties of speakers that are named without party (HH: interposed questions and continuations)
+# come from the speakers' other speeches. Instead of passing one dict from session to session,
+# a first pass scans the speaker lines of all sessions independently (scans_parties) and collects
+# the parties that the profile stores (profile.resolves_speaker). The PartyMap then gives every
+# session the same read-only view whatever order the sessions are parsed in:
+#
+# for each speaker the party of its last session before the session in the same legislative
+# period, ordered by (date, session). A speaker without earlier session in the period is not in
+# the view, as when the sessions were parsed one after the other; parse_session adds the parties
+# read in the session itself.
+
+
+def scans_parties(records, profile, wp):
+    """
+    first pass over a session: date and parties stored by the profile, without building speeches
+
+    Keyword arguments:
+    records: line records of the session (lib/line_records.py)
+    profile: state profile module
+    wp: legislative period
+
+    returns (date, dict speaker -> party)
+    """
+    rules = line_classifier.combines_speaker_rules(profile)
+    date_captured = False
+    date = None
+    in_session = False
+    parties = {}
+    for record in records:
+        line, clean_line = profile.prepares_line(record.tagged, record.text)
+        if not date_captured:
+            match = profile.DATE_CAPTURE.search(line)
+            if match:
+                date = helper.parses_date(match.group(1), profile.DATE_FORMATS)
+                date_captured = True
+            continue
+        if not in_session:
+            in_session = bool(profile.BEGIN_MARK.search(line))
+            continue
+        if not record.flags & line_records.BOLD_BEGIN or profile.skips_line(line, clean_line):
+            continue
+        line = profile.prepares_speaker_line(line)
+        speaker_match = rules.matches(line)
+        if speaker_match:
+            rule, captures = speaker_match
+            new_speaker = rule['cleans_name'](captures[rule['name']])
+            party = captures[rule['party']] if rule['party'] else None
+            # the hook stores what parse_session would store into speaker_parties
+            profile.resolves_speaker(new_speaker, party, rule, line, date, wp, parties)
+    return date, parties
+
+
+class PartyMap:
+    """parties of the speakers of all sessions of a state, see scans_parties"""
+
+    def __init__(self):
+        # wp -> speaker -> sorted list of ((date, session), party)
+        self.entries = {}
+
+    def __len__(self):
+        return sum(len(speakers) for speakers in self.entries.values())
+
+    def adds(self, date, wp, session, parties):
+        """adds the parties found in one session"""
+        key = (date or '', session)
+        speakers = self.entries.setdefault(wp, {})
+        for name, party in parties.items():
+            entries = speakers.setdefault(name, [])
+            entries.insert(bisect_left(entries, (key,)), (key, party))
+
+    def at(self, date, wp, session):
+        """
+        dict speaker -> party as seen by the session (date, wp, session)
+
+        The dict is a new object; parse_session may add the parties of the session to it.
+        """
+        key = (date or '', session)
+        parties = {}
+        for name, entries in self.entries.get(wp, {}).items():
+            i = bisect_left(entries, (key,))
+            if i > 0:
+                parties[name] = entries[i - 1][1]
+        return parties
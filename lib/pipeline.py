@@ -0,0 +1,359 @@
+# coding: utf-8
+import importlib.util
+import json
+import os
+import sys
+import time
+from collections import deque
+
+from lib import build_manifest, metrics
+
+# Stages 3, 4 and 5 as one pipeline (python landtag.py run). A session moves on to the next stage as
+# soon as its previous stage is done, instead of waiting until the stage has done all sessions:
+#
+# pdf -pdf_to_xml-> xml -xml_to_txt-> _xml.txt, _lines.tsv -parse-> session cache -> {STATE}.csv
+#
+# All stages share one pool of jobs worker processes. In front of every stage a queue holds the
+# sessions whose input is ready. A stage only takes a session if the stage behind it has room, i.e.
+# fewer than queue_size sessions waiting for it or in work, so a slow stage holds back the stages
+# before it instead of piling up files. A free worker takes a session of the latest stage first,
+# which finishes sessions early and empties the queues.
+#
+# The parse stage stores every session in the session cache (lib/session_cache.py) as soon as its
+# txt is written; after the last session parses_state writes the outputs in (wp, session) order
+# from the cache. Profiles that look up parties (HH) need the parties of all sessions first
+# (lib/party_map.py), for them parses_state parses all sessions at the end. The manifest
+# (lib/build_manifest.py) decides which stages a session needs.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STAGE_SCRIPTS = {'retrieve': '1_retrieve.py', 'layout': '2_analyze_layout.py', 'pdf-to-xml': '3_parser_wrapper_to_xml.py',
+                 'xml-to-txt': '4_parse_transcript_xml_to_txt.py'}
+STAGES = ('pdf_to_xml', 'xml_to_txt', 'parse')
+
+
+def loads_stage(command):
+    """the module of a numbered stage script, whose file name is not importable"""
+    filename = STAGE_SCRIPTS[command]
+    name = os.path.splitext(filename)[0].lstrip('0123456789_')
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, filename))
+    module = importlib.util.module_from_spec(spec)
+    # worker processes unpickle the stage's functions by the module name
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def lists_files(folder, suffix, state, wps=None):
+    """
+    files in folder that end with suffix, sorted
+
+    Keyword arguments:
+    folder: e.g. data/HH/pdf
+    suffix: e.g. ".pdf"
+    state: state abbreviation, its profile's FILENAME_MARK gives the legislative period of a file
+    wps: legislative periods to keep, None for all
+    """
+    from lib.profiles import load_profile
+
+    files = sorted(os.path.join(dp, f) for dp, dn, fn in os.walk(folder) for f in fn if f.endswith(suffix))
+    if wps:
+        mark = load_profile(state).FILENAME_MARK
+        files = [f for f in files if (numbers := mark.search(os.path.basename(f))) and int(numbers.group(1)) in wps]
+    return files
+
+
+def names_session(filename):
+    """the session of a pdf, XML or _xml.txt file, e.g. plenarprotokoll22-1"""
+    return os.path.basename(filename).split('.')[0].replace('_xml', '')
+
+
+def caches_session(filename, state, cache_folder):
+    """parses one session into the session cache, runs in a worker process; returns its number of rows"""
+    from lib import parser_engine
+
+    speeches, errormessages = parser_engine.parses_file_alone(filename, state, cache_folder)
+    return len(speeches)
+
+
+class Pipeline:
+    """
+    the sessions of a state on their way from pdf to the session cache
+
+    Keyword arguments:
+    BUNDESLAND: state abbreviation
+    data_path: folder of the state with params_{STATE}.json
+    jobs: number of worker processes of all stages together
+    queue_size: sessions that may wait for a stage or be in work in it before the stage in front stops
+    pdf2txt, char_margin: see 3_parser_wrapper_to_xml.py
+    force: convert all files, not only the stale ones
+    cache: parse the sessions into the session cache as they come; False leaves stage 5 to parses_state
+    stages: the stages to run, a session ends before a stale stage that is not among them
+    work_queue: work_queue.WorkQueue shared with other nodes, None if this process works alone
+    """
+
+    def __init__(self, BUNDESLAND, data_path, jobs, queue_size, pdf2txt, char_margin, force=False, cache=True, stages=STAGES,
+                 work_queue=None):
+        from lib import session_cache
+        from lib.profiles import common, load_profile
+
+        self.to_xml, self.to_txt = loads_stage('pdf-to-xml'), loads_stage('xml-to-txt')
+        self.BUNDESLAND = BUNDESLAND
+        self.jobs = jobs
+        self.queue_size = queue_size
+        self.pdf2txt, self.char_margin = pdf2txt, char_margin
+        self.force = force
+        self.stages = stages
+        self.work_queue = work_queue
+        params_name = os.path.join(data_path, f"params_{BUNDESLAND}.json")
+        with open(params_name, encoding="utf-8") as fp:
+            self.layout = json.load(fp)
+
+        self.manifest = build_manifest.opens_manifest(data_path)
+        self.params = {'pdf_to_xml': self.to_xml.hashes_build_params(self.manifest, pdf2txt, char_margin),
+                       'xml_to_txt': self.to_txt.hashes_build_params(self.manifest, params_name)}
+        self.cache_folder = os.path.join(data_path, session_cache.CACHE_FOLDER)
+        # with parties looked up, a session can only be parsed once all sessions are converted
+        self.streams_parse = cache and load_profile(BUNDESLAND).looks_up_party is common.looks_up_no_party
+        self.queues = {stage: deque() for stage in STAGES}
+        self.running = {stage: 0 for stage in STAGES}
+        # sessions in the queues or in work
+        self.open = set()
+        # session -> time.time() when its first stage started
+        self.started = {}
+        # sessions leased by other nodes, (stage, filename) to try again
+        self.waiting = []
+        # session -> manifest entries of its artifacts, for the other nodes
+        self.built = {}
+        self.sessions = 0
+        self.progress = None
+
+    def outputs(self, stage, filename):
+        """the files that stage writes for its input filename"""
+        if stage == 'pdf_to_xml':
+            return self.to_xml.names_outputs(filename)
+        return self.to_txt.names_outputs(filename)
+
+    def needs(self, stage, filename):
+        """whether filename has to go through stage"""
+        if stage == 'parse':
+            return self.streams_parse
+        return self.force or self.manifest.is_stale(self.outputs(stage, filename), [filename], self.params[stage], stage)
+
+    def enqueues(self, stage, filename, built=False):
+        """
+        puts filename in the queue of the first stage from stage on that has to build its session
+
+        Keyword arguments:
+        stage: the stage whose input filename is
+        filename: pdf, XML or _xml.txt file
+        built: whether a stage of this run wrote filename; unchanged sessions are parsed by parses_state from the cache
+        """
+        for current in STAGES[STAGES.index(stage):]:
+            if self.needs(current, filename) and (built or current != 'parse'):
+                if current not in self.stages:
+                    # left to a run of that stage
+                    break
+                self.queues[current].append(filename)
+                self.open.add(names_session(filename))
+                return True
+            if current != 'parse':
+                filename = self.outputs(current, filename)[0]
+        self.finishes_session(filename)
+        return False
+
+    def has_room(self, stage):
+        """whether the stage behind stage can take another session"""
+        index = STAGES.index(stage) + 1
+        if index == len(STAGES):
+            return True
+        after = STAGES[index]
+        return len(self.queues[after]) + self.running[after] + self.running[stage] < self.queue_size
+
+    def takes(self, executor, futures):
+        """submits sessions to free workers, the latest stage first"""
+        for stage in reversed(STAGES):
+            while len(futures) < self.jobs and self.queues[stage] and self.has_room(stage):
+                filename = self.queues[stage].popleft()
+                session = names_session(filename)
+                if self.work_queue is not None and session not in self.started:
+                    if not self.work_queue.claims(session):
+                        self.waiting.append((stage, filename))
+                        continue
+                    # another node may have built the session since it was queued
+                    self.manifest.artifacts.update(self.work_queue.reads_done(session))
+                    if not self.needs(stage, filename):
+                        self.work_queue.releases(session)
+                        self.open.discard(session)
+                        self.enqueues(stage, filename)
+                        continue
+                self.started.setdefault(session, time.time())
+                self.running[stage] += 1
+                futures[submits(executor, *self.work(stage, filename))] = (stage, filename)
+
+    def work(self, stage, filename):
+        """the worker function of stage and its arguments"""
+        if stage == 'pdf_to_xml':
+            return self.to_xml.converts_file, filename, self.outputs(stage, filename)[0], self.pdf2txt, self.char_margin
+        if stage == 'xml_to_txt':
+            return self.to_txt.convertsFile, filename, self.layout, self.BUNDESLAND
+        return caches_session, filename, self.BUNDESLAND, self.cache_folder
+
+    def finishes(self, stage, filename, result):
+        """records the outputs of a session's stage and passes it to the next stage"""
+        self.running[stage] -= 1
+        if stage == 'parse':
+            self.finishes_session(filename)
+            return
+        if stage == 'pdf_to_xml' and not result:
+            print(f"pdf2txt.py failed on {filename}")
+            self.finishes_session(filename)
+            return
+        outputs = self.outputs(stage, filename)
+        self.manifest.records(outputs, [filename], self.params[stage], stage)
+        self.built.setdefault(names_session(filename), {})[outputs[0]] = self.manifest.entry(outputs[0])
+        self.enqueues(STAGES[STAGES.index(stage) + 1], outputs[0], built=True)
+
+    def finishes_session(self, filename):
+        """adds the time from the first stage of a session to its end as span to the trace and gives up its lease"""
+        session = names_session(filename)
+        if session in self.started:
+            metrics.spans_since(session, 'session', self.started.pop(session))
+            metrics.counts('pipeline.sessions')
+            self.sessions += 1
+            if self.work_queue is not None:
+                self.work_queue.finishes(session, self.built.pop(session, {}))
+        if session in self.open:
+            self.open.discard(session)
+            if self.progress is not None:
+                self.progress.update()
+
+    def runs(self, files, executor=None):
+        """
+        runs the pdf and XML files through the stages
+
+        Keyword arguments:
+        files: pdfs, and XML files that enter in stage 4
+        executor: pool of worker processes, None to run the stages in this process
+
+        returns the number of sessions that went through a stage
+        """
+        from concurrent.futures import FIRST_COMPLETED, wait
+        from tqdm import tqdm
+
+        for filename in files:
+            self.enqueues('pdf_to_xml' if filename.endswith('.pdf') else 'xml_to_txt', filename)
+        self.progress = tqdm(total=sum(len(queue) for queue in self.queues.values()), desc="sessions")
+        futures = {}
+        # the leases need a heartbeat while the workers run
+        timeout = None if self.work_queue is None else self.work_queue.heartbeat
+        try:
+            while True:
+                self.takes(executor, futures)
+                if not futures and any(self.queues.values()):
+                    # sessions that another node built moved on to a later stage
+                    continue
+                if not futures and self.waiting:
+                    # the sessions left are leased by other nodes: wait until they are done or their leases expire
+                    with metrics.times_span('wait for other nodes', 'idle'):
+                        time.sleep(self.work_queue.poll)
+                    self.work_queue.beats()
+                    self.manifest.saves()
+                    for stage, filename in self.waiting:
+                        self.queues[stage].append(filename)
+                    self.waiting = []
+                    continue
+                if not futures:
+                    return self.sessions
+                with metrics.times_span('wait for worker', 'idle'):
+                    done, _ = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+                if self.work_queue is not None:
+                    self.work_queue.beats()
+                for future in done:
+                    stage, filename = futures.pop(future)
+                    self.finishes(stage, filename, metrics.merges(future.result()))
+        finally:
+            self.progress.close()
+            self.manifest.saves()
+            if self.work_queue is not None:
+                self.work_queue.releases_all()
+
+
+def submits(executor, function, *args):
+    """runs function(*args) through metrics.calls in a worker of executor, or at once without executor; returns a future"""
+    if executor is not None:
+        return executor.submit(metrics.calls, function, *args)
+    from concurrent.futures import Future
+
+    future = Future()
+    future.set_result(metrics.calls(function, *args))
+    return future
+
+
+def runs_pipeline(BUNDESLAND, data_path=None, jobs=None, wps=None, pdf2txt=None, char_margin=None, force=False,
+                  queue_size=None, cache=True, stages=STAGES, distributed=False, **parse_options):
+    """
+    converts and parses the sessions of a state with stages 3, 4 and 5 running at the same time
+
+    Keyword arguments:
+    BUNDESLAND: "HH", "SN", "NRW"
+    data_path: folder of the state, defaults to data/BUNDESLAND; params_{STATE}.json of stage 2 must exist
+    jobs: number of worker processes, defaults to the number of CPUs; 1 runs all in this process
+    wps: legislative periods to convert, None for all; stage 5 parses all sessions of the state, its
+        outputs are state-wide
+    pdf2txt, char_margin: see 3_parser_wrapper_to_xml.py
+    force: rebuild all artifacts, not only the stale ones
+    queue_size: sessions that may wait for a stage, defaults to 2 * jobs
+    cache: see Pipeline; without the session cache stage 5 starts after the last session
+    stages: see Pipeline, e.g. ("pdf_to_xml",) to only convert the pdfs
+    distributed: share the sessions with the other nodes that run on data_path (lib/work_queue.py); the
+        outputs of parses_state are not written, run it once when all nodes are done
+    parse_options: more arguments of parser_engine.parses_state, e.g. outputs
+
+    XML files without a pdf (e.g. converted elsewhere) enter in stage 4.
+
+    returns the number of rows written, see parser_engine.parses_state, or the number of sessions this node
+    worked on if distributed
+    """
+    from lib import parser_engine
+
+    data_path = data_path or f"data/{BUNDESLAND}"
+    jobs = jobs or os.cpu_count() or 1
+    params_name = os.path.join(data_path, f"params_{BUNDESLAND}.json")
+    if not os.path.exists(params_name):
+        print(f"{params_name} not found, run the layout stage first")
+        return None
+    os.makedirs(os.path.join(data_path, "xml"), exist_ok=True)
+    os.makedirs(os.path.join(data_path, "txt"), exist_ok=True)
+
+    with metrics.records_run("pipeline", BUNDESLAND, data_path):
+        to_xml = loads_stage('pdf-to-xml')
+        queue = None
+        if distributed:
+            from lib import work_queue
+
+            queue = work_queue.WorkQueue(data_path)
+        pipeline = Pipeline(BUNDESLAND, data_path, jobs, queue_size or 2 * jobs, pdf2txt or to_xml.PDF2TXT,
+                            to_xml.CHAR_MARGIN if char_margin is None else char_margin, force, cache, stages, queue)
+        pdfs = lists_files(os.path.join(data_path, "pdf"), ".pdf", BUNDESLAND, wps)
+        converted = {to_xml.names_outputs(filename)[0] for filename in pdfs}
+        files = pdfs + [f for f in lists_files(os.path.join(data_path, "xml"), ".xml", BUNDESLAND, wps) if f not in converted]
+
+        executor = None
+        # a node beats for its leases while the workers run
+        if jobs > 1 or distributed:
+            from concurrent.futures import ProcessPoolExecutor
+
+            executor = ProcessPoolExecutor(max_workers=jobs)
+        try:
+            with metrics.times_stage("sessions"):
+                sessions = pipeline.runs(files, executor)
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+        print(f"{BUNDESLAND}: {sessions} sessions converted")
+        if distributed:
+            return sessions
+        return parser_engine.parses_state(BUNDESLAND, data_path=data_path, jobs=jobs, force=force, cache=cache,
+                                          **parse_options)
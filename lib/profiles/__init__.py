@@ -0,0 +1,29 @@
+import importlib
+
+# A profile is a module in this package named after the state (hh.py for "HH").
+# It holds everything that differs between the parliaments:
+#
+# STATE, FILENAME_MARK (captures wp and session), DATE_CAPTURE, DATE_FORMATS,
+# BEGIN_MARK, END_MARK, INTERJECTION_MARK, POI_ONE_LINER,
+# SPEAKER_RULES (ordered list of common.speaker_rule), SPEAKER_IN_ISSUE,
+# INTERJECTION_IN_BOLD_LINE, JOINS_HYPHENS_AT_SPEAKER_CHANGE, SPEECH_LINE_SEPARATOR,
+# INTERJECTION_LINE_SEPARATOR, INTERJECTION_DROPS_HYPHENS (see lib/text_cleaning.py), DATA_PATH
+#
+# and the hooks prepares_line, skips_line, continues_issue, starts_issue,
+# prepares_speaker_line, resolves_speaker, looks_up_party and cleans_speaker.
+# Shared implementations are in common.py.
+#
+# To support a new state copy the profile that comes closest and adapt the
+# regular expressions.
+
+
+def load_profile(state):
+    """
+    returns the profile module of a state
+
+    Keyword arguments:
+    state: "HH", "SN", "NRW" or a profile module, which is returned as is
+    """
+    if not isinstance(state, str):
+        return state
+    return importlib.import_module(f"lib.profiles.{state.lower()}")
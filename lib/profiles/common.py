@@ -0,0 +1,56 @@
+import re
+
+from lib import helper
+
+
+def speaker_rule(kind, mark, name, role, president=False, executive=False, servant=False, party=None, cleans_name=None):
+    """
+    describes one kind of speaker line
+
+    Keyword arguments:
+    kind: short name of the rule, e.g. "chair"
+    mark: compiled regex, matched at the beginning of a bold line
+    name: group of mark that contains the speaker's name
+    role: role as string or number of the group that contains the role
+    president, executive, servant: dummy variables of the speaker; servant=None keeps the previous value
+    party: group of mark that contains the party, None if there is none
+    cleans_name: function that is applied to the captured name
+    """
+    return {'kind': kind, 'mark': mark, 'name': name, 'role': role, 'president': president,
+            'executive': executive, 'servant': servant, 'party': party,
+            'cleans_name': cleans_name or collapses_spaces}
+
+
+def collapses_spaces(text):
+    """removes whitespace duplicates"""
+    return re.sub(' +', ' ', text)
+
+
+def keeps_line(line, clean_line):
+    """default for prepares_line: lines are used as they are"""
+    return line, clean_line
+
+
+def strips_line(line, clean_line):
+    """prepares_line that avoids whitespace before interjections; like ' (Heiterkeit bei SPD)'"""
+    return line.lstrip(), clean_line.lstrip()
+
+
+def skips_no_line(line, clean_line):
+    """default for skips_line"""
+    return False
+
+
+def keeps_speaker_line(line):
+    """default for prepares_speaker_line"""
+    return line
+
+
+def keeps_speaker(new_speaker, party, rule, line, date, wp, speaker_parties):
+    """default for resolves_speaker: the captured name and party are used"""
+    return new_speaker, party
+
+
+def looks_up_no_party(rule, wp):
+    """default for looks_up_party: parties are never taken from other sessions"""
+    return False
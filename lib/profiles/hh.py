@@ -0,0 +1,138 @@
+# coding: utf-8
+import re
+
+from lib import helper, hh_parts, text_cleaning
+from lib.profiles import common
+from lib.profiles.common import speaker_rule
+
+STATE = 'HH'
+DATA_PATH = f"data/{STATE}"
+
+# e.g. plenarprotokoll22-5_xml.txt
+FILENAME_MARK = re.compile(r"(\d\d)-(\d{1,3})")
+
+# regular expressions to capture speeches
+# of one session Beginn: Beginn der Sitzung:
+BEGIN_STRING = r'(Beginn der Sitzung|Beginn|Schluss|Ende):\s+\d\d[.:]\d\d\s+Uhr'
+END_STRING = r'Ende:\s+(Ende.?)?[0-9]{1,2}[.:][0-9]{1,2}\s+Uhr'
+CHAIR_STRING = r'^(Alterspräsident(?:in)?|Präsident(?:in)?|Erste(?:r)?\s+Vizepräsident(?:in)?|Vizepräsident(?:in)?)\s+(.+?)<poi_end>'
+SPEAKER_STRING = r'(.+?)\s?<poi_end>(?:\s+)?[\(]?(CDU|SPD|(?:DIE\s+)?LINKE|GAL|GR(?:-|Ü(?:-|NE))|FDP|A[fF]D|fraktionslos)[\]\)]?(?:\s+\((?:fortfahrend|unterbrechend))?'
+EXECUTIVE_STRING = r'^(Senator(?:in)?|Erste(?:r)?\s+Bürgermeister(?:in)?|Zweite(?:r)?\s+Bürgermeister(?:in)?)\s+(.+)'
+OFFICIALS_STRING = r'^(Staatsrat|Staatsrätin)\s+(.+?):'
+NOTE_STRING = r'^(?:(?:Zwischenbemerkung|Zwischenfrage)\s+von\s+)(.+)(?:\s+)?(?:<poi_end>)?(CDU|SPD|DIE\s+LINKE|GAL|GR(?:-|Ü(?:-|NE))|FDP|AfD|fraktionslos)?'
+CONTINUATION_STRING = r'^(.+)(?:\s+)?<poi_end>(?:\(fortfahrend|\(unterbrechend)'
+
+# compilation of regular expressions
+# advantage combination of strings is possible
+BEGIN_MARK = re.compile(BEGIN_STRING)
+END_MARK = re.compile(END_STRING)
+CHAIR_MARK = re.compile(CHAIR_STRING)
+SPEAKER_MARK = re.compile(SPEAKER_STRING)
+EXECUTIVE_MARK = re.compile(EXECUTIVE_STRING)
+OFFICIALS_MARK = re.compile(OFFICIALS_STRING)
+INTERJECTION_MARK = re.compile(r'<interjection_begin>')
+DATE_CAPTURE = re.compile(r'([0-9]{1,2}\.(?:\s+)?(?:.+?|)(?:\s+)?[0-9]{4})')
+DATE_FORMATS = ['%d. %B %Y', '%d.%m.%Y']
+POI_ONE_LINER = re.compile(r'(.+?)?<poi_end>(?:.+)?')
+NOTE_MARK = re.compile(NOTE_STRING)
+CONTINUATION_MARK = re.compile(CONTINUATION_STRING)
+
+
+def cleans_note_speaker(new_speaker):
+    return re.sub(' +', ' ', new_speaker).replace('<poi_end>', '').strip()
+
+
+def cleans_continuation_speaker(new_speaker):
+    return re.sub(' +', ' ', new_speaker).strip()
+
+
+SPEAKER_RULES = [
+    speaker_rule('chair', CHAIR_MARK, 2, 'chair', president=True, cleans_name=helper.cleans_speaker_hh),
+    speaker_rule('executive', EXECUTIVE_MARK, 2, 'executive', executive=True, cleans_name=helper.cleans_speaker_hh),
+    speaker_rule('servant', OFFICIALS_MARK, 2, 'servant', servant=True, cleans_name=helper.cleans_speaker_hh),
+    speaker_rule('mp', SPEAKER_MARK, 1, 'mp', party=2, cleans_name=helper.cleans_speaker_hh),
+    speaker_rule('note', NOTE_MARK, 1, 'mp', party=2, cleans_name=cleans_note_speaker),
+    speaker_rule('continuation', CONTINUATION_MARK, 1, 'mp', cleans_name=cleans_continuation_speaker),
+]
+
+# speaker lines are not searched while a multi-line issue is read
+SPEAKER_IN_ISSUE = False
+INTERJECTION_IN_BOLD_LINE = True
+# whether hyphens before lower case letters are joined when a speech ends with a new speaker
+JOINS_HYPHENS_AT_SPEAKER_CHANGE = False
+# lines are joined with a space; lines of interjections that end with '-' lose all hyphens
+SPEECH_LINE_SEPARATOR = ' '
+INTERJECTION_LINE_SEPARATOR = ' '
+INTERJECTION_DROPS_HYPHENS = True
+INDENTATION_TAGS = text_cleaning.compiles_tags('indentation_begin', 'indentation_end')
+
+prepares_line = common.keeps_line
+skips_line = common.skips_no_line
+
+
+def remove_indentation(text):
+    if text != "" and text is not None:
+        return INDENTATION_TAGS.sub('', text)
+    else:
+        return text
+
+
+def continues_issue(state, line):
+    """adds the next line of a multi-line issue"""
+    if state.poi:
+        one_liner = POI_ONE_LINER.match(line)
+        if one_liner:
+            if one_liner.group(1):
+                state.issue = remove_indentation(state.issue + ' ' + one_liner.group(1))
+            state.poi = False
+        else:
+            state.issue = remove_indentation(state.issue + ' ' + line)
+    return line
+
+
+def starts_issue(state, line):
+    """bold lines in square brackets start a new issue"""
+    if line.startswith('['):
+        one_liner = POI_ONE_LINER.match(line)
+        if one_liner:
+            state.issue = remove_indentation(one_liner.group(1))
+        else:
+            state.issue = remove_indentation(line)
+            state.poi = True
+    return line
+
+
+def prepares_speaker_line(line):
+    return line.replace('<poi_begin>', '')
+
+
+def resolves_speaker(new_speaker, party, rule, line, date, wp, speaker_parties):
+    """remembers the party of mps and looks it up for interposed questions and continuations"""
+    if rule['kind'] == 'mp':
+        speaker_parties[new_speaker] = party
+    elif rule['kind'] in ('note', 'continuation'):
+        new_speaker, party = hh_parts.finds_party(new_speaker, party, date, wp, line, speaker_parties)
+    return new_speaker, party
+
+
+def looks_up_party(rule, wp):
+    """interposed questions and continuations take the party from speaker_parties in wp 20 and 21, see hh_parts.finds_party"""
+    return rule['kind'] in ('note', 'continuation') and wp in hh_parts.PARTY_LOOKUP_WPS
+
+
+def cleans_speaker(new_speaker, party):
+    if new_speaker:
+        new_speaker = (new_speaker
+                       .replace('<poi_end>', '')
+                       .replace('(fortfahrend)', '')
+                       .replace('*', '')
+                       .replace(')', '')
+                       .replace('Stapel-', 'Stapelfeldt')
+                       .strip()
+                       )
+        new_speaker = re.sub(' +', ' ', new_speaker)
+        if party:
+            party = party.replace('AFD', 'AfD').replace('GRÜ-', 'GRÜNE')
+            if party == 'LINKE':
+                party ='DIE LINKE'
+    return new_speaker, party
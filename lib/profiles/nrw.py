@@ -0,0 +1,124 @@
+# coding: utf-8
+import re
+
+from lib import text_cleaning
+from lib.profiles import common
+from lib.profiles.common import speaker_rule
+
+STATE = 'NRW'
+DATA_PATH = f"data/{STATE}"
+
+# e.g. MMP17-5_xml.txt
+FILENAME_MARK = re.compile(r"(\d\d)-(\d{1,3})")
+
+# regular expressions to capture speeches of one session
+BEGIN_STRING = r'^<poi_begin>Beginn:?\s+(?:[0-9]{1,2}[.:][0-9]{1,2}|[0-9]{1,2})(?:\s+Uhr)?'
+END_STRING = r'^(?:Schluss|Ende):?\s+(?:[0-9]{1,2}[.:][0-9]{1,2}|[0-9]{1,2}\s*Uhr)'
+CHAIR_STRING = r'^<poi_begin>(Alterspräsident(?:in)?|(?:Geschäftsführender\s+)?Präsident(?:in)?|Erste(?:r)?\s+Vizepräsident(?:in)?|Vizepräsident(?:in)?)\s+(.+)(?:\s+\((?:fortfahrend|unterbrechend)\))?'
+
+# parties
+# CDU, SPD, GRÜNE, FDP, PIRATEN, AfD, fraktionslos
+SPEAKER_STRING = r'^<poi_begin>(.+)(?:\s+<poi_end>|<poi_end>\s+)?(?:\*\))?\((CDU|SPD|FDP|PIRATEN|GRÜNE|AfD|fraktionslos)'
+EXECUTIVE_STRING = r'^<poi_begin>(.+?)(?:<poi_end>,(?:\*\))?\s+|,(?:\*\))?(?:\s+<poi_end>|<poi_end>\s+))(geschäftsführender|Minister(?:in)?\s+(?:für|der|des)\s+(?:.+)|Ministerpräsident(?:in)?|Finanzminis(?:-|ter(?:in)?)|Justizminister(?:in)?)'
+OFFICIALS_STRING = r'^<poi_begin>(Staatssekretär(?:in)?)\s+(.+)'
+
+# compilation of regular expressions
+# advantage combination of strings is possible
+BEGIN_MARK = re.compile(BEGIN_STRING)
+END_MARK = re.compile(END_STRING)
+CHAIR_MARK = re.compile(CHAIR_STRING)
+SPEAKER_MARK = re.compile(SPEAKER_STRING)
+EXECUTIVE_MARK = re.compile(EXECUTIVE_STRING)
+OFFICIALS_MARK = re.compile(OFFICIALS_STRING)
+EXECUTIVE_MARK_SECOND = re.compile(r'^<poi_begin>Ministerpräsident(?:in)?\s+(.+?)<poi_end>')
+CONSTITUTIONAL_COURT_MARK = re.compile(r'^<poi_begin>(.+?),<poi_end>\s+Präsident(?:in)?\s+des\s+Verfas-')
+# skips lines that start with brackes for abbreviations at the beginning of line e.g. '(EU) Drucksache [...]'
+INTERJECTION_MARK = re.compile(r'^(?:<poi_begin>)?<interjection_begin>\(')
+DATE_CAPTURE = re.compile(r'([0-9]{1,2}\.[0-9]{1,2}\.[0-9]{4})')
+DATE_FORMATS = ['%d.%m.%Y']
+POI_ONE_LINER = re.compile(r'^(.+?)?<poi_end>(?:.+)?$')
+
+
+def cleans_name(new_speaker):
+    return re.sub(' +', ' ', new_speaker).replace('<poi_begin>', '')
+
+
+def cleans_mp_name(new_speaker):
+    return re.sub(' +', ' ', new_speaker).rstrip(')').rstrip('*').replace('<poi_begin>', '')
+
+
+SPEAKER_RULES = [
+    speaker_rule('chair', CHAIR_MARK, 2, 'chair', president=True, cleans_name=cleans_name),
+    speaker_rule('executive', EXECUTIVE_MARK, 1, 'executive', executive=True, cleans_name=cleans_name),
+    speaker_rule('executive_second', EXECUTIVE_MARK_SECOND, 1, 'executive', executive=True, cleans_name=cleans_name),
+    speaker_rule('servant', OFFICIALS_MARK, 2, 1, servant=True, cleans_name=cleans_name),
+    speaker_rule('mp', SPEAKER_MARK, 1, 'mp', party=2, cleans_name=cleans_mp_name),
+    speaker_rule('constitutional_court', CONSTITUTIONAL_COURT_MARK, 1, 'president of constitutional court', servant=None, cleans_name=cleans_mp_name),
+]
+
+SPEAKER_IN_ISSUE = True
+INTERJECTION_IN_BOLD_LINE = True
+JOINS_HYPHENS_AT_SPEAKER_CHANGE = False
+# lines of speeches are joined with a space, lines of interjections without
+SPEECH_LINE_SEPARATOR = ' '
+INTERJECTION_LINE_SEPARATOR = ''
+INTERJECTION_DROPS_HYPHENS = False
+ISSUE_TAGS = text_cleaning.compiles_tags('poi_begin', 'poi_end', 'interjection_begin', 'interjection_end')
+
+prepares_line = common.strips_line
+skips_line = common.skips_no_line
+prepares_speaker_line = common.keeps_speaker_line
+resolves_speaker = common.keeps_speaker
+looks_up_party = common.looks_up_no_party
+
+
+def cleans_issue(issue):
+    return (ISSUE_TAGS.sub('', issue)
+            .replace('  ', ' ')
+            .replace('- ', '')
+            )
+
+
+def continues_issue(state, line):
+    """adds the next line of a multi-line issue"""
+    one_liner = POI_ONE_LINER.match(line)
+    # Check whether previous line contained a online issue that may continue in this line
+    if state.issue_start and not one_liner and line.lstrip() != "":
+        state.issue_start = False
+
+    if state.poi:
+        if one_liner:
+            if one_liner.group(1):
+                state.issue = state.issue + ' ' + one_liner.group(1)
+            state.poi = False
+        else:
+            state.issue = state.issue + ' ' + line
+        state.issue = cleans_issue(state.issue)
+    return line
+
+
+def starts_issue(state, line):
+    """bold lines that are no speaker start a new issue, consecutive one-liners are joined"""
+    one_liner = POI_ONE_LINER.match(line)
+    if one_liner:
+        if state.issue_start:
+            state.issue = state.issue + ' ' + one_liner.group(1)
+        else:
+            state.issue = one_liner.group(1)
+            state.issue_start = True
+    else:
+        state.issue = line
+        state.poi = True
+    state.issue = cleans_issue(state.issue)
+    return line
+
+
+def cleans_speaker(new_speaker, party):
+    new_speaker = (new_speaker
+                   .split(':')[0]
+                   .replace('<poi_end>', '')
+                   .replace('*)', '')
+                   .strip()
+                   )
+    new_speaker = re.sub(' +', ' ', new_speaker)
+    return new_speaker, party
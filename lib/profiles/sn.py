@@ -0,0 +1,117 @@
+# coding: utf-8
+import re
+
+from lib import text_cleaning
+from lib.profiles import common
+from lib.profiles.common import speaker_rule
+
+STATE = 'SN'
+DATA_PATH = f"data/{STATE}"
+
+# e.g. 7_Plenarprotokoll_5_xml.txt
+FILENAME_MARK = re.compile(r"^(\d)_\D+_(\d{1,3})")
+
+# regular expressions to capture speeches of one session
+BEGIN_STRING = r'^(?:<interjection_begin>)?\((Beginn)|(Fortsetzung)\s+der\s+Sitzung:?\s+[0-9]{1,2}[.:][0-9]{1,2}'
+END_STRING = r'^(?:<interjection_begin>)?\((?:Schluss|Unterbrechung)\s+(?:des\s+ersten\s+Teils\s+)?der\s+Sitzung(?::?\s+)?[0-9]{1,2}[.:][0-9]{1,2}|^(<interjection_begin>)?\(Schluss\s+.?der\s+Sitzung:'
+CHAIR_STRING = r'^<poi_begin>(Alterspräsident(?:in)?|Präsident(?:in)?|(?:[0-9]\.)?(?:Erste)?|(?:Zweite)?|(?:Dritte)?|(?:Vierte)?(?:\s+)?Vizepräsident(?:in)?)\s+(.+?):'
+SPEAKER_STRING = r'^<poi_begin>(.+?)\,\s+(CDU|SPD|GRÜNE|Linksfraktion|(?:Die\s+)?Linke|DIE(?:\s+)?LINKE|FDP|NPD|AfD|fraktionslos):'
+EXECUTIVE_STRING = r'^<poi_begin>(.+?),\s+(Staatsminister(?:in)?|Ministerpräsident(?:in)?).+$'
+OFFICIALS_STRING = r'^<poi_begin>(.+?),\s+(Staatssekretär(?:in)?)'
+COMISSIONER_STRING = r'^<poi_begin>(.+?),\s+(Sächsischer\s+(?:Ausländer|Datenschutz).*$)'
+
+# compilation of regular expressions
+# advantage combination of strings is possible
+BEGIN_MARK = re.compile(BEGIN_STRING)
+END_MARK = re.compile(END_STRING)
+CHAIR_MARK = re.compile(CHAIR_STRING)
+SPEAKER_MARK = re.compile(SPEAKER_STRING)
+EXECUTIVE_MARK = re.compile(EXECUTIVE_STRING)
+OFFICIALS_MARK = re.compile(OFFICIALS_STRING)
+COMISSIONER_MARK = re.compile(COMISSIONER_STRING)
+INTERJECTION_MARK = re.compile(r'^<interjection_begin>\(')
+DATE_CAPTURE = re.compile(r'([0-9]{1,2}\.(?:\s+)?.+[0-9]{4})')
+DATE_FORMATS = ['%d. %B %Y', '%d.%B %Y', '%d.%m.%Y']
+POI_ONE_LINER = re.compile(r'(.+?)?<poi_end>(?:.+)?')
+
+
+def cleans_mp_name(new_speaker):
+    return re.sub(' +', ' ', new_speaker).rstrip(')').rstrip('*')
+
+
+SPEAKER_RULES = [
+    speaker_rule('chair', CHAIR_MARK, 2, 'chair', president=True),
+    speaker_rule('executive', EXECUTIVE_MARK, 1, 'executive', executive=True),
+    speaker_rule('servant', OFFICIALS_MARK, 1, 'state secretary', servant=True),
+    speaker_rule('commissioner', COMISSIONER_MARK, 1, 'commissioner'),
+    speaker_rule('mp', SPEAKER_MARK, 1, 'mp', party=2, cleans_name=cleans_mp_name),
+]
+
+SPEAKER_IN_ISSUE = True
+# lines with a bold span are never the start of an interjection
+INTERJECTION_IN_BOLD_LINE = False
+JOINS_HYPHENS_AT_SPEAKER_CHANGE = True
+# lines are joined without a space
+SPEECH_LINE_SEPARATOR = ''
+INTERJECTION_LINE_SEPARATOR = ''
+INTERJECTION_DROPS_HYPHENS = False
+INDENTATION_TAGS = text_cleaning.compiles_tags('indentation_begin', 'indentation_end')
+ISSUE_TAGS = text_cleaning.compiles_tags('poi_begin', 'poi_end', 'indentation_begin', 'indentation_end')
+
+prepares_speaker_line = common.keeps_speaker_line
+resolves_speaker = common.keeps_speaker
+looks_up_party = common.looks_up_no_party
+
+
+def remove_indentation(text):
+    return INDENTATION_TAGS.sub('', text)
+
+
+def prepares_line(line, clean_line):
+    """adds a missing trailing space and avoids whitespace before interjections"""
+    if line and line == line.rstrip():
+        line = line + ' '
+    if clean_line and clean_line == clean_line.rstrip():
+        clean_line = clean_line + ' '
+    return line.lstrip(), clean_line.lstrip()
+
+
+def skips_line(line, clean_line):
+    """ignores header lines and page numbers e.g. 'Landtag Mecklenburg-Vorpommer - 6. Wahlperiode [...]'"""
+    return clean_line.strip().isdigit()
+
+
+def continues_issue(state, line):
+    """adds the next line of a multi-line issue"""
+    if state.poi:
+        one_liner = POI_ONE_LINER.match(line)
+        if one_liner:
+            if one_liner.group(1):
+                state.issue = state.issue + ' ' + one_liner.group(1)
+            state.issue = ISSUE_TAGS.sub('', state.issue)
+            state.poi = False
+            line = line.replace('<poi_end>', '')
+        else:
+            state.issue = state.issue + ' ' + line
+            state.issue = remove_indentation(state.issue)
+    return line
+
+
+def starts_issue(state, line):
+    """bold lines that are no speaker start a new issue"""
+    one_liner = POI_ONE_LINER.match(line)
+    if one_liner:
+        state.issue = one_liner.group(1)
+        state.issue = ISSUE_TAGS.sub('', state.issue)
+    else:
+        state.issue = remove_indentation(line)
+        state.poi = True
+    return line
+
+
+def cleans_speaker(new_speaker, party):
+    if new_speaker:
+        new_speaker = new_speaker.replace(':', '').replace('<poi_end>', '').strip()
+        if party:
+            party = party.replace('BÜNDNIS 90', 'GRÜNE').replace('BÜNDNISGRÜNE', 'GRÜNE').replace('Linksfraktion', 'DIE LINKE')
+    return new_speaker, party
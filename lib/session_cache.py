@@ -0,0 +1,140 @@
+# coding: utf-8
+import gzip
+import hashlib
+import importlib
+import inspect
+import os
+import pickle
+import re
+import types
+
+from lib import line_records, metrics, speaker_registry, speech_table
+
+# Parsed sessions are cached per _xml.txt file in data/{STATE}/cache. The key of an entry is
+# made of the hash of the input and the hash of the profile: its regular expressions and
+# the source of the modules that contain the parser and the profile's cleaning functions. The
+# input is the txt content, together with the _lines.tsv records if the parser reads them
+# (line_records.names_session_records).
+# Changing a regex or adding a session therefore only reparses the sessions concerned. A session
+# that looked up parties of speakers from other sessions (parser_engine.parses_files) is parsed
+# again if one of these parties changed.
+#
+# Entries are written to a temporary file and renamed, so an interrupted run leaves only
+# complete entries behind and the next run continues where it stopped.
+
+CACHE_FOLDER = 'cache'
+# modules whose code determines the result of every state
+PARSER_MODULES = ['lib.parser_engine', 'lib.line_classifier', 'lib.line_records', 'lib.speech_table',
+                  'lib.text_cleaning', 'lib.speaker_registry']
+# data files read by the parser or the cleaning functions
+DATA_FILES = [speaker_registry.REGISTRY_FILE]
+
+_profile_hashes = {}
+
+
+def hashes_file(filename):
+    """sha256 of the content of a file"""
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def hashes_profile(profile):
+    """
+    sha256 of everything that determines how a profile parses a session
+
+    Keyword arguments:
+    profile: state profile module
+
+    The regular expressions of the profile are hashed with their flags, the cleaning functions
+    by the source of the modules they are defined in, together with the parser modules and
+    the data files.
+    """
+    if profile.STATE in _profile_hashes:
+        return _profile_hashes[profile.STATE]
+
+    digest = hashlib.sha256()
+    modules = {name: importlib.import_module(name) for name in PARSER_MODULES}
+    modules[profile.__name__] = profile
+    values = [value for name, value in sorted(vars(profile).items()) if not name.startswith('__')]
+    values += [value for rule in profile.SPEAKER_RULES for value in rule.values()]
+
+    for value in values:
+        if isinstance(value, re.Pattern):
+            digest.update(f'{value.pattern}\0{value.flags}\0'.encode('utf-8'))
+        elif isinstance(value, types.FunctionType):
+            module = inspect.getmodule(value)
+            if module is not None:
+                modules[module.__name__] = module
+        elif isinstance(value, types.ModuleType) and value.__name__.startswith('lib.'):
+            modules[value.__name__] = value
+
+    for name in sorted(modules):
+        digest.update(name.encode('utf-8'))
+        digest.update(inspect.getsource(modules[name]).encode('utf-8'))
+    for filename in DATA_FILES:
+        digest.update(hashes_file(filename).encode('utf-8'))
+
+    _profile_hashes[profile.STATE] = digest.hexdigest()
+    return _profile_hashes[profile.STATE]
+
+
+def cache_key(filename, profile):
+    """key of a session: hash of the txt content and of the records read with it, and profile hash"""
+    content = hashes_file(filename)
+    records_name = line_records.names_session_records(filename)
+    if records_name is not None:
+        content = hashlib.sha256(f'{content}\0{hashes_file(records_name)}'.encode('utf-8')).hexdigest()
+    return content[:20] + '-' + hashes_profile(profile)[:20]
+
+
+def cache_filename(cache_folder, filename, key):
+    return os.path.join(cache_folder, f'{os.path.basename(filename)}.{key}.pickle.gz')
+
+
+def loads_session(cache_folder, filename, key):
+    """returns the cached result of a session or None"""
+    path = cache_filename(cache_folder, filename, key)
+    if not os.path.exists(path):
+        return None
+    metrics.reads(path)
+    try:
+        with metrics.times_span('read cache'), gzip.open(path, 'rb') as f:
+            columns, errormessages, looked_up_parties = pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError, ValueError):
+        # incomplete entries cannot occur because of the rename, but a damaged file is parsed again
+        return None
+    speeches = speech_table.SpeechColumns()
+    speeches.columns = columns
+    return speeches, errormessages, looked_up_parties
+
+
+def stores_session(cache_folder, filename, key, result):
+    """
+    writes the result of a session atomically and removes outdated entries of the same file
+
+    Keyword arguments:
+    cache_folder: folder of the cache
+    filename: _xml.txt file of the session
+    key: cache_key of the session
+    result: speeches (SpeechColumns), error messages and the parties of the speakers that were
+        looked up in the speaker parties of other sessions (dict speaker -> party or None)
+    """
+    os.makedirs(cache_folder, exist_ok=True)
+    speeches, errormessages, looked_up_parties = result
+    path = cache_filename(cache_folder, filename, key)
+    temporary = f'{path}.{os.getpid()}.tmp'
+    # columns are stored as they are collected: typed arrays and lists of strings
+    with metrics.times_span('write cache'), gzip.open(temporary, 'wb', compresslevel=1) as f:
+        pickle.dump((speeches.columns, errormessages, looked_up_parties), f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary, path)
+    metrics.writes(path)
+
+    prefix = os.path.basename(filename) + '.'
+    for entry in os.listdir(cache_folder):
+        if entry.startswith(prefix) and entry.endswith('.pickle.gz') and entry != os.path.basename(path) \
+                and re.fullmatch(r'[0-9a-f]{20}-[0-9a-f]{20}', entry[len(prefix):-len('.pickle.gz')]):
+            os.remove(os.path.join(cache_folder, entry))
+
@@ -0,0 +1,153 @@
+# coding: utf-8
+import csv
+import functools
+import os
+from collections import deque, namedtuple
+
+# Speakers, ministries and spellings that cannot be read from a transcript are listed in
+# lib/speaker_registry.csv instead of if/elif chains. Each row maps an alias, a substring of a
+# speaker line, to a canonical name and a party:
+#
+# state, wp: state and legislative period, an empty wp applies to every period
+# date_from, date_to: optional date range of the session (YYYY-MM-DD, both inclusive)
+# kind: 'speaker' (hh_parts.finds_party), 'ministry' (helper.cleans_executive_speaker_bw) or
+#       'spelling' (helper.cleans_speaker_hh, alias is replaced by name)
+# alias, name, party: an empty name or party leaves the value of the transcript unchanged
+#
+# All aliases of a state and kind are searched at once with an Aho-Corasick automaton, so a line
+# is scanned once however many rows the file has. Like the former elif chains, the row that comes
+# first in the file wins if several aliases are found. Like the former chain of str.replace calls,
+# 'spelling' rows are applied once each in the order of the file. Adding a politician is a new row.
+
+REGISTRY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'speaker_registry.csv')
+
+Entry = namedtuple('Entry', ['state', 'wp', 'date_from', 'date_to', 'kind', 'alias', 'name', 'party'])
+
+
+class Automaton:
+    """Aho-Corasick automaton that finds all occurrences of a list of patterns in one pass"""
+
+    def __init__(self, patterns):
+        self.patterns = patterns
+        # trie: transitions, failure link and indices of the patterns ending in each state
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        for index, pattern in enumerate(patterns):
+            state = 0
+            for char in pattern:
+                if char not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                    self.goto[state][char] = len(self.goto) - 1
+                state = self.goto[state][char]
+            self.output[state].append(index)
+
+        # failure links breadth first, a state also reports the patterns of its failure state
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, following in self.goto[state].items():
+                queue.append(following)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[following] = self.goto[fallback].get(char, 0)
+                self.output[following] = self.output[following] + self.output[self.fail[following]]
+
+    def finds(self, text):
+        """yields (start, pattern index) of every occurrence of a pattern in text"""
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            for index in self.output[state]:
+                yield position + 1 - len(self.patterns[index]), index
+
+
+class Registry:
+    """the rows of the registry file with one automaton per state and kind"""
+
+    def __init__(self, entries):
+        self.entries = {}
+        for entry in entries:
+            self.entries.setdefault((entry.state, entry.kind), []).append(entry)
+        self.automata = {key: Automaton([entry.alias for entry in rows]) for key, rows in self.entries.items()}
+
+    def finds(self, state, kind, wp, date, text):
+        """
+        returns the first row of the file whose alias occurs in text, or None
+
+        Keyword arguments:
+        state: state abbreviation, e.g. 'HH'
+        kind: 'speaker', 'ministry' or 'spelling'
+        wp: legislative period
+        date: date of the session (YYYY-MM-DD) or None
+        text: speaker line or name
+        """
+        automaton = self.automata.get((state, kind))
+        if automaton is None:
+            return None
+        rows = self.entries[(state, kind)]
+        found = None
+        for _, index in automaton.finds(text):
+            if (found is None or index < found) and applies(rows[index], wp, date):
+                found = index
+        return None if found is None else rows[found]
+
+    def replaces(self, state, kind, wp, date, text):
+        """
+        replaces the aliases in text by their names, row by row in the order of the file
+
+        Each row replaces all occurrences of its alias in the text left by the rows before it,
+        as text.replace(alias, name) one after the other would. A text that contains none of the
+        aliases is returned after one pass of the automaton.
+        """
+        automaton = self.automata.get((state, kind))
+        if automaton is None or next(automaton.finds(text), None) is None:
+            return text
+        for entry in self.entries[(state, kind)]:
+            if applies(entry, wp, date):
+                text = text.replace(entry.alias, entry.name)
+        return text
+
+
+def applies(entry, wp, date):
+    """whether a row applies to a session of the legislative period wp on date"""
+    if entry.wp is not None and entry.wp != wp:
+        return False
+    if entry.date_from and (date is None or date < entry.date_from):
+        return False
+    if entry.date_to and (date is None or date > entry.date_to):
+        return False
+    return True
+
+
+def reads_registry(filename=REGISTRY_FILE):
+    """reads the rows of a registry file into a Registry"""
+    with open(filename, newline='', encoding='utf-8') as f:
+        entries = [Entry(state=row['state'], wp=int(row['wp']) if row['wp'] else None,
+                         date_from=row['date_from'], date_to=row['date_to'], kind=row['kind'],
+                         alias=row['alias'], name=row['name'], party=row['party'])
+                   for row in csv.DictReader(f)]
+    return Registry(entries)
+
+
+@functools.lru_cache(maxsize=None)
+def loads_registry():
+    """the registry of REGISTRY_FILE, read once per process"""
+    return reads_registry(REGISTRY_FILE)
+
+
+@functools.lru_cache(maxsize=65536)
+def finds_entry(state, kind, wp, date, text):
+    """first matching row of the registry for a speaker line, cached per line"""
+    return loads_registry().finds(state, kind, wp, date, text)
+
+
+@functools.lru_cache(maxsize=65536)
+def replaces_spellings(state, text, wp=None, date=None):
+    """text with the 'spelling' aliases of a state replaced, cached per name"""
+    return loads_registry().replaces(state, 'spelling', wp, date, text)
@@ -0,0 +1,92 @@
+# coding: utf-8
+import sys
+from array import array
+
+# Speakers dimension of the speech table. Every distinct speaker name of a state gets an integer
+# speaker_id in the order of its first speech, (wp, session, seq); the speech table stores the id
+# next to the name (speech_table.KEY_COLUMNS), so aggregations per speaker are integer group-bys.
+# The table {STATE}_speakers.csv lists per id:
+#
+# speaker: canonical name (after lib/speaker_registry.py and lib/name_index.py)
+# parties: party history, 'party from..to' periods in order of the sessions, separated by '; '
+# roles: roles of the speaker separated by '; ', the most frequent first
+# first_date, last_date, rows: first and last session date and number of rows
+#
+# Rows without speaker get speaker_id 0.
+
+COLUMNS = ['speaker_id', 'speaker', 'parties', 'roles', 'first_date', 'last_date', 'rows']
+NO_SPEAKER = 0
+
+
+class Speaker:
+    """what is known about one speaker"""
+
+    __slots__ = ['speaker_id', 'name', 'parties', 'roles', 'first_date', 'last_date', 'rows']
+
+    def __init__(self, speaker_id, name):
+        self.speaker_id = speaker_id
+        self.name = name
+        # [party, first date, last date] in order of the sessions
+        self.parties = []
+        self.roles = {}
+        self.first_date = None
+        self.last_date = None
+        self.rows = 0
+
+    def adds(self, party, role, date):
+        """counts one row of the speaker"""
+        self.rows += 1
+        if date:
+            if self.first_date is None or date < self.first_date:
+                self.first_date = date
+            if self.last_date is None or date > self.last_date:
+                self.last_date = date
+        if role:
+            self.roles[role] = self.roles.get(role, 0) + 1
+        if party:
+            if self.parties and self.parties[-1][0] == party:
+                self.parties[-1][2] = date or self.parties[-1][2]
+            else:
+                self.parties.append([party, date, date])
+
+    def to_row(self):
+        parties = '; '.join(f'{party} {first or ""}..{last or ""}' for party, first, last in self.parties)
+        roles = '; '.join(sorted(self.roles, key=lambda role: -self.roles[role]))
+        return (self.speaker_id, self.name, parties, roles, self.first_date, self.last_date, self.rows)
+
+
+class SpeakerTable:
+    """assigns the speaker ids of a state and collects the speakers dimension"""
+
+    def __init__(self):
+        self.speakers = {}
+
+    def __len__(self):
+        return len(self.speakers)
+
+    def assigns(self, speeches):
+        """
+        adds the speaker_id column to the speeches of a session
+
+        Keyword arguments:
+        speeches: speech_table.SpeechColumns of one session, in (seq, sub) order
+        """
+        columns = speeches.columns
+        ids = array('l')
+        for speaker, party, role, date in zip(columns['speaker'], columns['party'], columns['role'], columns['date']):
+            if not speaker:
+                ids.append(NO_SPEAKER)
+                continue
+            entry = self.speakers.get(speaker)
+            if entry is None:
+                speaker = sys.intern(speaker)
+                entry = self.speakers[speaker] = Speaker(len(self.speakers) + 1, speaker)
+            entry.adds(party, role, date)
+            ids.append(entry.speaker_id)
+        columns['speaker_id'] = ids
+
+    def to_frame(self):
+        """the speakers dimension as DataFrame ordered by speaker_id"""
+        import pandas as pd
+
+        return pd.DataFrame([speaker.to_row() for speaker in self.speakers.values()], columns=COLUMNS)
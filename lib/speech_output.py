@@ -0,0 +1,602 @@
+# coding: utf-8
+import os
+
+from lib import aggregate_table, build_manifest, corpus_store, metrics
+
+# Output formats of stage 5 next to the {STATE}.csv file.
+#
+# Parquet: one dataset for all states, partitioned by state/wp/session
+# (data/parquet/state=HH/wp=22/session=5/...). speaker, party and role are dictionary encoded,
+# the numbers are stored in narrow integer types and the date as date; speaker_id refers to
+# {STATE}_speakers.csv (lib/speaker_table.py). SpeechWriter writes the partitions of a state to
+# parquet.partial/state=XX, which replaces the folder state=XX when all sessions are written, so
+# readers never see a half written state and the partitions of sessions that are gone are removed.
+# state=XX/_state.json records the rows of the state for the manifest (lib/build_manifest.py);
+# parquet readers skip files starting with an underscore.
+
+PARTITION_COLUMNS = ['state', 'wp', 'session']
+PARQUET_MARKER = '_state.json'
+CATEGORY_COLUMNS = ['speaker', 'party', 'role']
+
+
+def parquet_schema():
+    """arrow schema of the speech table; the partition columns are part of the path"""
+    import pyarrow as pa
+
+    return pa.schema([
+        ('speaker', pa.dictionary(pa.int32(), pa.string())),
+        ('party', pa.dictionary(pa.int8(), pa.string())),
+        ('speech', pa.string()),
+        ('seq', pa.int32()),
+        ('sub', pa.int32()),
+        ('executive', pa.bool_()),
+        ('servant', pa.bool_()),
+        ('wp', pa.int8()),
+        ('session', pa.int16()),
+        ('president', pa.bool_()),
+        ('role', pa.dictionary(pa.int8(), pa.string())),
+        ('state', pa.dictionary(pa.int8(), pa.string())),
+        ('interjection', pa.bool_()),
+        ('date', pa.date32()),
+        ('issue', pa.string()),
+        ('speaker_id', pa.int32()),
+    ])
+
+
+def converts_to_arrow(pd_speeches):
+    """
+    converts the speech table to an arrow table with categorical and narrow types
+
+    Keyword arguments:
+    pd_speeches: DataFrame as returned by speech_table.SpeechColumns.to_frame()
+    """
+    import pandas as pd
+    import pyarrow as pa
+
+    pd_speeches = pd_speeches.copy()
+    for column in CATEGORY_COLUMNS + ['state']:
+        if column in pd_speeches:
+            pd_speeches[column] = pd_speeches[column].astype('category')
+    pd_speeches['date'] = pd.to_datetime(pd_speeches['date'], format='%Y-%m-%d').dt.date
+    schema = parquet_schema()
+    if 'speaker_id' not in pd_speeches:
+        schema = schema.remove(schema.get_field_index('speaker_id'))
+    return pa.Table.from_pandas(pd_speeches, schema=schema, preserve_index=False)
+
+
+def writes_parquet(pd_speeches, parquet_path):
+    """
+    writes the speech table to a parquet dataset partitioned by state/wp/session
+
+    Keyword arguments:
+    pd_speeches: DataFrame as returned by speech_table.SpeechColumns.to_frame()
+    parquet_path: root folder of the dataset, e.g. data/parquet
+    """
+    import pyarrow.parquet as pq
+
+    if len(pd_speeches) == 0:
+        return
+    pq.write_to_dataset(converts_to_arrow(pd_speeches), parquet_path,
+                        partition_cols=PARTITION_COLUMNS,
+                        existing_data_behavior='delete_matching')
+
+
+def replaces_state_parquet(parquet_path, state, rows):
+    """
+    replaces the folder state={state} of the dataset by the one written to {parquet_path}.partial
+
+    Keyword arguments:
+    parquet_path: root folder of the dataset
+    state: abbreviation of the state
+    rows: number of rows of the state, written to state={state}/_state.json
+    """
+    import json
+    import shutil
+    import uuid
+
+    folder = os.path.join(parquet_path, 'state=' + state)
+    partial = os.path.join(partial_parquet_path(parquet_path), 'state=' + state)
+    # outside the dataset, so that readers never take it for a partition
+    previous = partial + '.previous'
+    os.makedirs(partial, exist_ok=True)
+    # a new token per run, so the manifest sees that another run replaced the state
+    with open(os.path.join(partial, PARQUET_MARKER), 'w', encoding='utf-8') as f:
+        json.dump({'state': state, 'rows': rows, 'token': uuid.uuid4().hex}, f)
+    os.makedirs(parquet_path, exist_ok=True)
+    if os.path.exists(previous):
+        shutil.rmtree(previous)
+    if os.path.exists(folder):
+        os.replace(folder, previous)
+    os.replace(partial, folder)
+    if os.path.exists(previous):
+        shutil.rmtree(previous)
+    try:
+        os.rmdir(partial_parquet_path(parquet_path))
+    except OSError:
+        # other states are being written
+        pass
+
+
+def reads_parquet(parquet_path, columns=None, filters=None):
+    """
+    reads (parts of) the parquet dataset into a DataFrame
+
+    Keyword arguments:
+    parquet_path: root folder of the dataset
+    columns: list of columns to read, all if None
+    filters: pyarrow filters on the partition columns e.g. [('state', '=', 'HH'), ('wp', '=', 22)]
+    """
+    import pyarrow.parquet as pq
+
+    pd_speeches = pq.read_table(parquet_path, columns=columns, filters=filters,
+                                partitioning=parquet_partitioning()).to_pandas()
+    if 'state' in pd_speeches:
+        pd_speeches['state'] = pd_speeches['state'].astype('category')
+    return pd_speeches
+
+
+def parquet_partitioning():
+    """hive partitioning of the dataset; wp and session get the narrow types of parquet_schema()"""
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    return ds.partitioning(pa.schema([('state', pa.string()), ('wp', pa.int8()), ('session', pa.int16())]), flavor='hive')
+
+
+def default_parquet_path(data_path):
+    """data/parquet next to the folders of the states"""
+    return os.path.join(os.path.dirname(os.path.normpath(data_path)), 'parquet')
+
+
+def parquet_marker_path(parquet_path, state):
+    """state=XX/_state.json of the dataset, written with the partitions of the state"""
+    return os.path.join(parquet_path, 'state=' + state, PARQUET_MARKER)
+
+
+def partial_parquet_path(parquet_path):
+    """data/parquet.partial, where SpeechWriter writes the partitions of a state"""
+    return os.path.normpath(parquet_path) + '.partial'
+
+
+# SQLite: one table speeches for all states with B-tree indexes on (state, wp, session),
+# (state, speaker_id) and date and an FTS5 index speeches_fts over the speech text (external
+# content, rowid = id). The speakers dimension of each state is in the table speakers, the counts
+# per session and speaker (lib/aggregate_table.py) in the table aggregates. The speaker names are
+# stored once in speakers, not in every row of speeches; the view speeches_named joins them in.
+# Loading a state replaces its previous rows: the new rows are collected in temporary tables
+# (staged_speeches, staged_speakers, staged_aggregates) and swapped in together with the deletion
+# of the old rows in one transaction, so an interrupted run leaves the previous rows of the state.
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS speeches (
+    id INTEGER PRIMARY KEY,
+    state TEXT NOT NULL,
+    wp INTEGER NOT NULL,
+    session INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    sub INTEGER NOT NULL,
+    party TEXT,
+    role TEXT,
+    executive INTEGER,
+    servant INTEGER,
+    president INTEGER,
+    interjection INTEGER,
+    date TEXT,
+    issue TEXT,
+    speech TEXT,
+    speaker_id INTEGER
+);
+CREATE TABLE IF NOT EXISTS speakers (
+    state TEXT NOT NULL,
+    speaker_id INTEGER NOT NULL,
+    speaker TEXT NOT NULL,
+    parties TEXT,
+    roles TEXT,
+    first_date TEXT,
+    last_date TEXT,
+    rows INTEGER,
+    PRIMARY KEY (state, speaker_id)
+);
+CREATE TABLE IF NOT EXISTS aggregates (
+    state TEXT NOT NULL,
+    wp INTEGER NOT NULL,
+    session INTEGER NOT NULL,
+    date TEXT,
+    speaker_id INTEGER,
+    speaker TEXT,
+    party TEXT,
+    issue TEXT,
+    speeches INTEGER NOT NULL,
+    fragments INTEGER NOT NULL,
+    words INTEGER NOT NULL,
+    interjections INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS aggregates_state_wp_session ON aggregates (state, wp, session);
+CREATE INDEX IF NOT EXISTS speeches_state_wp_session ON speeches (state, wp, session);
+CREATE INDEX IF NOT EXISTS speeches_date ON speeches (date);
+CREATE VIRTUAL TABLE IF NOT EXISTS speeches_fts USING fts5(
+    speech, content='speeches', content_rowid='id', tokenize='unicode61 remove_diacritics 0'
+);
+CREATE VIEW IF NOT EXISTS speeches_named AS
+    SELECT s.id, s.state, s.wp, s.session, s.seq, s.sub, k.speaker, s.party, s.role, s.executive, s.servant,
+           s.president, s.interjection, s.date, s.issue, s.speech, s.speaker_id
+    FROM speeches s LEFT JOIN speakers k ON k.state = s.state AND k.speaker_id = s.speaker_id;
+"""
+SQLITE_COLUMNS = ['state', 'wp', 'session', 'seq', 'sub', 'party', 'role', 'executive', 'servant',
+                  'president', 'interjection', 'date', 'issue', 'speech', 'speaker_id']
+# columns of the view speeches_named, in the order of the speech table
+SQLITE_NAMED_COLUMNS = SQLITE_COLUMNS[:5] + ['speaker'] + SQLITE_COLUMNS[5:]
+SQLITE_SPEAKER_COLUMNS = ['state', 'speaker_id', 'speaker', 'parties', 'roles', 'first_date', 'last_date', 'rows']
+
+
+def connects_sqlite(db_path):
+    """opens the database and creates the tables and indexes if they do not exist"""
+    import sqlite3
+
+    connection = sqlite3.connect(db_path)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=NORMAL')
+    connection.executescript(SQLITE_SCHEMA)
+    existing = [row[1] for row in connection.execute("PRAGMA table_info(speeches)")]
+    # databases written before speaker ids existed
+    if 'speaker_id' not in existing:
+        connection.execute("ALTER TABLE speeches ADD COLUMN speaker_id INTEGER")
+    # databases written with the names as read, which are listed in {STATE}_resolved_names.csv instead
+    if 'speaker_raw' in existing:
+        connection.execute("ALTER TABLE speeches DROP COLUMN speaker_raw")
+    # databases written with the speaker name in every row, which is in the table speakers instead
+    if 'speaker' in existing:
+        connection.execute("DROP INDEX IF EXISTS speeches_speaker")
+        connection.execute("ALTER TABLE speeches DROP COLUMN speaker")
+    connection.execute("CREATE INDEX IF NOT EXISTS speeches_state_speaker_id ON speeches (state, speaker_id)")
+    return connection
+
+
+def staged_tables():
+    """table -> columns of the tables that are loaded per state"""
+    return {'speeches': SQLITE_COLUMNS, 'speakers': SQLITE_SPEAKER_COLUMNS, 'aggregates': aggregate_table.COLUMNS}
+
+
+def stages_sqlite(connection):
+    """creates the empty temporary tables that collect the rows until replaces_state_sqlite"""
+    for table, columns in staged_tables().items():
+        connection.execute(f"DROP TABLE IF EXISTS temp.staged_{table}")
+        connection.execute(f"CREATE TEMP TABLE staged_{table} AS SELECT {', '.join(columns)} FROM main.{table} WHERE 0")
+
+
+def replaces_state_sqlite(connection, state):
+    """
+    replaces the rows of a state in the tables and the full-text index by its staged rows, in one
+    transaction
+
+    Keyword arguments:
+    connection: connection returned by connects_sqlite, with the rows inserted after stages_sqlite
+    state: abbreviation of the state
+    """
+    with connection:
+        connection.execute("INSERT INTO speeches_fts(speeches_fts, rowid, speech) "
+                           "SELECT 'delete', id, speech FROM speeches WHERE state = ?", (state,))
+        first_id = None
+        for table, columns in staged_tables().items():
+            connection.execute(f"DELETE FROM main.{table} WHERE state = ?", (state,))
+            if table == 'speeches':
+                first_id = connection.execute("SELECT COALESCE(MAX(id), 0) FROM speeches").fetchone()[0]
+            connection.execute(f"INSERT INTO main.{table} ({', '.join(columns)}) "
+                               f"SELECT {', '.join(columns)} FROM staged_{table} WHERE state = ? ORDER BY rowid", (state,))
+        connection.execute("INSERT INTO speeches_fts(rowid, speech) SELECT id, speech FROM speeches WHERE id > ?", (first_id,))
+        rows = connection.execute("SELECT COUNT(*) FROM speeches WHERE id > ?", (first_id,)).fetchone()[0]
+        build_manifest.marks_sqlite(connection, sqlite_marker_key(state), rows)
+
+
+def sqlite_marker_key(state):
+    """key of the rows of a state in the table manifest_markers (lib/build_manifest.py)"""
+    return 'speeches/' + state
+
+
+def inserts_sqlite(connection, pd_speeches, batch_size=10000):
+    """
+    stages speeches in batches, one transaction per batch, see stages_sqlite
+
+    Keyword arguments:
+    connection: connection returned by connects_sqlite
+    pd_speeches: DataFrame as returned by speech_table.SpeechColumns.to_frame()
+    batch_size: rows per transaction
+    """
+    columns = [column for column in SQLITE_COLUMNS if column in pd_speeches]
+    placeholders = ', '.join('?' * len(columns))
+    insert = f"INSERT INTO staged_speeches ({', '.join(columns)}) VALUES ({placeholders})"
+    # plain python values, sqlite3 does not take numpy integers
+    rows = pd_speeches[columns].astype(object).where(pd_speeches[columns].notna(), None)
+    rows = rows.itertuples(index=False, name=None)
+    while True:
+        batch = [tuple(int(v) if isinstance(v, bool) else v for v in row) for _, row in zip(range(batch_size), rows)]
+        if not batch:
+            break
+        with connection:
+            connection.executemany(insert, batch)
+
+
+def inserts_speakers_sqlite(connection, state, pd_speakers):
+    """
+    stages the speakers dimension of a state, replacing the staged one
+
+    Keyword arguments:
+    connection: connection returned by connects_sqlite
+    state: abbreviation of the state
+    pd_speakers: DataFrame as returned by speaker_table.SpeakerTable.to_frame()
+    """
+    columns = SQLITE_SPEAKER_COLUMNS[1:]
+    rows = pd_speakers[columns].astype(object).where(pd_speakers[columns].notna(), None)
+    with connection:
+        connection.execute("DELETE FROM staged_speakers WHERE state = ?", (state,))
+        connection.executemany(f"INSERT INTO staged_speakers ({', '.join(SQLITE_SPEAKER_COLUMNS)}) "
+                               f"VALUES ({', '.join('?' * len(SQLITE_SPEAKER_COLUMNS))})",
+                               [(state,) + row for row in rows.itertuples(index=False, name=None)])
+
+
+def inserts_aggregates_sqlite(connection, pd_aggregates):
+    """
+    stages the aggregate rows of a session
+
+    Keyword arguments:
+    connection: connection returned by connects_sqlite
+    pd_aggregates: DataFrame as returned by aggregate_table.aggregates_session()
+    """
+    columns = aggregate_table.COLUMNS
+    rows = pd_aggregates[columns].astype(object).where(pd_aggregates[columns].notna(), None)
+    with connection:
+        connection.executemany(f"INSERT INTO staged_aggregates ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                               list(rows.itertuples(index=False, name=None)))
+
+
+def writes_sqlite(state, pd_speeches, pd_speakers, db_path, batch_size=10000):
+    """
+    loads the speeches of a state into the SQLite database, replacing the state's previous rows
+
+    Keyword arguments:
+    state: abbreviation of the state
+    pd_speeches: DataFrame as returned by speech_table.SpeechColumns.to_frame(), with speaker_id
+    pd_speakers: DataFrame as returned by speaker_table.SpeakerTable.to_frame(), the names of the speaker ids
+    db_path: path of the database, e.g. data/speeches.sqlite
+    batch_size: rows per transaction
+    """
+    connection = connects_sqlite(db_path)
+    try:
+        stages_sqlite(connection)
+        inserts_sqlite(connection, pd_speeches, batch_size)
+        inserts_speakers_sqlite(connection, state, pd_speakers)
+        inserts_aggregates_sqlite(connection, aggregate_table.aggregates_session(pd_speeches))
+        replaces_state_sqlite(connection, state)
+        connection.execute("ANALYZE")
+    finally:
+        connection.close()
+
+
+def searches_sqlite(db_path, query, speaker=None, state=None, wp=None, date_from=None, date_to=None, limit=None):
+    """
+    full-text search over the speeches
+
+    Keyword arguments:
+    db_path: path of the database
+    query: FTS5 query, e.g. 'Klimaschutz' or '"sozialer Wohnungsbau"' or 'Klima*'
+    speaker, state, wp: restrict to a speaker, state and legislative period
+    date_from, date_to: restrict to dates, inclusive, as YYYY-MM-DD
+
+    returns a DataFrame with the matching rows in (state, wp, session, seq, sub) order
+    """
+    import pandas as pd
+
+    conditions = ["speeches_fts MATCH ?"]
+    parameters = [query]
+    for condition, value in [("s.speaker = ?", speaker), ("s.state = ?", state), ("s.wp = ?", wp),
+                             ("s.date >= ?", date_from), ("s.date <= ?", date_to)]:
+        if value is not None:
+            conditions.append(condition)
+            parameters.append(value)
+    sql = (f"SELECT {', '.join('s.' + c for c in SQLITE_NAMED_COLUMNS)} FROM speeches_fts "
+           f"JOIN speeches_named s ON s.id = speeches_fts.rowid WHERE {' AND '.join(conditions)} "
+           f"ORDER BY s.state, s.wp, s.session, s.seq, s.sub")
+    if limit:
+        sql += f" LIMIT {int(limit)}"
+    connection = connects_sqlite(db_path)
+    try:
+        return pd.read_sql_query(sql, connection, params=parameters)
+    finally:
+        connection.close()
+
+
+def default_sqlite_path(data_path):
+    """data/speeches.sqlite next to the folders of the states"""
+    return os.path.join(os.path.dirname(os.path.normpath(data_path)), 'speeches.sqlite')
+
+
+class ReservoirSample:
+    """
+    uniform random sample of fixed size from a stream of rows (reservoir sampling)
+
+    Keyword arguments:
+    size: number of rows in the sample
+    seed: seed of the random generator, None for a different sample per run
+    """
+
+    def __init__(self, size=250, seed=None):
+        import random
+
+        self.size = size
+        self.random = random.Random(seed)
+        self.seen = 0
+        # (row number, row) pairs
+        self.rows = []
+
+    def adds(self, rows):
+        """offers the rows (tuples) of one session to the sample"""
+        for row in rows:
+            if len(self.rows) < self.size:
+                self.rows.append((self.seen, row))
+            else:
+                i = self.random.randrange(self.seen + 1)
+                if i < self.size:
+                    self.rows[i] = (self.seen, row)
+            self.seen += 1
+
+    def to_frame(self, columns):
+        """the sample as DataFrame in the order of the stream, indexed by row number"""
+        import pandas as pd
+
+        rows = sorted(self.rows, key=lambda r: r[0])
+        return pd.DataFrame([row for _, row in rows], index=[n for n, _ in rows], columns=columns)
+
+
+class SpeechWriter:
+    """
+    writes the speeches of a state session by session
+
+    Only one session is held in memory. {STATE}.csv is appended to {STATE}.csv.partial, which is
+    flushed after every session and renamed when all sessions are written, so an interrupted run
+    never leaves a truncated file under the final name. Parquet partitions and SQLite rows are
+    staged per session as well and replace those of the state in closes(); the sample comes from a
+    ReservoirSample. The aggregates of every session (lib/aggregate_table.py) are appended to
+    {STATE}_aggregates.csv the same way, whatever the outputs.
+
+    Keyword arguments:
+    state: abbreviation of the state
+    data_path: folder of the state, for {STATE}.csv and {STATE}_sample.csv
+    outputs: "csv", "parquet", "sqlite" and/or "corpus" (lib/corpus_store.py)
+    parquet_path, sqlite_path: see writes_parquet and writes_sqlite
+    compression: None or "gzip" for {STATE}.csv.gz
+    sample_size: rows in {STATE}_sample.csv
+    """
+
+    def __init__(self, state, data_path, outputs=('csv',), parquet_path=None, sqlite_path=None,
+                 compression=None, sample_size=250):
+        self.state = state
+        self.data_path = data_path
+        self.outputs = outputs
+        self.parquet_path = parquet_path or default_parquet_path(data_path)
+        self.rows = 0
+        self.sample = ReservoirSample(sample_size)
+        self.csv_file = None
+        self.connection = None
+        self.corpus = None
+        self.columns = None
+        self.aggregates_path = os.path.join(data_path, state + '_aggregates.csv')
+        self.aggregates_file = None
+        self.aggregates_rows = 0
+        self.csv_path = os.path.join(data_path, state + '.csv' + ('.gz' if compression == 'gzip' else ''))
+        self.parquet_partial = partial_parquet_path(self.parquet_path)
+
+        try:
+            if 'csv' in outputs:
+                if compression == 'gzip':
+                    import gzip
+                    self.csv_file = gzip.open(self.csv_path + '.partial', 'wt', encoding='utf-8', newline='')
+                else:
+                    self.csv_file = open(self.csv_path + '.partial', 'w', encoding='utf-8', newline='')
+            if 'parquet' in outputs:
+                import shutil
+
+                # left by an interrupted run
+                shutil.rmtree(os.path.join(self.parquet_partial, 'state=' + state), ignore_errors=True)
+            if 'sqlite' in outputs:
+                self.connection = connects_sqlite(sqlite_path or default_sqlite_path(data_path))
+                stages_sqlite(self.connection)
+            if 'corpus' in outputs:
+                self.corpus = corpus_store.CorpusWriter(state, corpus_store.default_corpus_path(data_path))
+            self.aggregates_file = open(self.aggregates_path + '.partial', 'w', encoding='utf-8', newline='')
+        except BaseException:
+            self.discards()
+            raise
+
+    def writes_session(self, speeches):
+        """
+        appends the speeches of one session
+
+        Keyword arguments:
+        speeches: speech_table.SpeechColumns of the session
+        """
+        if len(speeches) == 0:
+            return
+        pd_speeches = speeches.to_frame()
+        self.columns = list(pd_speeches.columns)
+        if self.csv_file is not None:
+            pd_speeches.to_csv(self.csv_file, header=self.rows == 0, index=False)
+            self.csv_file.flush()
+        if 'parquet' in self.outputs:
+            writes_parquet(pd_speeches, self.parquet_partial)
+        if self.connection is not None:
+            inserts_sqlite(self.connection, pd_speeches)
+        if self.corpus is not None:
+            self.corpus.writes_session(pd_speeches)
+        self.writes_aggregates(pd_speeches)
+        self.sample.adds(pd_speeches.itertuples(index=False, name=None))
+        self.rows += len(pd_speeches)
+
+    def writes_aggregates(self, pd_speeches):
+        """appends the aggregate rows of one session to {STATE}_aggregates.csv and the SQLite table aggregates"""
+        pd_aggregates = aggregate_table.aggregates_session(pd_speeches)
+        pd_aggregates.to_csv(self.aggregates_file, header=self.aggregates_rows == 0, index=False)
+        self.aggregates_file.flush()
+        self.aggregates_rows += len(pd_aggregates)
+        if self.connection is not None:
+            inserts_aggregates_sqlite(self.connection, pd_aggregates)
+
+    def writes_speakers(self, pd_speakers):
+        """
+        writes the speakers dimension to {STATE}_speakers.csv and the SQLite table speakers
+
+        Keyword arguments:
+        pd_speakers: DataFrame as returned by speaker_table.SpeakerTable.to_frame()
+        """
+        speakers_path = os.path.join(self.data_path, self.state + '_speakers.csv')
+        pd_speakers.to_csv(speakers_path, index=False)
+        metrics.writes(speakers_path)
+        if self.connection is not None:
+            inserts_speakers_sqlite(self.connection, self.state, pd_speakers)
+
+    def closes(self):
+        """completes the outputs after the last session and writes the sample"""
+        from lib.speech_table import COLUMNS
+
+        columns = self.columns or COLUMNS
+        if self.csv_file is not None:
+            if self.rows == 0:
+                self.csv_file.write(','.join(columns) + '\n')
+            self.csv_file.close()
+            os.replace(self.csv_path + '.partial', self.csv_path)
+            metrics.writes(self.csv_path)
+        if self.aggregates_rows == 0:
+            self.aggregates_file.write(','.join(aggregate_table.COLUMNS) + '\n')
+        self.aggregates_file.close()
+        os.replace(self.aggregates_path + '.partial', self.aggregates_path)
+        metrics.writes(self.aggregates_path)
+        if 'parquet' in self.outputs:
+            replaces_state_parquet(self.parquet_path, self.state, self.rows)
+        if self.connection is not None:
+            replaces_state_sqlite(self.connection, self.state)
+            self.connection.execute("ANALYZE")
+            self.connection.close()
+        if self.corpus is not None:
+            self.corpus.closes()
+        sample_path = os.path.join(self.data_path, self.state + '_sample.csv')
+        self.sample.to_frame(columns).to_csv(sample_path)
+        metrics.writes(sample_path)
+
+    def discards(self):
+        """closes what is open and removes the partial files; the outputs of the last run are left"""
+        for output_file, path in [(self.csv_file, self.csv_path), (self.aggregates_file, self.aggregates_path)]:
+            if output_file is not None:
+                output_file.close()
+                if os.path.exists(path + '.partial'):
+                    os.remove(path + '.partial')
+        self.csv_file = self.aggregates_file = None
+        if self.connection is not None:
+            # the staged rows are temporary tables
+            self.connection.close()
+            self.connection = None
+        if self.corpus is not None:
+            self.corpus.discards()
+            self.corpus = None
+        if 'parquet' in self.outputs:
+            import shutil
+
+            shutil.rmtree(os.path.join(self.parquet_partial, 'state=' + self.state), ignore_errors=True)
@@ -0,0 +1,78 @@
+import sys
+from array import array
+
+# columns of the speech table in output order
+COLUMNS = ['speaker', 'party', 'speech', 'seq', 'sub', 'executive', 'servant', 'wp', 'session', 'president', 'role', 'state', 'interjection', 'date', 'issue']
+# typecodes of the columns that are kept in typed arrays, all others are lists of strings
+INT_COLUMNS = {'seq': 'l', 'sub': 'l', 'wp': 'l', 'session': 'l'}
+BOOL_COLUMNS = {'executive': 'b', 'servant': 'b', 'president': 'b', 'interjection': 'b'}
+# columns that are added after parsing (lib/speaker_table.py), written after COLUMNS if present
+KEY_COLUMNS = {'speaker_id': 'l'}
+
+
+class SpeechColumns:
+    """
+    collects speech fragments and interjections column by column
+
+    Rows are appended to one list or typed array per column. A single
+    DataFrame is only built when the table is materialised with to_frame().
+    Speaker, party, role, state and date repeat in every row and are interned,
+    so each distinct value is held once.
+    """
+
+    def __init__(self):
+        self.columns = {}
+        for column in COLUMNS:
+            typecode = INT_COLUMNS.get(column) or BOOL_COLUMNS.get(column)
+            self.columns[column] = array(typecode) if typecode else []
+
+    def __len__(self):
+        return len(self.columns['seq'])
+
+    def append(self, speaker, party, speech, seq, sub, executive, servant, wp, session, president, role, state, interjection, date, issue):
+        """adds one row"""
+        columns = self.columns
+        columns['speaker'].append(interns(speaker))
+        columns['party'].append(interns(party))
+        columns['speech'].append(speech)
+        columns['seq'].append(seq)
+        columns['sub'].append(sub)
+        columns['executive'].append(executive)
+        columns['servant'].append(servant)
+        columns['wp'].append(wp)
+        columns['session'].append(session)
+        columns['president'].append(president)
+        columns['role'].append(interns(role))
+        columns['state'].append(interns(state))
+        columns['interjection'].append(interjection)
+        columns['date'].append(interns(date))
+        columns['issue'].append(issue)
+
+    def extend(self, other):
+        """adds all rows of another SpeechColumns"""
+        for column, values in other.columns.items():
+            self.columns[column].extend(values)
+
+    def counts_speeches(self):
+        """number of distinct speeches (seq) and number of interjections"""
+        return len(set(self.columns['seq'])), sum(self.columns['interjection'])
+
+    def to_frame(self):
+        """materialises the columns as one pandas DataFrame"""
+        import numpy as np
+        import pandas as pd
+
+        data = {}
+        for column, values in self.columns.items():
+            if column in INT_COLUMNS or column in KEY_COLUMNS:
+                data[column] = np.array(values, dtype=np.int64)
+            elif column in BOOL_COLUMNS:
+                data[column] = np.array(values, dtype=bool)
+            else:
+                data[column] = values
+        return pd.DataFrame(data, columns=COLUMNS + [column for column in KEY_COLUMNS if column in data])
+
+
+def interns(value):
+    """the interned string, other values (None) as they are"""
+    return sys.intern(value) if type(value) is str else value
@@ -0,0 +1,93 @@
+# coding: utf-8
+import re
+
+from lib import speech_table
+
+# Normalisation of speech and interjection text in one batch per session.
+#
+# The state machine (lib/parser_engine.py) only collects the raw lines of a speech fragment,
+# each line followed by '\n' (lines never contain '\n'). cleans_speeches then does on the whole
+# speech column what used to happen per line and per fragment:
+# 1. hyphens at the end of a line are removed and the lines are joined with the separator of
+#    the profile (SPEECH_LINE_SEPARATOR, INTERJECTION_LINE_SEPARATOR)
+# 2. whitespace duplicates are removed, the text is stripped
+# 3. hyphens before lower case letters are joined as often as the fragment was cleaned before
+# 4. fragments that are empty after cleaning are dropped
+
+# '-' and whitespace at the end of a line
+LINE_END_HYPHEN = re.compile(r'-[^\S\n]*\n')
+# one or more '-' directly at the end of a line
+LINE_END_HYPHENS = re.compile(r'-+\n')
+# a line that ends with '-'
+HYPHENATED_LINE = re.compile(r'([^\n]*-)\n')
+SPACES = re.compile(' +')
+HYPHEN_JOIN = re.compile('-(?=[a-z])')
+
+# kinds of fragments
+SPEECH = 0
+INTERJECTION = 1
+
+
+def compiles_tags(*tags):
+    """one precompiled pattern that matches all given layout tags, e.g. compiles_tags('poi_begin', 'poi_end')"""
+    return re.compile('|'.join(re.escape(f'<{tag}>') for tag in tags))
+
+
+def keeps_line(line):
+    """whether a raw line contributes to a speech, i.e. is not empty after removing a line-end hyphen"""
+    stripped = line.strip()
+    return stripped != '' and stripped != '-'
+
+
+def joins_lines(lines):
+    """raw fragment of the collected lines"""
+    return ''.join(line + '\n' for line in lines)
+
+
+def removes_hyphens(match):
+    return match.group(1).replace('-', '')
+
+
+def cleans_speeches(speeches, kinds, hyphen_passes, profile):
+    """
+    cleans the raw fragments of a session and drops the empty ones
+
+    Keyword arguments:
+    speeches: speech_table.SpeechColumns whose speech column holds raw fragments (joins_lines)
+    kinds: SPEECH or INTERJECTION per row
+    hyphen_passes: per row, how often hyphens before lower case letters are joined
+    profile: state profile with SPEECH_LINE_SEPARATOR, INTERJECTION_LINE_SEPARATOR and
+        INTERJECTION_DROPS_HYPHENS (lines of an interjection that end with '-' lose all hyphens)
+
+    returns a speech_table.SpeechColumns with the cleaned text
+    """
+    import pandas as pd
+
+    if len(speeches) == 0:
+        return speeches
+
+    fragments = pd.Series(speeches.columns['speech'], dtype=object)
+    is_speech = pd.Series(kinds) == SPEECH
+    passes = pd.Series(hyphen_passes)
+
+    text = fragments.copy()
+    text[is_speech] = (fragments[is_speech]
+                       .str.replace(LINE_END_HYPHEN, '', regex=True)
+                       .str.replace('\n', profile.SPEECH_LINE_SEPARATOR, regex=False))
+    if profile.INTERJECTION_DROPS_HYPHENS:
+        interjections = fragments[~is_speech].str.replace(HYPHENATED_LINE, removes_hyphens, regex=True)
+    else:
+        interjections = fragments[~is_speech].str.replace(LINE_END_HYPHENS, '', regex=True)
+    text[~is_speech] = interjections.str.replace('\n', profile.INTERJECTION_LINE_SEPARATOR, regex=False)
+
+    text = text.str.replace(SPACES, ' ', regex=True).str.strip()
+    for n in range(1, passes.max() + 1):
+        joined = passes >= n
+        text[joined] = text[joined].str.replace(HYPHEN_JOIN, '', regex=True)
+
+    cleaned = speech_table.SpeechColumns()
+    keep = (text != '').tolist()
+    for column, values in speeches.columns.items():
+        values = text.tolist() if column == 'speech' else values
+        cleaned.columns[column].extend(value for value, kept in zip(values, keep) if kept)
+    return cleaned
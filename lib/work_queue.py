@@ -0,0 +1,159 @@
+# coding: utf-8
+import json
+import logging
+import os
+import socket
+import time
+
+from lib import metrics
+
+log = logging.getLogger(__name__)
+
+# Work distribution over a shared folder, without a broker (python landtag.py work). Several machines
+# run the pipeline (lib/pipeline.py) on the same data/{STATE} tree; before a machine (node) starts on
+# a session it takes the session's lease, data/{STATE}/queue/{session}.lease, which only one node can
+# create (O_EXCL). Other nodes skip the session and come back to it later.
+#
+# heartbeat: a node touches its leases every HEARTBEAT seconds while it works on them
+# expiry: a lease that was not touched for EXPIRY seconds belongs to a crashed node; the next node
+#     that wants the session renames the lease away (only one node can) and takes a new one
+# done: when a node is done with a session it writes the manifest entries of its artifacts to
+#     {session}.done and removes the lease; a node that claims the session later reads them and
+#     skips the stages that are built
+#
+# Outputs are written to a temporary file and renamed (stages 3 and 4, the session cache, the
+# manifest), so a crashed node leaves no half-written file behind. The file system has to provide
+# atomic O_EXCL and rename, which local file systems and NFSv3+ do.
+
+QUEUE_FOLDER = 'queue'
+# seconds between two heartbeats of a lease
+HEARTBEAT = 30
+# seconds without heartbeat after which a lease is taken from its node
+EXPIRY = 300
+# seconds to wait while all sessions left are leased by other nodes
+POLL = 15
+
+
+def names_node():
+    """name of this node in the leases: host name and pid"""
+    return f'{socket.gethostname()}-{os.getpid()}'
+
+
+class WorkQueue:
+    """
+    leases of the sessions of a state, shared by all nodes that work on the same data path
+
+    Keyword arguments:
+    data_path: folder of the state on the shared file system
+    node: name of this node, defaults to names_node()
+    heartbeat, expiry, poll: seconds, see HEARTBEAT, EXPIRY and POLL
+    """
+
+    def __init__(self, data_path, node=None, heartbeat=HEARTBEAT, expiry=EXPIRY, poll=POLL):
+        self.folder = os.path.join(data_path, QUEUE_FOLDER)
+        os.makedirs(self.folder, exist_ok=True)
+        self.node = node or names_node()
+        self.heartbeat, self.expiry, self.poll = heartbeat, expiry, poll
+        # session -> path of its lease, for the leases this node holds
+        self.held = {}
+        self.beaten = time.time()
+
+    def names_lease(self, session):
+        return os.path.join(self.folder, f'{session}.lease')
+
+    def claims(self, session):
+        """takes the lease of session; False if another node works on it"""
+        path = self.names_lease(session)
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            if path in self.held.values() or not self.reclaims(path):
+                return False
+            return self.claims(session)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'node': self.node, 'claimed': time.strftime('%Y-%m-%dT%H:%M:%S')}, f)
+        self.held[session] = path
+        metrics.counts('work_queue.claimed')
+        return True
+
+    def reclaims(self, path):
+        """removes the lease path if its node stopped to beat; returns whether it is gone"""
+        try:
+            if time.time() - os.path.getmtime(path) <= self.expiry:
+                return False
+        except FileNotFoundError:
+            return True
+        # of all nodes that see the expired lease only one can rename it
+        expired = f'{path}.{self.node}.expired'
+        try:
+            os.rename(path, expired)
+        except FileNotFoundError:
+            return True
+        if time.time() - os.path.getmtime(expired) <= self.expiry:
+            # another node reclaimed it just before and took a new lease: put that one back
+            try:
+                os.link(expired, path)
+            except FileExistsError:
+                pass
+            os.remove(expired)
+            return False
+        log.warning('lease %s of %s expired, its node is taken as crashed', os.path.basename(path), self.reads_node(expired))
+        os.remove(expired)
+        metrics.counts('work_queue.reclaimed')
+        return True
+
+    def reads_node(self, path):
+        """node named in the lease path, None if it cannot be read"""
+        try:
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)['node']
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def beats(self):
+        """touches the leases of this node, at most every heartbeat seconds"""
+        if time.time() - self.beaten < self.heartbeat:
+            return
+        self.beaten = time.time()
+        for session, path in list(self.held.items()):
+            if self.reads_node(path) == self.node:
+                os.utime(path)
+            else:
+                # the node was taken as crashed, e.g. after a long pause; its result is still valid
+                log.warning('lease of %s was taken by another node', session)
+                del self.held[session]
+
+    def reads_done(self, session):
+        """manifest entries (output -> entry) that a node wrote for session when it was done with it"""
+        try:
+            with open(os.path.join(self.folder, f'{session}.done'), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def finishes(self, session, entries):
+        """
+        writes the manifest entries of session for other nodes and gives up its lease
+
+        Keyword arguments:
+        session: session name, e.g. plenarprotokoll22-1
+        entries: manifest entries (output -> entry) of the artifacts built for the session
+        """
+        if entries:
+            path = os.path.join(self.folder, f'{session}.done')
+            temporary = f'{path}.{self.node}.tmp'
+            with open(temporary, 'w', encoding='utf-8') as f:
+                json.dump({**self.reads_done(session), **entries}, f)
+            os.replace(temporary, path)
+        self.releases(session)
+
+    def releases(self, session):
+        """gives up the lease of session if this node still holds it"""
+        path = self.held.pop(session, None)
+        if path is not None and self.reads_node(path) == self.node:
+            os.remove(path)
+
+    def releases_all(self):
+        """gives up all leases of this node, e.g. when it stops"""
+        for session in list(self.held):
+            self.releases(session)
@@ -0,0 +1,101 @@
+# coding: utf-8
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+import pandas as pd
+
+from lib import aggregate_table, parser_engine, speaker_table, speech_output, speech_table
+
+FIXTURE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks', 'fixtures', 'HH', 'txt',
+                       'plenarprotokoll22-1_xml.txt')
+
+
+def creates_session(rows, session=1):
+    """SpeechColumns of a session from (speaker, party, speech, seq, interjection) rows, with speaker ids"""
+    speeches = speech_table.SpeechColumns()
+    for sub, (speaker, party, speech, seq, interjection) in enumerate(rows):
+        speeches.append(speaker, party, speech, seq, sub, False, False, 22, session, False, 'mp', 'HH', interjection,
+                        '2020-03-05', 'TOP 1')
+    return speeches
+
+
+class AggregatesSession(unittest.TestCase):
+
+    def test_counts(self):
+        speeches = creates_session([
+            ('Anna Müller', 'SPD', 'Wir brauchen mehr Wohnungen', 0, False),
+            ('Anna Müller', 'SPD', '(Beifall bei der SPD)', 0, True),
+            ('Anna Müller', 'SPD', 'und zwar schnell', 0, False),
+            ('Jörg Schmidt', 'CDU', 'Nein', 1, False),
+            ('Anna Müller', 'SPD', 'Doch', 2, False),
+            (None, None, 'Die Sitzung ist eröffnet', 3, False),
+        ])
+        speaker_table.SpeakerTable().assigns(speeches)
+        aggregates = aggregate_table.aggregates_session(speeches.to_frame())
+        self.assertEqual(list(aggregates.columns), aggregate_table.COLUMNS)
+        rows = {row.speaker_id: row for row in aggregates.itertuples()}
+        self.assertEqual(list(rows), [1, 2, 0])
+        self.assertEqual((rows[1].speeches, rows[1].fragments, rows[1].words, rows[1].interjections), (2, 3, 8, 1))
+        self.assertEqual((rows[2].speeches, rows[2].fragments, rows[2].words, rows[2].interjections), (1, 1, 1, 0))
+        self.assertEqual((rows[0].speeches, rows[0].words), (1, 4))
+        self.assertTrue(pd.isna(rows[0].speaker))
+
+    def test_party_change_is_its_own_row(self):
+        speeches = creates_session([('Anna Müller', 'SPD', 'eins', 0, False), ('Anna Müller', 'fraktionslos', 'zwei drei', 1, False)])
+        speaker_table.SpeakerTable().assigns(speeches)
+        aggregates = aggregate_table.aggregates_session(speeches.to_frame())
+        self.assertEqual(list(aggregates['party']), ['SPD', 'fraktionslos'])
+        self.assertEqual(list(aggregates['words']), [1, 2])
+
+    def test_without_speaker_ids(self):
+        aggregates = aggregate_table.aggregates_session(creates_session([('Anna Müller', 'SPD', 'eins', 0, False)]).to_frame())
+        self.assertEqual(list(aggregates['speaker_id']), [0])
+
+
+class AggregatesOutput(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.folder, 'speeches.sqlite')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_sessions_of_a_state(self):
+        speakers = speaker_table.SpeakerTable()
+        writer = speech_output.SpeechWriter('HH', self.folder, ('sqlite',), sqlite_path=self.db_path)
+        words = 0
+        for session in [1, 2]:
+            speeches, _ = parser_engine.parses_file(FIXTURE, 'HH')
+            speeches.columns['session'] = type(speeches.columns['session'])('l', [session] * len(speeches))
+            speakers.assigns(speeches)
+            frame = speeches.to_frame()
+            words += frame.loc[~frame['interjection'], 'speech'].str.split().str.len().sum()
+            writer.writes_session(speeches)
+        writer.writes_speakers(speakers.to_frame())
+        writer.closes()
+
+        aggregates = pd.read_csv(os.path.join(self.folder, 'HH_aggregates.csv'))
+        self.assertEqual(list(aggregates.columns), aggregate_table.COLUMNS)
+        self.assertEqual(sorted(set(aggregates['session'])), [1, 2])
+        self.assertEqual(aggregates['words'].sum(), words)
+        self.assertEqual(aggregates['fragments'].sum() + aggregates['interjections'].sum(), writer.rows)
+        connection = sqlite3.connect(self.db_path)
+        try:
+            in_sqlite = connection.execute("SELECT COUNT(*), SUM(words) FROM aggregates WHERE state = 'HH'").fetchone()
+        finally:
+            connection.close()
+        self.assertEqual(in_sqlite, (len(aggregates), words))
+
+    def test_no_sessions(self):
+        writer = speech_output.SpeechWriter('HH', self.folder)
+        writer.closes()
+        with open(os.path.join(self.folder, 'HH_aggregates.csv'), encoding='utf-8') as f:
+            self.assertEqual(f.read(), ','.join(aggregate_table.COLUMNS) + '\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+# coding: utf-8
+import contextlib
+import io
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from lib import build_manifest, corpus_store, parser_engine, speech_output
+
+FIXTURES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks', 'fixtures')
+
+try:
+    import pyarrow  # noqa: F401
+except ImportError:
+    pyarrow = None
+
+
+@unittest.skipIf(pyarrow is None, 'pyarrow is not installed')
+class RebuildsMissingOutputs(unittest.TestCase):
+
+    outputs = ('csv', 'parquet', 'sqlite', 'corpus')
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.data_path = os.path.join(self.folder, 'HH')
+        shutil.copytree(os.path.join(FIXTURES, 'HH', 'txt'), os.path.join(self.data_path, 'txt'))
+        self.sqlite_path = speech_output.default_sqlite_path(self.data_path)
+        self.parses()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def parses(self):
+        """whether parses_state wrote the outputs, rather than finding them up to date"""
+        printed = io.StringIO()
+        with contextlib.redirect_stdout(printed), contextlib.redirect_stderr(io.StringIO()):
+            parser_engine.parses_state('HH', self.data_path, jobs=1, outputs=self.outputs)
+        return 'up to date' not in printed.getvalue()
+
+    def test_up_to_date(self):
+        self.assertFalse(self.parses())
+
+    def test_deleted_outputs(self):
+        parquet_folder = os.path.join(speech_output.default_parquet_path(self.data_path), 'state=HH')
+        deletions = {
+            'csv': lambda: os.remove(os.path.join(self.data_path, 'HH.csv')),
+            'parquet': lambda: shutil.rmtree(parquet_folder),
+            'sqlite': lambda: [os.remove(path) for path in [self.sqlite_path, self.sqlite_path + '-wal']
+                               if os.path.exists(path)],
+            'corpus': lambda: shutil.rmtree(corpus_store.default_corpus_path(self.data_path)),
+        }
+        for output, deletes in deletions.items():
+            with self.subTest(output=output):
+                deletes()
+                self.assertTrue(self.parses())
+                self.assertFalse(self.parses())
+
+    def test_deleted_sqlite_rows(self):
+        connection = sqlite3.connect(self.sqlite_path)
+        with connection:
+            connection.execute("DELETE FROM speeches WHERE state = 'HH'")
+            connection.execute(f"DELETE FROM {build_manifest.MARKER_TABLE}")
+        connection.close()
+        self.assertTrue(self.parses())
+        connection = sqlite3.connect(self.sqlite_path)
+        self.assertGreater(connection.execute("SELECT COUNT(*) FROM speeches WHERE state = 'HH'").fetchone()[0], 0)
+        connection.close()
+
+    def test_state_written_by_another_run(self):
+        # the parquet partitions of the state replaced by a run with other options
+        speech_output.replaces_state_parquet(speech_output.default_parquet_path(self.data_path), 'HH', 0)
+        self.assertTrue(self.parses())
+
+
+class SqliteMarker(unittest.TestCase):
+
+    def test_token_changes_with_every_write(self):
+        folder = tempfile.mkdtemp()
+        try:
+            db_path = os.path.join(folder, 'x.sqlite')
+            marker = build_manifest.names_sqlite_marker(db_path, 'speeches/HH')
+            self.assertFalse(build_manifest.exists(marker))
+            connection = sqlite3.connect(db_path)
+            tokens = []
+            for _ in range(2):
+                with connection:
+                    build_manifest.marks_sqlite(connection, 'speeches/HH', 3)
+                tokens.append(build_manifest.reads_sqlite_marker(marker))
+            connection.close()
+            self.assertTrue(build_manifest.exists(marker))
+            self.assertNotEqual(tokens[0], tokens[1])
+            self.assertTrue(tokens[0].startswith('3:'))
+        finally:
+            shutil.rmtree(folder)
+
+
+if __name__ == '__main__':
+    unittest.main()
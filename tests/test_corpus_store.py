@@ -0,0 +1,84 @@
+# coding: utf-8
+import os
+import shutil
+import tempfile
+import unittest
+
+import pandas as pd
+
+from lib import corpus_store
+
+
+def speeches_frame(wp, session, speeches, parties):
+    """a session as speech_table.SpeechColumns.to_frame() returns it, with the columns of the corpus"""
+    rows = len(speeches)
+    return pd.DataFrame({
+        'wp': [wp] * rows, 'session': [session] * rows, 'seq': list(range(rows)), 'sub': [0] * rows,
+        'speaker_id': list(range(1, rows + 1)), 'date': ['2021-03-%02d' % session] * rows,
+        'interjection': [index % 2 == 1 for index in range(rows)], 'president': [False] * rows,
+        'executive': [False] * rows, 'servant': [False] * rows, 'party': parties, 'speech': speeches,
+    })
+
+
+class RoundTrip(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = os.path.join(tempfile.mkdtemp(), 'corpus')
+
+    def tearDown(self):
+        shutil.rmtree(os.path.dirname(self.folder))
+
+    def writes(self, sessions):
+        writer = corpus_store.CorpusWriter('HH', self.folder)
+        for pd_speeches in sessions:
+            writer.writes_session(pd_speeches)
+        writer.closes()
+
+    def test_round_trip(self):
+        first = speeches_frame(22, 1, ['Guten Morgen.', None, 'Grüße an alle – 🙂'], ['SPD', None, 'GRÜNE'])
+        second = speeches_frame(22, 2, ['', 'Weiter.'], ['CDU', 'SPD'])
+        self.writes([first, second])
+        with corpus_store.CorpusStore(self.folder) as store:
+            self.assertEqual(len(store), 5)
+            self.assertEqual(list(store.speeches(range(5))), ['Guten Morgen.', '', 'Grüße an alle – 🙂', '', 'Weiter.'])
+            self.assertEqual([store.party(row) for row in range(5)], ['SPD', None, 'GRÜNE', 'CDU', 'SPD'])
+            self.assertEqual(store.finds_session(22, 2), range(3, 5))
+            self.assertEqual(store.finds_session(22, 3), range(5, 5))
+            frame = store.to_frame(store.finds_session(22, 1), ['seq', 'speaker_id'])
+            self.assertEqual(list(frame['speaker_id']), [1, 2, 3])
+            self.assertEqual(list(frame['speech']), ['Guten Morgen.', '', 'Grüße an alle – 🙂'])
+            self.assertEqual(list(store['interjection'][:3]), [False, True, False])
+
+    def test_empty_corpus(self):
+        self.writes([])
+        with corpus_store.CorpusStore(self.folder) as store:
+            self.assertEqual(len(store), 0)
+            self.assertEqual(store.finds_session(22, 1), range(0, 0))
+
+    def test_replaces_previous_corpus(self):
+        self.writes([speeches_frame(22, 1, ['alt'], ['SPD'])])
+        self.writes([speeches_frame(22, 1, ['neu', 'neu'], ['CDU', 'CDU'])])
+        with corpus_store.CorpusStore(self.folder) as store:
+            self.assertEqual(list(store.speeches(range(len(store)))), ['neu', 'neu'])
+
+    def test_left_previous_folder(self):
+        # a run that stopped between the two renames of CorpusWriter.closes
+        self.writes([speeches_frame(22, 1, ['alt'], ['SPD'])])
+        shutil.copytree(self.folder, self.folder + '.previous')
+        self.writes([speeches_frame(22, 1, ['neu'], ['CDU'])])
+        self.assertFalse(os.path.exists(self.folder + '.previous'))
+        with corpus_store.CorpusStore(self.folder) as store:
+            self.assertEqual(store.speech(0), 'neu')
+
+    def test_discards(self):
+        self.writes([speeches_frame(22, 1, ['alt'], ['SPD'])])
+        writer = corpus_store.CorpusWriter('HH', self.folder)
+        writer.writes_session(speeches_frame(22, 1, ['neu'], ['CDU']))
+        writer.discards()
+        self.assertFalse(os.path.exists(self.folder + '.partial'))
+        with corpus_store.CorpusStore(self.folder) as store:
+            self.assertEqual(store.speech(0), 'alt')
+
+
+if __name__ == '__main__':
+    unittest.main()
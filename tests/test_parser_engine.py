@@ -0,0 +1,25 @@
+# coding: utf-8
+import os
+import unittest
+
+from lib import line_records, parser_engine
+
+FIXTURE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                       'benchmarks', 'fixtures', 'HH', 'txt', 'plenarprotokoll22-1_xml.txt')
+
+
+class CleansFirstSpeaker(unittest.TestCase):
+
+    def test_first_speaker_of_session_is_cleaned(self):
+        with open(FIXTURE, encoding='utf-8') as f:
+            text = f.read().replace('Präsidentin Carola Veit:', 'Präsidentin Carola Veit*:', 1)
+        speeches, _ = parser_engine.parse_session(line_records.records_from_text(text), 'HH', 22, 1)
+        frame = speeches.to_frame()
+        first = frame[frame['seq'] == 0]
+        # one speech under the cleaned name, not a speech of 'Carola Veit*' for the first line
+        self.assertEqual(set(first['speaker']), {'Carola Veit'})
+        self.assertTrue(first['speech'].iloc[0].startswith('weil Bürgerschaft die Antrag hat einen braucht Verkehrswende'))
+
+
+if __name__ == '__main__':
+    unittest.main()
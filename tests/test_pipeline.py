@@ -0,0 +1,125 @@
+# coding: utf-8
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from concurrent.futures import Future
+
+from lib import pipeline, session_cache
+
+FIXTURE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks', 'fixtures', 'NRW')
+
+
+class HeldExecutor:
+    """executor whose tasks stay in work until the test finishes them"""
+
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, function, *args):
+        future = Future()
+        # args: the worker function of the stage and its input file first
+        self.submitted.append((args[1], future))
+        return future
+
+
+def creates_state(folder, sessions):
+    """data/NRW with params_NRW.json and empty pdfs of the sessions MMP17-1 ..., as runs_pipeline prepares it"""
+    data_path = os.path.join(folder, 'NRW')
+    for subfolder in ['pdf', 'xml', 'txt']:
+        os.makedirs(os.path.join(data_path, subfolder))
+    shutil.copy(os.path.join(FIXTURE, 'params_NRW.json'), data_path)
+    for session in range(1, sessions + 1):
+        open(os.path.join(data_path, 'pdf', f'MMP17-{session}.pdf'), 'wb').close()
+    return data_path
+
+
+class BackPressure(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.data_path = creates_state(self.folder, 6)
+        self.pipeline = pipeline.Pipeline('NRW', self.data_path, jobs=8, queue_size=2, pdf2txt='pdf2txt.py', char_margin=3)
+        self.executor = HeldExecutor()
+        self.futures = {}
+        for filename in pipeline.lists_files(os.path.join(self.data_path, 'pdf'), '.pdf', 'NRW'):
+            self.pipeline.enqueues('pdf_to_xml', filename)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def takes(self):
+        """submits what the pipeline takes now; returns the stages of the new tasks"""
+        before = len(self.executor.submitted)
+        self.pipeline.takes(self.executor, self.futures)
+        return [self.futures[future][0] for _, future in self.executor.submitted[before:]]
+
+    def finishes(self, stage):
+        """finishes the oldest task of stage as its worker would, writing its outputs"""
+        for future, (future_stage, filename) in list(self.futures.items()):
+            if future_stage == stage:
+                break
+        if stage == 'pdf_to_xml':
+            shutil.copy(os.path.join(FIXTURE, 'MMP17-1.xml'), self.pipeline.outputs(stage, filename)[0])
+        elif stage == 'xml_to_txt':
+            for output, fixture in zip(self.pipeline.outputs(stage, filename), ['MMP17-1_xml.txt', 'MMP17-1_lines.tsv']):
+                shutil.copy(os.path.join(FIXTURE, 'txt', fixture), output)
+        del self.futures[future]
+        self.pipeline.finishes(stage, filename, True)
+
+    def test_slow_stage_holds_back_the_stage_before_it(self):
+        # 8 free workers, but only queue_size sessions may be in work before stage 4
+        self.assertEqual(self.takes(), ['pdf_to_xml', 'pdf_to_xml'])
+        self.finishes('pdf_to_xml')
+        self.assertEqual(self.takes(), ['xml_to_txt'])
+        # one session waits for stage 4 or is in it, one is converted: no room
+        self.assertEqual(len(self.pipeline.queues['pdf_to_xml']), 4)
+        self.finishes('pdf_to_xml')
+        self.assertEqual(self.takes(), ['xml_to_txt'])
+        self.assertEqual(self.takes(), [])
+
+    def test_latest_stage_first(self):
+        self.takes()
+        self.finishes('pdf_to_xml')
+        self.finishes('pdf_to_xml')
+        # both sessions wait for stage 4, which comes before the pdfs
+        self.assertEqual(self.takes(), ['xml_to_txt', 'xml_to_txt'])
+        self.finishes('xml_to_txt')
+        self.assertEqual(self.takes(), ['parse', 'pdf_to_xml'])
+
+    def test_session_order_within_stage(self):
+        self.takes()
+        first = [filename for filename, _ in self.executor.submitted]
+        self.assertEqual([os.path.basename(filename) for filename in first], ['MMP17-1.pdf', 'MMP17-2.pdf'])
+
+
+class Runs(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.data_path = creates_state(self.folder, 3)
+        for session in range(1, 4):
+            shutil.copy(os.path.join(FIXTURE, 'MMP17-1.xml'), os.path.join(self.data_path, 'xml', f'MMP17-{session}.xml'))
+        self.files = pipeline.lists_files(os.path.join(self.data_path, 'xml'), '.xml', 'NRW')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def runs(self):
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            return pipeline.Pipeline('NRW', self.data_path, 1, 2, 'pdf2txt.py', 3, stages=('xml_to_txt', 'parse')).runs(self.files)
+
+    def test_sessions_go_through_all_stages(self):
+        self.assertEqual(self.runs(), 3)
+        for session in range(1, 4):
+            self.assertTrue(os.path.exists(os.path.join(self.data_path, 'txt', f'MMP17-{session}_lines.tsv')))
+        entries = os.listdir(os.path.join(self.data_path, session_cache.CACHE_FOLDER))
+        self.assertEqual(sorted(entry.split('.')[0] for entry in entries), ['MMP17-1_xml', 'MMP17-2_xml', 'MMP17-3_xml'])
+        # nothing is stale in the next run
+        self.assertEqual(self.runs(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+# coding: utf-8
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from lib import parser_engine, session_cache
+from lib.profiles import load_profile
+
+FIXTURE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks', 'fixtures', 'HH', 'txt')
+
+
+class CacheKey(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        shutil.copytree(FIXTURE, os.path.join(self.folder, 'txt'))
+        self.filename = os.path.join(self.folder, 'txt', 'plenarprotokoll22-1_xml.txt')
+        self.profile = load_profile('HH')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def appends(self, filename, text):
+        with open(filename, 'a', encoding='utf-8') as f:
+            f.write(text)
+
+    def test_same_input_same_key(self):
+        self.assertEqual(session_cache.cache_key(self.filename, self.profile), session_cache.cache_key(self.filename, self.profile))
+
+    def test_changed_txt(self):
+        key = session_cache.cache_key(self.filename, self.profile)
+        self.appends(self.filename, '\n')
+        self.assertNotEqual(session_cache.cache_key(self.filename, self.profile), key)
+
+    def test_changed_line_records(self):
+        key = session_cache.cache_key(self.filename, self.profile)
+        self.appends(self.filename.replace('_xml.txt', '_lines.tsv'), '\n')
+        self.assertNotEqual(session_cache.cache_key(self.filename, self.profile), key)
+
+    def test_changed_profile(self):
+        key = session_cache.cache_key(self.filename, self.profile)
+        with mock.patch.object(session_cache, 'hashes_profile', return_value='f' * 64):
+            self.assertNotEqual(session_cache.cache_key(self.filename, self.profile), key)
+
+
+class CachedSessions(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        shutil.copytree(FIXTURE, os.path.join(self.folder, 'txt'))
+        self.filename = os.path.join(self.folder, 'txt', 'plenarprotokoll22-1_xml.txt')
+        self.cache_folder = os.path.join(self.folder, session_cache.CACHE_FOLDER)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def parses(self, speaker_parties=None):
+        """result of parses_file_alone and whether it parsed the session"""
+        with mock.patch.object(parser_engine, 'parses_file', wraps=parser_engine.parses_file) as parses_file:
+            speeches, _ = parser_engine.parses_file_alone(self.filename, 'HH', self.cache_folder, speaker_parties)
+        return speeches.to_frame(), parses_file.called
+
+    def test_reuses_unchanged_session(self):
+        first, parsed = self.parses()
+        self.assertTrue(parsed)
+        second, parsed = self.parses()
+        self.assertFalse(parsed)
+        self.assertTrue(first.equals(second))
+
+    def test_parses_changed_session(self):
+        self.parses()
+        with open(self.filename, 'a', encoding='utf-8') as f:
+            f.write('\n')
+        _, parsed = self.parses()
+        self.assertTrue(parsed)
+        # the entry of the former content is removed
+        self.assertEqual(len(os.listdir(self.cache_folder)), 1)
+
+    def test_parses_again_if_looked_up_party_changed(self):
+        self.parses()
+        key = session_cache.cache_key(self.filename, load_profile('HH'))
+        speeches, errormessages, _ = session_cache.loads_session(self.cache_folder, self.filename, key)
+        # as if the session had looked up the party of a speaker of another session
+        session_cache.stores_session(self.cache_folder, self.filename, key, (speeches, errormessages, {'Anna Müller': 'SPD'}))
+        _, parsed = self.parses({'Anna Müller': 'SPD'})
+        self.assertFalse(parsed)
+        _, parsed = self.parses({'Anna Müller': 'CDU'})
+        self.assertTrue(parsed)
+
+    def test_damaged_entry(self):
+        self.parses()
+        entry, = os.listdir(self.cache_folder)
+        with open(os.path.join(self.cache_folder, entry), 'wb') as f:
+            f.write(b'not gzip')
+        _, parsed = self.parses()
+        self.assertTrue(parsed)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+# coding: utf-8
+import random
+import re
+import unittest
+
+from lib import helper, speaker_registry
+
+
+def cleans_speaker_hh_chain(new_speaker):
+    """helper.cleans_speaker_hh as it was before the registry, the reference for the 'spelling' rows"""
+    new_speaker = (
+        re.sub(' +', ' ', new_speaker)
+        .replace('Zwischenfrage von ', '')
+        .replace('Zwischenbemerkung von ', '')
+        .replace(' (fortfahrend)', '')
+        .replace(' (unterbrechend)', '')
+        .replace('Treuenfels-Frowein', 'Treuenfels')
+        .replace('Busch-', 'Buschhütter')
+        .replace(' GRÜNE: Im', '')
+        .replace('Stapel-', 'Stapelfeldt')
+        .replace(' frakti-', '')
+        .replace(' DIE', '')
+        .replace('Finn Ole', 'Finn-Ole')
+        .replace('Nebahat Güclü', 'Nebahat Güçlü')
+        .split(':')[0]
+        )
+
+    new_speaker = re.sub(r'\s+DIE(?:\s+LIN-)?', '', new_speaker)
+    return new_speaker
+
+
+class CleansSpeakerHH(unittest.TestCase):
+
+    def test_alias_joined_by_removal(self):
+        # removing ' DIE (fortfahrend)' must not join 'Treuenfels-' and 'Frowein' into an alias
+        name = 'Treuenfels- DIE (fortfahrend)Frowein'
+        self.assertEqual(helper.cleans_speaker_hh(name), cleans_speaker_hh_chain(name))
+        self.assertEqual(helper.cleans_speaker_hh(name), 'Treuenfels-Frowein')
+
+    def test_same_as_chain(self):
+        aliases = [entry.alias for entry in speaker_registry.loads_registry().entries[('HH', 'spelling')]]
+        pieces = aliases + ['Anna-Elisabeth von ', 'Frowein', 'Ole', 'Güclü', 'LIN-', ' ', '  ', ':', '-', 'DIE', 'Dr. ',
+                            'Heike Sudmann', '(fortfahrend)', 'Busch', 'Stapel']
+        generator = random.Random(20)
+        for _ in range(20000):
+            name = ''.join(generator.choice(pieces) for _ in range(generator.randint(1, 6)))
+            self.assertEqual(helper.cleans_speaker_hh(name), cleans_speaker_hh_chain(name), name)
+
+    def test_alias_in_its_own_name(self):
+        entry = speaker_registry.Entry('HH', None, '', '', 'spelling', 'Busch-', 'Busch-Buschhütter', '')
+        registry = speaker_registry.Registry([entry])
+        self.assertEqual(registry.replaces('HH', 'spelling', 21, None, 'Ole Busch-'), 'Ole Busch-Buschhütter')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,156 @@
+# coding: utf-8
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from lib import parser_engine, speaker_table, speech_output
+
+FIXTURES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks', 'fixtures')
+SESSIONS = {'HH': 'plenarprotokoll22-1_xml.txt', 'NRW': 'MMP17-1_xml.txt'}
+
+
+def parses_fixture(state, word):
+    """the fixture session of a state with speaker ids, word appended to its first speech, and its speakers"""
+    speeches, _ = parser_engine.parses_file(os.path.join(FIXTURES, state, 'txt', SESSIONS[state]), state)
+    speeches.columns['speech'][0] += ' ' + word
+    speakers = speaker_table.SpeakerTable()
+    speakers.assigns(speeches)
+    return speeches, speakers.to_frame()
+
+
+class SqliteOutput(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.folder, 'speeches.sqlite')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def writer(self, state):
+        return speech_output.SpeechWriter(state, self.folder, ('sqlite',), sqlite_path=self.db_path)
+
+    def writes(self, state, word):
+        """loads the fixture session of a state, returns its speeches"""
+        speeches, pd_speakers = parses_fixture(state, word)
+        writer = self.writer(state)
+        writer.writes_session(speeches)
+        writer.writes_speakers(pd_speakers)
+        writer.closes()
+        return speeches
+
+    def query(self, sql, *parameters):
+        connection = sqlite3.connect(self.db_path)
+        try:
+            return connection.execute(sql, parameters).fetchall()
+        finally:
+            connection.close()
+
+    def rows(self, state):
+        return self.query("SELECT COUNT(*) FROM speeches WHERE state = ?", state)[0][0]
+
+    def checks_fts(self):
+        # raises sqlite3.DatabaseError if the full-text index does not match the table
+        self.query("INSERT INTO speeches_fts(speeches_fts) VALUES ('integrity-check')")
+
+    def test_search(self):
+        speeches = self.writes('HH', 'Sondervermögen')
+        self.assertEqual(self.rows('HH'), len(speeches))
+        self.checks_fts()
+        found = speech_output.searches_sqlite(self.db_path, 'Sondervermögen')
+        self.assertEqual(len(found), 1)
+        self.assertEqual(found['speaker'].iloc[0], speeches.columns['speaker'][0])
+        speaker = speeches.columns['speaker'][0]
+        by_speaker = speech_output.searches_sqlite(self.db_path, 'Hamburg', speaker=speaker)
+        self.assertGreater(len(by_speaker), 0)
+        self.assertEqual(set(by_speaker['speaker']), {speaker})
+
+    def test_replaces_only_its_state(self):
+        self.writes('HH', 'Sondervermögen')
+        nrw = self.writes('NRW', 'Landesentwicklungsplan')
+        hh = self.writes('HH', 'Wohnungsbauprogramm')
+        self.assertEqual(self.rows('HH'), len(hh))
+        self.assertEqual(self.rows('NRW'), len(nrw))
+        self.checks_fts()
+        self.assertEqual(len(speech_output.searches_sqlite(self.db_path, 'Sondervermögen')), 0)
+        self.assertEqual(len(speech_output.searches_sqlite(self.db_path, 'Wohnungsbauprogramm')), 1)
+        self.assertEqual(len(speech_output.searches_sqlite(self.db_path, 'Landesentwicklungsplan')), 1)
+        speakers = self.query("SELECT state, COUNT(*) FROM speakers GROUP BY state ORDER BY state")
+        self.assertEqual([state for state, _ in speakers], ['HH', 'NRW'])
+
+    def test_interrupted_run_keeps_previous_rows(self):
+        speeches = self.writes('HH', 'Sondervermögen')
+        writer = self.writer('HH')
+        writer.writes_session(parses_fixture('HH', 'Wohnungsbauprogramm')[0])
+        # the run stops before closes()
+        writer.discards()
+        self.assertEqual(self.rows('HH'), len(speeches))
+        self.checks_fts()
+        self.assertEqual(len(speech_output.searches_sqlite(self.db_path, 'Sondervermögen')), 1)
+        self.assertEqual(len(speech_output.searches_sqlite(self.db_path, 'Wohnungsbauprogramm')), 0)
+
+    def test_failed_open_leaves_no_partial_files(self):
+        with self.assertRaises(sqlite3.OperationalError):
+            speech_output.SpeechWriter('HH', self.folder, ('csv', 'sqlite', 'corpus'),
+                                       sqlite_path=os.path.join(self.folder, 'missing', 'speeches.sqlite'))
+        self.assertEqual(os.listdir(self.folder), [])
+
+
+    def test_speaker_names_from_speakers_table(self):
+        speeches = self.writes('HH', 'Sondervermögen')
+        columns = [row[1] for row in self.query("PRAGMA table_info(speeches)")]
+        self.assertNotIn('speaker', columns)
+        named = [row[0] for row in self.query("SELECT speaker FROM speeches_named WHERE state = 'HH' ORDER BY id")]
+        self.assertEqual(named, [speaker or None for speaker in speeches.columns['speaker']])
+
+try:
+    import pyarrow  # noqa: F401
+except ImportError:
+    pyarrow = None
+
+
+@unittest.skipIf(pyarrow is None, 'pyarrow is not installed')
+class ParquetOutput(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.parquet_path = os.path.join(self.folder, 'parquet')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def writes(self, session):
+        """writes the HH fixture as session, returns its speeches"""
+        speeches, _ = parses_fixture('HH', 'Sondervermögen')
+        speeches.columns['session'] = type(speeches.columns['session'])('l', [session] * len(speeches))
+        writer = speech_output.SpeechWriter('HH', self.folder, ('parquet',), parquet_path=self.parquet_path)
+        writer.writes_session(speeches)
+        writer.closes()
+        return speeches
+
+    def test_replaces_partitions_of_state(self):
+        self.writes(1)
+        speeches = self.writes(2)
+        self.assertEqual(sorted(os.listdir(os.path.join(self.parquet_path, 'state=HH', 'wp=22'))), ['session=2'])
+        self.assertFalse(os.path.exists(speech_output.partial_parquet_path(self.parquet_path)))
+        pd_speeches = speech_output.reads_parquet(self.parquet_path)
+        self.assertEqual(len(pd_speeches), len(speeches))
+        self.assertEqual(set(pd_speeches['session']), {2})
+
+    def test_interrupted_run_keeps_previous_partitions(self):
+        speeches = self.writes(1)
+        writer = speech_output.SpeechWriter('HH', self.folder, ('parquet',), parquet_path=self.parquet_path)
+        writer.writes_session(parses_fixture('HH', 'Wohnungsbauprogramm')[0])
+        # the process stops before closes(), the next run removes the partial partitions
+        writer.aggregates_file.close()
+        self.assertTrue(os.path.exists(os.path.join(speech_output.partial_parquet_path(self.parquet_path), 'state=HH')))
+        self.assertEqual(len(speech_output.reads_parquet(self.parquet_path)), len(speeches))
+        self.writes(1)
+        self.assertFalse(os.path.exists(speech_output.partial_parquet_path(self.parquet_path)))
+        self.assertEqual(len(speech_output.reads_parquet(self.parquet_path)), len(speeches))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+# coding: utf-8
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from lib import work_queue
+
+
+class Leases(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def node(self, name, **seconds):
+        return work_queue.WorkQueue(self.folder, node=name, **seconds)
+
+    def ages(self, queue, session, seconds):
+        """sets the heartbeat of a lease seconds back"""
+        then = time.time() - seconds
+        os.utime(queue.names_lease(session), (then, then))
+
+    def test_only_one_node_claims(self):
+        first, second = self.node('a'), self.node('b')
+        self.assertTrue(first.claims('s1'))
+        self.assertFalse(second.claims('s1'))
+        self.assertFalse(first.claims('s1'))
+        self.assertTrue(second.claims('s2'))
+        self.assertEqual(first.reads_node(first.names_lease('s1')), 'a')
+
+    def test_released_lease_can_be_claimed(self):
+        first, second = self.node('a'), self.node('b')
+        first.claims('s1')
+        first.releases('s1')
+        self.assertTrue(second.claims('s1'))
+
+    def test_expired_lease_is_reclaimed(self):
+        first, second = self.node('a', expiry=60), self.node('b', expiry=60)
+        first.claims('s1')
+        self.ages(first, 's1', 30)
+        self.assertFalse(second.claims('s1'))
+        self.ages(first, 's1', 90)
+        self.assertTrue(second.claims('s1'))
+        self.assertEqual(second.reads_node(second.names_lease('s1')), 'b')
+        self.assertEqual([name for name in os.listdir(second.folder) if name.endswith('.expired')], [])
+
+    def test_heartbeat_keeps_lease(self):
+        first, second = self.node('a', heartbeat=0, expiry=60), self.node('b', expiry=60)
+        first.claims('s1')
+        self.ages(first, 's1', 90)
+        first.beats()
+        self.assertFalse(second.claims('s1'))
+
+    def test_node_taken_as_crashed_gives_up_lease(self):
+        first, second = self.node('a', heartbeat=0, expiry=60), self.node('b', expiry=60)
+        first.claims('s1')
+        self.ages(first, 's1', 90)
+        second.claims('s1')
+        # the first node comes back: it neither touches nor removes the lease of the second
+        first.beats()
+        self.assertNotIn('s1', first.held)
+        first.releases('s1')
+        self.assertEqual(second.reads_node(second.names_lease('s1')), 'b')
+
+    def test_one_of_many_nodes_reclaims(self):
+        nodes = [self.node(f'n{index}', heartbeat=0, expiry=60) for index in range(8)]
+        nodes[0].claims('s1')
+        nodes[0].held.clear()
+        self.ages(nodes[0], 's1', 90)
+        with ThreadPoolExecutor(len(nodes) - 1) as executor:
+            claimed = list(executor.map(lambda queue: queue.claims('s1'), nodes[1:]))
+        self.assertTrue(any(claimed))
+        # a node whose fresh lease was put aside by a late reclaim finds out with its next heartbeat
+        for queue in nodes:
+            queue.beats()
+        holders = [queue.node for queue in nodes if 's1' in queue.held]
+        self.assertEqual(holders, [nodes[0].reads_node(nodes[0].names_lease('s1'))])
+
+    def test_done_entries(self):
+        first, second = self.node('a'), self.node('b')
+        first.claims('s1')
+        first.finishes('s1', {'txt/s1_xml.txt': {'stage': 'xml_to_txt'}})
+        second.claims('s1')
+        second.finishes('s1', {'xml/s1.xml': {'stage': 'pdf_to_xml'}})
+        self.assertEqual(set(first.reads_done('s1')), {'txt/s1_xml.txt', 'xml/s1.xml'})
+        self.assertFalse(os.path.exists(first.names_lease('s1')))
+        self.assertEqual(first.reads_done('s2'), {})
+
+
+if __name__ == '__main__':
+    unittest.main()